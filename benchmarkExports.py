@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""benchmarkExports.py: Benchmark the export scripts against synthetic databases"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import sys
+import shlex
+import argparse
+from exportEngine.config import readDatabaseConfig, getConnectorConfig, reportMysqlError
+from exportEngine.synthetic import parseScale, createDatabase
+from exportEngine.benchmark import defaultBenchmarkConfigPath, defaultBaselinePath, defaultRepeat, defaultTolerance, \
+    benchmarkCases, checkBenchmarkDatabases, runBenchmark, readBaselines, saveBaseline, reportResults
+
+
+def scaleArgument(argument):
+    try:
+        return parseScale(argument)
+    except ValueError as scaleError:
+        raise argparse.ArgumentTypeError(str(scaleError))
+
+
+if __name__ == "__main__":
+    # Process command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--configPath",
+                        help="benchmark database configuration file path (default " + defaultBenchmarkConfigPath +
+                             "), with databases which have benchmark in their name",
+                        default=defaultBenchmarkConfigPath)
+    parser.add_argument("-s", "--scale", type=scaleArgument, default="10k",
+                        help="number of rows of the driving tables, like 10k, 100k or 1M (default 10k)")
+    parser.add_argument("--setup", action="store_true",
+                        help="create the synthetic databases for the scale before running the benchmark")
+    parser.add_argument("-e", "--exports", help="comma separated exports to run (default all: " +
+                                                ", ".join([case.name for case in benchmarkCases]) + ")")
+    parser.add_argument("-a", "--arguments", default="",
+                        help="extra arguments for all export scripts, like \"--fetch buffered\"")
+    parser.add_argument("-r", "--repeat", type=int, default=defaultRepeat,
+                        help="number of runs of each export, of which the fastest is reported (default " +
+                             str(defaultRepeat) + ")")
+    parser.add_argument("-b", "--baselinePath", help="baseline file path (default " + defaultBaselinePath + ")",
+                        default=defaultBaselinePath)
+    parser.add_argument("--saveBaseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("-t", "--tolerance", type=float, default=defaultTolerance,
+                        help="fraction the wall time may exceed the baseline (default " + str(defaultTolerance) + ")")
+    args = parser.parse_args()
+
+    # Read the benchmark database configuration file
+    databaseConfig = readDatabaseConfig(args.configPath)
+    checkBenchmarkDatabases(databaseConfig)
+
+    # Create the synthetic databases
+    if args.setup:
+        import mysql.connector
+        for database in ['boeken', 'muziek', 'financien']:
+            mysqlConnectorConfig = getConnectorConfig(databaseConfig, database)
+            try:
+                mysqlConnection = mysql.connector.connect(**mysqlConnectorConfig)
+                tables = createDatabase(mysqlConnection, database, args.scale)
+                mysqlConnection.close()
+            except mysql.connector.Error as mysqlConnectionError:
+                reportMysqlError(mysqlConnectionError, mysqlConnectorConfig)
+                sys.exit(1)
+            print("Database", mysqlConnectorConfig['database'], "created with", len(tables), "tables")
+
+    # Run the benchmark, and compare with the baseline of the scale and extra arguments
+    results = runBenchmark(args.configPath, args.exports.split(",") if args.exports else None,
+                           shlex.split(args.arguments), args.repeat)
+    baselineKey = "scale {}{}".format(args.scale, " " + args.arguments if args.arguments else "")
+    regressions = reportResults(results, readBaselines(args.baselinePath).get(baselineKey, {}), args.tolerance)
+    if args.saveBaseline:
+        saveBaseline(args.baselinePath, baselineKey, results)
+        print("Baseline", baselineKey, "saved in", args.baselinePath)
+    if regressions:
+        print("Slower than the baseline:", ", ".join(regressions))
+        sys.exit(1)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""exportAll.py: Run all exports of a job list in one process, concurrently on pooled connections, or explain the
+queries of the exports
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import sys
+import argparse
+import configparser
+from exportEngine.config import defaultConfigPath, readDatabaseConfig
+from exportEngine.batch import defaultJobsPath, defaultWorkers, readJobList, fanOutJobs, runJobs
+from exportEngine.asyncExport import canRunAsync, runJobsAsync
+from exportEngine.explain import explainJobs
+
+# Commands of the script: run the exports, or explain their queries
+RUN = "run"
+EXPLAIN = "explain"
+
+if __name__ == "__main__":
+    # Process command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", choices=[RUN, EXPLAIN], default=RUN,
+                        help="run the exports, or explain the query of each export with its filters: the plan " +
+                             "with the full scans, filesorts and temporary tables, and the suggested indexes " +
+                             "(default " + RUN + ")")
+    parser.add_argument("-c", "--configPath",
+                        help="database configuration file path (default " + defaultConfigPath + ")",
+                        default=defaultConfigPath)
+    parser.add_argument("-j", "--jobsPath", help="job list file path (default " + defaultJobsPath + ")",
+                        default=defaultJobsPath)
+    parser.add_argument("-w", "--workers", type=int,
+                        help="number of concurrent exports (default workers in section general of the " +
+                             "configuration file, or " + str(defaultWorkers) + ")")
+    parser.add_argument("-f", "--fanOut", action="store_true",
+                        help="run the jobs exporting the same table with a single query")
+    parser.add_argument("-a", "--asyncio", action="store_true",
+                        help="run the jobs on one asyncio event loop with aiomysql, instead of in threads")
+    parser.add_argument("--analyze", action="store_true",
+                        help="explain with EXPLAIN ANALYZE, which runs the queries to report the actual rows and " +
+                             "time of each step (needs MySQL 8.0.18 or later)")
+    args = parser.parse_args()
+
+    # Read the database configuration file
+    databaseConfig = readDatabaseConfig(args.configPath)
+
+    try:
+        workers = args.workers or databaseConfig.getint('general', 'workers', fallback=defaultWorkers)
+        batchJobs = readJobList(args.jobsPath, databaseConfig)
+        if args.fanOut:
+            batchJobs = fanOutJobs(batchJobs)
+    except configparser.Error as configParserError:
+        print("Configparser error:", configParserError)
+        sys.exit(1)
+
+    if args.command == EXPLAIN:
+        failedJobs = explainJobs(batchJobs, databaseConfig, args.analyze)
+    elif args.asyncio:
+        blockingJobs = [batchJob for batchJob in batchJobs if not canRunAsync(batchJob.exportJob)]
+        for batchJob in blockingJobs:
+            print("Job", batchJob.name, "can not run with asyncio, which does not support delta, partitions or " +
+                  "the result cache")
+        if blockingJobs:
+            sys.exit(1)
+        failedJobs = runJobsAsync(batchJobs, databaseConfig, workers)
+    else:
+        failedJobs = runJobs(batchJobs, databaseConfig, workers)
+    if failedJobs:
+        sys.exit(1)
@@ -0,0 +1,4 @@
+"""exportEngine: Shared building blocks of the database export scripts"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
@@ -0,0 +1,262 @@
+"""asyncExport.py: Run the exports of a job list concurrently on one asyncio event loop, with the asynchronous MySQL
+driver aiomysql
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import sys
+import time
+import asyncio
+import collections
+from exportEngine.config import getConnectorConfig
+from exportEngine.executor import ExportJob, formatAndWrite, openOutputs, closeOutputs, discardOutputs, \
+    groupConcatMaxLenStatement
+from exportEngine.fanout import FanOutExportJob
+from exportEngine.fetch import BUFFERED, FetchStatistics
+from exportEngine.dimensions import valuesQueryOf
+from exportEngine.batch import defaultWorkers, reportBatchJob
+
+# The asyncio exports need aiomysql, which is optional, and imported only when the exports run on the event loop
+aiomysql = None
+
+# MySQL error numbers with their own report
+accessDeniedError = 1045
+badDatabaseError = 1049
+
+
+def checkAsyncDriver():
+    """Import aiomysql, or exit if aiomysql is not available"""
+    global aiomysql
+    if aiomysql is not None:
+        return
+    try:
+        import aiomysql
+    except ImportError:
+        print("Asyncio exports need aiomysql (pip install aiomysql)")
+        sys.exit(1)
+
+
+def canRunAsync(exportJob):
+    """Check whether an export job can run on the event loop: a plain export or a fan-out, and not a delta or
+    partitioned export, or an export with the result cache, which need their own connections or state
+    """
+    return type(exportJob) in (ExportJob, FanOutExportJob)
+
+
+def asyncConnectorConfig(mysqlConnectorConfig):
+    """Get the aiomysql configuration of a MySQL connector configuration. aiomysql cannot raise the warnings of a
+    query as errors, so raise_on_warnings is ignored.
+    """
+    return {
+        'host': mysqlConnectorConfig['host'],
+        'user': mysqlConnectorConfig['user'],
+        'password': mysqlConnectorConfig['password'],
+        'db': mysqlConnectorConfig['database'],
+        'charset': 'utf8mb4',
+        'autocommit': True
+    }
+
+
+def reportAsyncMysqlError(mysqlError, mysqlConnectorConfig):
+    """Print an aiomysql error, like a MySQL connector error"""
+    errorNumber = mysqlError.args[0] if mysqlError.args else None
+    if errorNumber == accessDeniedError:
+        print("Something is wrong with user name:", mysqlConnectorConfig['user'],
+              "or password:", mysqlConnectorConfig['password'])
+    elif errorNumber == badDatabaseError:
+        print("Database", mysqlConnectorConfig['database'], "does not exist")
+    else:
+        print("MySQL error:", mysqlError)
+
+
+def asyncQueryOf(job):
+    """Get the query of the export job with its parameters for aiomysql, which has no server-side prepared
+    statements, and escapes the parameters into the query in the client with the % operator of Python. The SQL
+    text of a query has no % other than the %s placeholders, because the text literals of the filters in SQL are
+    parameters too, so the query is used as is.
+    """
+    return job.query, job.queryParameters or None
+
+
+async def dimensionValueMap(connection, dimensionCache, database, table, key, column):
+    """Get the map of the key to the value of a column of a dimension table from the dimension cache, loaded on the
+    connection if needed
+    """
+    mapKey = (database, table, key, column)
+    if mapKey not in dimensionCache.valueMaps:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT count(*) FROM " + table)
+            (rowCount,) = await cursor.fetchone()
+            await cursor.execute("CHECKSUM TABLE " + table)
+            _, checksum = await cursor.fetchone()
+            valueMap = await asyncio.to_thread(dimensionCache.readCacheFile, database, table, key, column, rowCount,
+                                               checksum)
+            if valueMap is None:
+                await cursor.execute(valuesQueryOf(table, key, column))
+                valueMap = await asyncio.to_thread(dimensionCache.writeCacheFile, database, table, key, column,
+                                                   rowCount, checksum, await cursor.fetchall())
+        dimensionCache.valueMaps[mapKey] = valueMap
+    return dimensionCache.valueMaps[mapKey]
+
+
+async def loadDimensionsAsync(connection, job):
+    """Get the maps of the dimension columns of the export job from the dimension cache"""
+    job.dimensionValueMaps = [
+        (columnIndex, await dimensionValueMap(connection, job.dimensionCache, job.definition.database, join.table,
+                                              join.key, dimensionColumn))
+        for columnIndex, join, dimensionColumn in job.dimensionColumns]
+
+
+async def fetchBatchesAsync(cursor, batchSize, statistics):
+    """Fetch the rows of the executed query in batches with async iteration, and update the statistics"""
+    while True:
+        fetchStartTime = time.perf_counter()
+        rows = await cursor.fetchmany(batchSize)
+        fetchTime = time.perf_counter() - fetchStartTime
+        statistics.fetchTime += fetchTime
+        if not rows:
+            return
+        statistics.batchFetchTimes.append(fetchTime)
+        statistics.rowCount += len(rows)
+        statistics.batchCount += 1
+        yield rows
+
+
+def formatAndWriteBatch(job, rows, statistics):
+    """Format a batch of rows for each output of the export job, and write the text. The writers of a split output
+    and of a fan-out may also open, close and write files while they format the rows.
+    """
+    rows = job.resolveDimensions(rows)
+    for output in job.outputs:
+        formatAndWrite(output, output.writer.formatRows, rows, statistics)
+
+
+async def closeAfterErrorAsync(cursor):
+    """Close the cursor of an export which failed, without hiding the error of the export by an error of the close"""
+    try:
+        await cursor.close()
+    except Exception:
+        pass
+
+
+async def runExportAsync(connection, job):
+    """Execute the query of the export job on an aiomysql connection, and write the rows to the outputs.
+    Return the statistics of the export.
+
+    The event loop runs the other exports while this export waits for the server. The batches are formatted and
+    written in a thread, so that a batch is written while the next batch is fetched, and the files of the outputs
+    never block the event loop. The batches are written in the order they are fetched, so the output is the same
+    as of the blocking export. When the export fails, the outputs which are still open are discarded.
+    """
+    statistics = FetchStatistics(job.fetchStrategy)
+    startTime = time.perf_counter()
+    if job.definition.listExpressions:
+        cursor = await connection.cursor()
+        await cursor.execute(groupConcatMaxLenStatement)
+        await cursor.close()
+    await loadDimensionsAsync(connection, job)
+
+    # Execute the query, with an unbuffered cursor to stream the rows, or a cursor buffering all rows
+    cursor = await connection.cursor(aiomysql.Cursor if job.fetchStrategy.mode == BUFFERED else aiomysql.SSCursor)
+    writeTask = None
+    try:
+        await cursor.execute(*asyncQueryOf(job))
+        statistics.executeTime = time.perf_counter() - startTime
+
+        # Open the output files and write the headers
+        await asyncio.to_thread(openOutputs, job)
+
+        # Format and write each batch while the next batch is fetched
+        async for rows in fetchBatchesAsync(cursor, job.fetchStrategy.batchSize, statistics):
+            if writeTask:
+                await writeTask
+            writeTask = asyncio.create_task(asyncio.to_thread(formatAndWriteBatch, job, rows, statistics))
+        if writeTask:
+            await writeTask
+
+        # Write the end of the outputs, and close the output files
+        await asyncio.to_thread(closeOutputs, job, statistics)
+    except BaseException:
+        # Do not leave a thread writing the outputs, and remove the incomplete outputs
+        if writeTask and not writeTask.done():
+            await asyncio.wait([writeTask])
+        await asyncio.to_thread(discardOutputs, job)
+        await closeAfterErrorAsync(cursor)
+        raise
+
+    await cursor.close()
+    statistics.totalTime = time.perf_counter() - startTime
+    return statistics
+
+
+async def runJobsOnLoop(batchJobs, databaseConfig, workers):
+    """Run the jobs concurrently on the event loop, at most workers at once, on a connection pool per database.
+    Return the number of failed jobs.
+    """
+    startTime = time.perf_counter()
+    failedJobs = 0
+
+    # Setup a connection pool per database, with at most a connection per worker
+    jobsPerDatabase = collections.Counter([batchJob.database for batchJob in batchJobs])
+    mysqlConnectorConfigs = {}
+    connectionPools = {}
+    for database, jobCount in jobsPerDatabase.items():
+        mysqlConnectorConfigs[database] = getConnectorConfig(databaseConfig, database)
+        try:
+            connectionPools[database] = await aiomysql.create_pool(
+                minsize=1, maxsize=min(workers, jobCount), **asyncConnectorConfig(mysqlConnectorConfigs[database]))
+        except aiomysql.MySQLError as mysqlError:
+            print("Exports of database", database, "failed")
+            reportAsyncMysqlError(mysqlError, mysqlConnectorConfigs[database])
+            failedJobs += jobCount
+
+    workerSlots = asyncio.Semaphore(workers)
+
+    async def runBatchJob(batchJob):
+        # Get a connection from the pool of the database, and return it to the pool when done
+        async with workerSlots:
+            connectStartTime = time.perf_counter()
+            try:
+                async with connectionPools[batchJob.database].acquire() as connection:
+                    connectTime = time.perf_counter() - connectStartTime
+                    statistics = await runExportAsync(connection, batchJob.exportJob)
+            except Exception as jobError:
+                # Any error fails only the export, not the other exports on the event loop
+                return batchJob, None, jobError
+        statistics.connectTime = connectTime
+        return batchJob, statistics, None
+
+    # Run the jobs of which the connection pool could be setup. When the run is cancelled, the running jobs are
+    # cancelled too, and done before their connection pools are closed.
+    jobTasks = [asyncio.create_task(runBatchJob(batchJob)) for batchJob in batchJobs
+                if batchJob.database in connectionPools]
+    try:
+        for finishedJob in asyncio.as_completed(jobTasks):
+            batchJob, statistics, jobError = await finishedJob
+            if isinstance(jobError, aiomysql.MySQLError):
+                print("Export", batchJob.name, "failed")
+                reportAsyncMysqlError(jobError, mysqlConnectorConfigs[batchJob.database])
+                failedJobs += 1
+            elif jobError:
+                print("Export", batchJob.name, "failed:", jobError)
+                failedJobs += 1
+            else:
+                reportBatchJob(batchJob, statistics)
+    finally:
+        for jobTask in jobTasks:
+            jobTask.cancel()
+        await asyncio.gather(*jobTasks, return_exceptions=True)
+        for connectionPool in connectionPools.values():
+            connectionPool.close()
+            await connectionPool.wait_closed()
+
+    print(len(batchJobs) - failedJobs, "of", len(batchJobs), "exports done in",
+          "{:.1f}".format(time.perf_counter() - startTime), "s")
+    return failedJobs
+
+
+def runJobsAsync(batchJobs, databaseConfig, workers=defaultWorkers):
+    """Run the jobs concurrently on one event loop with aiomysql. Return the number of failed jobs."""
+    checkAsyncDriver()
+    return asyncio.run(runJobsOnLoop(batchJobs, databaseConfig, workers))
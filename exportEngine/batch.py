@@ -0,0 +1,182 @@
+"""batch.py: Run the exports of a job list in one process, with a connection pool per database"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import sys
+import os.path
+import time
+import shlex
+import collections
+import configparser
+import concurrent.futures
+from exportEngine.config import getConnectorConfig, reportMysqlError
+from exportEngine.commands import commandsByScript, createParser, createExportJob
+from exportEngine.fanout import canFanOut, FanOutExportJob
+from exportEngine.profiling import profileReport, writeProfileReport, runProfiled
+
+defaultJobsPath = "exportJobs.ini"
+defaultWorkers = 4
+
+
+class BatchJob:
+    """A job of the job list: the name of the job, the export job of the script with its arguments, and the
+    reports of the job
+    """
+
+    def __init__(self, name, exportJob, fetchReport=False, profilePath=None, profileStatsPath=None):
+        self.name = name
+        self.exportJob = exportJob
+        self.database = exportJob.definition.database
+        self.fetchReport = fetchReport
+        self.profilePath = jobPath(profilePath, name)
+        self.profileStatsPath = jobPath(profileStatsPath, name)
+
+
+def jobPath(path, jobName):
+    """Add the name of the job to a report path, because the jobs of the job list can have the same report path"""
+    if not path or path == "-":
+        return path
+    pathRoot, pathExtension = os.path.splitext(path)
+    return pathRoot + "." + jobName + pathExtension
+
+
+def readJobList(jobsPath, databaseConfig):
+    """Read the job list, and create the export job of each job. Exit if the job list is not valid.
+
+    Each section of the job list is a job, with the name of the export script, and the arguments of the script:
+
+        [boekenTitel]
+        script = exportBoekenTitelXml
+        arguments = -o boekenTitel.xml -t "boek.type_id = 1"
+
+    The arguments must contain the output path, because the exports run concurrently.
+    """
+
+    # Check if the job list exists
+    if not os.path.isfile(jobsPath):
+        print("Job list", jobsPath, "not found")
+        sys.exit(1)
+
+    # Read the job list, without interpolation because the arguments can contain a %
+    jobList = configparser.ConfigParser(interpolation=None)
+    jobList.read(jobsPath)
+
+    batchJobs = []
+    for jobName in jobList.sections():
+        script = os.path.splitext(jobList[jobName].get('script', ''))[0]
+        if script not in commandsByScript:
+            print("Job", jobName, "has an unknown script:", script)
+            sys.exit(1)
+
+        # Process the arguments of the job with the parser of the export script
+        command = commandsByScript[script]
+        args = createParser(command, prog=script + ".py").parse_args(
+            shlex.split(jobList[jobName].get('arguments', '')))
+        exportJob = createExportJob(command, args, databaseConfig)
+        if not all([output.outputPath for output in exportJob.outputs]):
+            print("Job", jobName, "has no output path")
+            sys.exit(1)
+
+        batchJobs.append(BatchJob(jobName, exportJob, args.fetchReport, args.profile, args.profileStats))
+    return batchJobs
+
+
+def fanOutJobs(batchJobs):
+    """Combine the jobs exporting the same table, which can run with a single query, into a fan-out job. The query is
+    in the order of the first of these jobs in the job list.
+    """
+    jobGroups = {}
+    for batchJob in batchJobs:
+        if canFanOut([batchJob.exportJob]):
+            groupKey = ("definition", batchJob.exportJob.definition.name)
+        else:
+            groupKey = ("job", batchJob.name)
+        jobGroups.setdefault(groupKey, []).append(batchJob)
+
+    fanOutBatchJobs = []
+    for jobGroup in jobGroups.values():
+        if len(jobGroup) == 1:
+            fanOutBatchJobs.append(jobGroup[0])
+            continue
+        fanOutBatchJob = BatchJob("+".join([batchJob.name for batchJob in jobGroup]),
+                                  FanOutExportJob([batchJob.exportJob for batchJob in jobGroup]),
+                                  any([batchJob.fetchReport for batchJob in jobGroup]))
+        fanOutBatchJob.profilePath = jobGroup[0].profilePath
+        fanOutBatchJob.profileStatsPath = jobGroup[0].profileStatsPath
+        fanOutBatchJobs.append(fanOutBatchJob)
+    return fanOutBatchJobs
+
+
+def reportBatchJob(batchJob, statistics):
+    """Report the outputs of a job which is done, with the fetch report and the profile report if requested"""
+    for output in [generatedOutput for output in batchJob.exportJob.outputs
+                   for generatedOutput in output.generatedOutputs()]:
+        print(output.writer.fileType, "file", output.outputPath, "successfully generated")
+    if batchJob.fetchReport:
+        print("Export", batchJob.name + ":", statistics.report(), file=sys.stderr)
+    if batchJob.profilePath:
+        writeProfileReport(batchJob.profilePath, profileReport(batchJob.name, batchJob.exportJob, statistics))
+
+
+def runJobs(batchJobs, databaseConfig, workers=defaultWorkers):
+    """Run the jobs concurrently with the number of workers, on pooled connections per database.
+    Return the number of failed jobs.
+    """
+
+    # Import the MySQL connector only when the job list is valid, because it takes long
+    import mysql.connector
+    import mysql.connector.pooling
+    startTime = time.perf_counter()
+    failedJobs = 0
+
+    # Setup a connection pool per database, with at most a connection per worker
+    jobsPerDatabase = collections.Counter([batchJob.database for batchJob in batchJobs])
+    mysqlConnectorConfigs = {}
+    connectionPools = {}
+    for database, jobCount in jobsPerDatabase.items():
+        mysqlConnectorConfigs[database] = getConnectorConfig(databaseConfig, database)
+        try:
+            connectionPools[database] = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="export_" + database,
+                pool_size=min(workers, jobCount, mysql.connector.pooling.CNX_POOL_MAXSIZE),
+                **mysqlConnectorConfigs[database])
+        except mysql.connector.Error as mysqlConnectionError:
+            print("Exports of database", database, "failed")
+            reportMysqlError(mysqlConnectionError, mysqlConnectorConfigs[database])
+            failedJobs += jobCount
+
+    def runBatchJob(batchJob):
+        # Get a connection from the pool of the database, and return it to the pool when done
+        connectStartTime = time.perf_counter()
+        mysqlConnection = connectionPools[batchJob.database].get_connection()
+        connectTime = time.perf_counter() - connectStartTime
+        try:
+            statistics = runProfiled(batchJob.exportJob, mysqlConnection, batchJob.profileStatsPath)
+        finally:
+            mysqlConnection.close()
+        statistics.connectTime = connectTime
+        return statistics
+
+    # Run the jobs of which the connection pool could be setup
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as jobExecutor:
+        futureJobs = {jobExecutor.submit(runBatchJob, batchJob): batchJob
+                      for batchJob in batchJobs if batchJob.database in connectionPools}
+        for future in concurrent.futures.as_completed(futureJobs):
+            batchJob = futureJobs[future]
+            try:
+                statistics = future.result()
+            except mysql.connector.Error as mysqlConnectionError:
+                print("Export", batchJob.name, "failed")
+                reportMysqlError(mysqlConnectionError, mysqlConnectorConfigs[batchJob.database])
+                failedJobs += 1
+            except Exception as jobError:
+                # Another error, like a full disk, fails only the export, not the other exports
+                print("Export", batchJob.name, "failed:", jobError)
+                failedJobs += 1
+            else:
+                reportBatchJob(batchJob, statistics)
+
+    print(len(batchJobs) - failedJobs, "of", len(batchJobs), "exports done in",
+          "{:.1f}".format(time.perf_counter() - startTime), "s")
+    return failedJobs
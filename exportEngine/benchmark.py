@@ -0,0 +1,156 @@
+"""benchmark.py: Run the export scripts against a synthetic database, and compare the results with a baseline"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+defaultBenchmarkConfigPath = "benchmark.ini"
+defaultBaselinePath = "benchmarkBaseline.json"
+defaultRepeat = 3
+defaultTolerance = 0.1
+
+# The databases of the benchmark configuration must have this in their name, so that a benchmark setup never
+# replaces the tables of a real database
+benchmarkDatabaseMarker = "benchmark"
+
+# The directory of the export scripts
+scriptsDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The fetch report of an export script
+fetchReportPattern = re.compile(r"Fetched (\d+) rows.*?(?:peak memory ([0-9.]+) MB)?$", re.MULTILINE)
+
+
+class BenchmarkCase:
+    """An export script with its arguments, and the output file name"""
+
+    def __init__(self, name, script, outputFileName, arguments=()):
+        self.name = name
+        self.script = script
+        self.outputFileName = outputFileName
+        self.arguments = list(arguments)
+
+
+benchmarkCases = [
+    BenchmarkCase("boekenTitelCsv", "exportBoekenTitelCsv", "boekenTitel.csv"),
+    BenchmarkCase("boekenTitelXml", "exportBoekenTitelXml", "boekenTitel.xml"),
+    BenchmarkCase("boekenBoekXml", "exportBoekenBoekXml", "boekenBoek.xml"),
+    BenchmarkCase("muziekMediumCsv", "exportMuziekMediumCsv", "muziekMedium.csv", ["-g", "rest"]),
+    BenchmarkCase("muziekMediumXml", "exportMuziekMediumXml", "muziekMedium.xml"),
+    BenchmarkCase("muziekOpnameCsv", "exportMuziekOpnameCsv", "muziekOpname.csv", ["-g", "rest"]),
+    BenchmarkCase("muziekOpnameXml", "exportMuziekOpnameXml", "muziekOpname.xml"),
+    BenchmarkCase("financienRubriekCsv", "exportFinancienRubriekCsv", "financienRubriek.csv", ["-y", "2015-2021"])]
+
+
+def checkBenchmarkDatabases(databaseConfig):
+    """Exit if a database of the benchmark configuration is not a benchmark database"""
+    for database in ['boeken', 'muziek', 'financien']:
+        databaseName = databaseConfig[database]['database']
+        if benchmarkDatabaseMarker not in databaseName:
+            print("Database", databaseName, "of section", database, "is not a benchmark database (the name must "
+                  "contain \"" + benchmarkDatabaseMarker + "\")")
+            sys.exit(1)
+
+
+def startupTime(case, repeat):
+    """Get the fastest time the export script of a case takes to start: to import its modules and parse its
+    arguments, without connecting to the database
+    """
+    command = [sys.executable, os.path.join(scriptsDirectory, case.script + ".py"), "--help"]
+    fastestTime = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        runTime = time.perf_counter() - startTime
+        if fastestTime is None or runTime < fastestTime:
+            fastestTime = runTime
+    return fastestTime
+
+
+def runCase(case, configPath, outputDirectory, extraArguments, repeat):
+    """Run the export script of a case repeat times, and return the result of the fastest run, or None if the
+    script failed
+    """
+    outputPath = os.path.join(outputDirectory, case.outputFileName)
+    command = ([sys.executable, os.path.join(scriptsDirectory, case.script + ".py"), "-c", configPath,
+                "-o", outputPath, "--fetchReport"] + case.arguments + extraArguments)
+    result = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        completedProcess = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                          universal_newlines=True)
+        wallTime = time.perf_counter() - startTime
+        fetchReport = fetchReportPattern.search(completedProcess.stderr)
+        if completedProcess.returncode != 0 or not fetchReport:
+            print("Benchmark", case.name, "failed:", completedProcess.stderr.strip())
+            return None
+        if result is None or wallTime < result["wallTime"]:
+            rowCount = int(fetchReport.group(1))
+            result = {
+                "rows": rowCount,
+                "wallTime": wallTime,
+                "rowsPerSecond": rowCount / wallTime,
+                "peakMemory": float(fetchReport.group(2)) if fetchReport.group(2) else None,
+                "bytesWritten": os.path.getsize(outputPath) if os.path.isfile(outputPath) else 0
+            }
+    result["startupTime"] = startupTime(case, repeat)
+    return result
+
+
+def runBenchmark(configPath, caseNames=None, extraArguments=(), repeat=defaultRepeat):
+    """Run the benchmark cases, and return the results by case name"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark") as outputDirectory:
+        for case in benchmarkCases:
+            if caseNames and case.name not in caseNames:
+                continue
+            result = runCase(case, configPath, outputDirectory, list(extraArguments), repeat)
+            if result:
+                results[case.name] = result
+    return results
+
+
+def readBaselines(baselinePath):
+    if not os.path.isfile(baselinePath):
+        return {}
+    with open(baselinePath, encoding="utf8") as baselineFile:
+        return json.load(baselineFile)
+
+
+def saveBaseline(baselinePath, baselineKey, results):
+    """Save the results as the baseline of the scale and the arguments"""
+    baselines = readBaselines(baselinePath)
+    baselines[baselineKey] = results
+    with open(baselinePath, mode='w', encoding="utf8") as baselineFile:
+        json.dump(baselines, baselineFile, indent=2, sort_keys=True)
+
+
+def reportResults(results, baseline, tolerance=defaultTolerance):
+    """Print the results, compared with the baseline. Return the names of the cases which are slower than the
+    baseline by more than the tolerance.
+    """
+    regressions = []
+    print("{:<22}{:>10}{:>10}{:>10}{:>12}{:>10}{:>14}{:>12}".format(
+        "export", "rows", "start s", "wall s", "rows/s", "peak MB", "bytes", "vs base"))
+    for caseName, result in results.items():
+        comparison = ""
+        baselineResult = baseline.get(caseName)
+        if baselineResult:
+            change = result["wallTime"] / baselineResult["wallTime"] - 1.0
+            comparison = "{:+.1%}".format(change)
+            if change > tolerance:
+                comparison += " !"
+                regressions.append(caseName)
+        print("{:<22}{:>10}{:>10}{:>10.3f}{:>12.0f}{:>10}{:>14}{:>12}".format(
+            caseName, result["rows"],
+            "{:.3f}".format(result["startupTime"]) if result.get("startupTime") is not None else "-",
+            result["wallTime"], result["rowsPerSecond"],
+            "{:.1f}".format(result["peakMemory"]) if result["peakMemory"] is not None else "-",
+            result["bytesWritten"], comparison))
+    return regressions
@@ -0,0 +1,39 @@
+"""codegen.py: Compile the source of a function generated for the columns of an export"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import operator
+
+
+def rowGetter(indexes):
+    """Get a function returning the values at the indexes of a row as a tuple, also for a single index"""
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return operator.itemgetter(*indexes)
+
+
+def valueExpression(formatter, valueName, namespace):
+    """Get the Python expression formatting a value: the expression of the formatter if it has one, or else a call
+    of the formatter, which is added to the namespace
+    """
+    if formatter is None:
+        return valueName
+    expression = getattr(formatter, "expression", None)
+    if expression:
+        return "(" + expression.format(valueName) + ")"
+    formatterName = "formatter_" + valueName
+    namespace[formatterName] = formatter
+    return formatterName + "(" + valueName + ")"
+
+
+def compileFunction(functionName, sourceLines, namespace):
+    """Compile the source of a function, with the names it uses in the namespace, and return the function.
+    The source is kept in the attribute source of the function.
+    """
+    source = "\n".join(sourceLines) + "\n"
+    exec(compile(source, "<" + functionName + ">", "exec"), namespace)
+    function = namespace[functionName]
+    function.source = source
+    return function
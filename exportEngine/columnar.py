@@ -0,0 +1,157 @@
+"""columnar.py: Write typed rows in the columnar Arrow IPC or Parquet format"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import sys
+from exportEngine.definitions import INT, DATE, DECIMAL, LIST, listSeparator
+
+# The columnar formats need pyarrow, which is optional, and imported only when a columnar format is used, because it
+# takes long
+pyarrow = None
+
+CSV = "csv"
+ARROW = "arrow"
+PARQUET = "parquet"
+outputFormats = [CSV, ARROW, PARQUET]
+
+# Number of rows of a Parquet row group: the fetched batches are collected until a row group is full
+parquetRowGroupSize = 65536
+
+# Scale of decimal columns, like the amounts of financien
+decimalScale = 2
+
+
+def checkColumnarFormat(outputFormat):
+    """Import pyarrow if a columnar format is requested, or exit if pyarrow is not available"""
+    global pyarrow
+    if outputFormat == CSV or pyarrow is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        print("Output format", outputFormat, "needs pyarrow (pip install pyarrow)")
+        sys.exit(1)
+
+
+class ByteSink:
+    """A file-like object which keeps the bytes written by pyarrow until they are taken, and knows its position,
+    because pyarrow needs the position for the offsets in the Parquet footer
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        """Take the bytes written since the previous take"""
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class ColumnarWriter:
+    """Write rows as Arrow record batches, with the type of each column of the definition: dates as date, ints as
+    int64, decimals as decimal, text as string, and lists of text as a list of strings. The text columns of
+    dimension tables (like genre) have few distinct values, and are dictionary encoded.
+
+    The Arrow format is the IPC stream format, which allows a dictionary per batch. Parquet collects the batches
+    into row groups.
+    """
+
+    encoding = None
+    errors = None
+
+    def __init__(self, definition, columnNames, outputFormat):
+        checkColumnarFormat(outputFormat)
+        self.definition = definition
+        self.columnNames = columnNames
+        self.outputFormat = outputFormat
+        self.fileType = "Parquet" if outputFormat == PARQUET else "Arrow"
+        self.columnIndexes = []
+        self.schema = None
+        self.sink = None
+        self.writer = None
+        self.pendingBatches = []
+        self.pendingRowCount = 0
+
+    def arrowType(self, column):
+        if column.kind == INT:
+            return pyarrow.int64()
+        if column.kind == DATE:
+            return pyarrow.date32()
+        if column.kind == DECIMAL:
+            return pyarrow.decimal128(38, decimalScale)
+        if column.kind == LIST:
+            return pyarrow.list_(pyarrow.string())
+        if self.definition.dimensionJoin(column):
+            return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        return pyarrow.string()
+
+    def begin(self, columnNames):
+        self.columnIndexes = [columnNames.index(columnName) for columnName in self.columnNames]
+        self.schema = pyarrow.schema([pyarrow.field(columnName, self.arrowType(self.definition.columns[columnName]))
+                                      for columnName in self.columnNames])
+        self.sink = ByteSink()
+        if self.outputFormat == PARQUET:
+            dictionaryColumns = [field.name for field in self.schema if pyarrow.types.is_dictionary(field.type)]
+            self.writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(self.sink, mode='w'), self.schema,
+                                                        use_dictionary=dictionaryColumns)
+        else:
+            self.writer = pyarrow.ipc.new_stream(pyarrow.PythonFile(self.sink, mode='w'), self.schema)
+        return self.sink.take()
+
+    def recordBatch(self, rows):
+        """Convert a batch of rows to an Arrow record batch"""
+        arrays = []
+        for field, columnIndex in zip(self.schema, self.columnIndexes):
+            values = [row[columnIndex] for row in rows]
+            if pyarrow.types.is_dictionary(field.type):
+                arrays.append(pyarrow.array(values, type=pyarrow.string()).dictionary_encode())
+            elif pyarrow.types.is_list(field.type):
+                arrays.append(pyarrow.array([value.split(listSeparator) if value is not None else None
+                                             for value in values], type=field.type))
+            else:
+                arrays.append(pyarrow.array(values, type=field.type))
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def writeRowGroup(self):
+        self.writer.write_table(pyarrow.Table.from_batches(self.pendingBatches, schema=self.schema))
+        self.pendingBatches = []
+        self.pendingRowCount = 0
+
+    def formatRows(self, rows):
+        if not rows:
+            return b""
+        recordBatch = self.recordBatch(rows)
+        if self.outputFormat == PARQUET:
+            self.pendingBatches.append(recordBatch)
+            self.pendingRowCount += len(rows)
+            if self.pendingRowCount >= parquetRowGroupSize:
+                self.writeRowGroup()
+        else:
+            self.writer.write_batch(recordBatch)
+        return self.sink.take()
+
+    def end(self):
+        if self.pendingBatches:
+            self.writeRowGroup()
+        self.writer.close()
+        return self.sink.take()
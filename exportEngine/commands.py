@@ -0,0 +1,605 @@
+"""commands.py: Command line arguments of the export scripts, and the export job for the arguments"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import abc
+import sys
+import time
+import shlex
+import argparse
+import datetime
+import configparser
+from exportEngine import exports
+from exportEngine.config import defaultConfigPath, readDatabaseConfig, getConnectorConfig, reportMysqlError
+from exportEngine.definitions import LIST, Column
+from exportEngine.filters import Filter, addFilterArguments, filterClauseOf, filtersSqlText
+from exportEngine.executor import Output, ExportJob
+from exportEngine.delta import defaultStatePath, DeltaExportJob
+from exportEngine.partition import PartitionedExportJob
+from exportEngine.split import SplitOutput
+from exportEngine.fanout import canFanOut, FanOutExportJob
+from exportEngine.resultCache import addResultCacheArguments, cachedJobOf
+from exportEngine.dimensions import addDimensionArguments, getDimensionCache
+from exportEngine.fetch import addFetchArguments, getFetchStrategy
+from exportEngine.profiling import addProfileArguments, profileReport, writeProfileReport, runProfiled
+from exportEngine.compression import addCompressionArguments, setCompression
+from exportEngine.csvWriter import CsvWriter, quotedList
+from exportEngine.xmlWriter import XmlWriter, textElements
+from exportEngine.rubriekWriter import RubriekWriter
+from exportEngine.columnar import CSV, outputFormats, checkColumnarFormat, ColumnarWriter
+
+classicalGenre = "classical"
+genres = [classicalGenre, "rest"]
+
+# Split by genre: into classical and the rest, with the layout and the order of each genre
+genreSplit = "genre"
+genreSplitColumn = Column("split_genre", "CASE WHEN medium.genre_id = 1 THEN '" + classicalGenre + "' ELSE 'rest' END")
+
+
+# Default status filters of boek and medium, used unless a status filter in SQL is given
+boekStatusFilters = [Filter("boek.status_id", "!=", [10])]
+mediumStatusFilters = [Filter("medium.medium_status_id", "notin", [1, 9])]
+
+
+def whereFilterOf(command, args, defaultStatusFilters, sqlFilter):
+    """Get the WHERE clause (without WHERE) and its parameters of the status filter, the structured filters and the
+    SQL filter of the arguments. The status filter is the SQL status filter if given, otherwise the default.
+    """
+    statusFilters = defaultStatusFilters if args.statusFilter is None else []
+    try:
+        return filterClauseOf(command.definition, statusFilters + (args.filter or []), args.statusFilter, sqlFilter)
+    except ValueError as filterError:
+        print("Filter error:", filterError)
+        sys.exit(1)
+
+
+def genreClauseOf(genre):
+    """Get the WHERE clause on the genre of the medium: classical or the rest"""
+    return "medium.genre_id " + ("=" if genre == classicalGenre else "!=") + " 1"
+
+
+def parseYears(yearArgument):
+    """Parse a year (2020) or a range of years (2016-2020) into the first and last year"""
+    try:
+        firstYear, _, lastYear = yearArgument.partition("-")
+        firstYear = int(firstYear)
+        lastYear = int(lastYear) if lastYear else firstYear
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid year or range of years: " + yearArgument)
+    if lastYear < firstYear:
+        raise argparse.ArgumentTypeError("last year before first year: " + yearArgument)
+    return firstYear, lastYear
+
+
+def parsePartitions(partitionsArgument):
+    """Parse the number of partitions, which must be at least 1"""
+    try:
+        partitions = int(partitionsArgument)
+    except ValueError:
+        partitions = 0
+    if partitions < 1:
+        raise argparse.ArgumentTypeError("invalid number of partitions: " + partitionsArgument)
+    return partitions
+
+
+def parseColumns(columnsArgument):
+    """Parse a comma separated list of column names"""
+    columnNames = [columnName.strip() for columnName in columnsArgument.split(",") if columnName.strip()]
+    if not columnNames:
+        raise argparse.ArgumentTypeError("invalid list of columns: " + columnsArgument)
+    return columnNames
+
+
+def parseRekeningen(rekeningArguments):
+    """Parse account arguments of the form id:name into a list of (id, name) tuples"""
+    rekeningen = []
+    for rekeningArgument in rekeningArguments:
+        rekeningId, _, rekeningName = rekeningArgument.strip().partition(":")
+        if not rekeningId.strip().isdigit():
+            raise ValueError("invalid rekening: " + rekeningArgument)
+        rekeningId = int(rekeningId)
+        rekeningen.append((rekeningId, rekeningName.strip() if rekeningName else "Rekening " + str(rekeningId)))
+    return rekeningen
+
+
+def addColumnsArguments(parser, definition):
+    """Add the argument of the columns to export"""
+    parser.add_argument("--columns", type=parseColumns,
+                        help="comma separated columns to export, in this order, of the columns " +
+                             ", ".join(definition.columns) + " (default all columns of the layout)")
+
+
+def checkColumns(command, args):
+    """Check that the requested columns are columns of the definition of the command, or exit"""
+    unknownColumns = [columnName for columnName in args.columns or [] if columnName not in command.definition.columns]
+    if unknownColumns:
+        print("Unknown column(s)", ", ".join(unknownColumns), "of", command.script)
+        sys.exit(1)
+
+
+def projectedFieldsOf(command, args, fields):
+    """Get the fields of a layout for the requested columns, in the order of the request, or all fields"""
+    if not args.columns:
+        return fields
+    checkColumns(command, args)
+    fieldsByColumnName = {columnName: (header, columnName, formatter) for header, columnName, formatter in fields}
+    projectedFields = [fieldsByColumnName[columnName] for columnName in args.columns
+                       if columnName in fieldsByColumnName]
+    if not projectedFields:
+        print("None of the columns", ", ".join(args.columns), "is in the layout of", command.script)
+        sys.exit(1)
+    return projectedFields
+
+
+def addDeltaArguments(parser):
+    """Add the arguments of a delta export"""
+    parser.add_argument("--delta", action="store_true",
+                        help="only export the rows changed since the previous export, and merge these into the " +
+                             "previous output file (needs an output path)")
+    parser.add_argument("--statePath", help="delta export state file path (default " + defaultStatePath + ")",
+                        default=defaultStatePath)
+
+
+def createXmlJob(command, args, xmlWriter, whereFilter, orderBy, dimensionCache=None):
+    """Create the export job of an XML export, with the WHERE clause and its parameters, as a delta export if
+    requested
+    """
+    whereClause, whereParameters = whereFilter
+    outputs = [Output(args.outputPath, xmlWriter)]
+    if not args.delta:
+        return ExportJob(command.definition, outputs, whereClause=whereClause, orderBy=orderBy,
+                         dimensionCache=dimensionCache, whereParameters=whereParameters)
+    if not args.outputPath:
+        print("Delta export needs an output path")
+        sys.exit(1)
+    return DeltaExportJob(command.definition, outputs, whereClause=whereClause, orderBy=orderBy,
+                          statePath=args.statePath, stateKey=command.script + ":" + os.path.abspath(args.outputPath),
+                          dimensionCache=dimensionCache, whereParameters=whereParameters)
+
+
+def addFormatArguments(parser):
+    """Add the argument of the output format"""
+    parser.add_argument("-f", "--format", choices=outputFormats, default=CSV,
+                        help="output format: CSV, or the typed columnar Arrow IPC stream or Parquet format, " +
+                             "which need pyarrow (default " + CSV + ")")
+
+
+def tableWriterOf(definition, args, csvFields):
+    """Get the writer of the output format: CSV with the fields, or a columnar format with the columns of the
+    fields
+    """
+    if args.format == CSV:
+        return CsvWriter(csvFields)
+    checkColumnarFormat(args.format)
+    return ColumnarWriter(definition, [columnName for _, columnName, _ in csvFields], args.format)
+
+
+def addNestedArguments(parser, definition):
+    """Add the argument of a nested export"""
+    parser.add_argument("--nested", action="store_true",
+                        help="export a row per " + definition.table + " with the persons as a list, instead of a " +
+                             "row per person: an element per person in XML, separated by ; in CSV (the lists are " +
+                             "limited to max_allowed_packet of the server)")
+
+
+def definitionOf(command, args):
+    """Get the definition of a command, or its nested definition if requested"""
+    return command.definition.nestedDefinition() if getattr(args, "nested", False) else command.definition
+
+
+def listFieldsOf(definition, fields, listFormatter):
+    """Get the fields of a layout, with the list formatter for the columns which are lists in the definition"""
+    return [(header, columnName, listFormatter if definition.columns[columnName].kind == LIST else formatter)
+            for header, columnName, formatter in fields]
+
+
+def addPartitionArguments(parser):
+    """Add the arguments of a partitioned export"""
+    parser.add_argument("--partitions", type=parsePartitions, default=1,
+                        help="number of key ranges fetched concurrently on separate connections (default 1)")
+
+
+def createPartitionableJob(command, args, databaseConfig, writer, whereClause, orderBy, whereParameters=()):
+    """Create the export job of an export, as a partitioned export if more than one partition is requested"""
+    definition = definitionOf(command, args)
+    outputs = [Output(args.outputPath, writer)]
+    if args.partitions == 1:
+        return ExportJob(definition, outputs, whereClause=whereClause, orderBy=orderBy,
+                         dimensionCache=getDimensionCache(args), whereParameters=whereParameters)
+    return PartitionedExportJob(definition, outputs, whereClause=whereClause, orderBy=orderBy,
+                                partitions=args.partitions,
+                                mysqlConnectorConfig=getConnectorConfig(databaseConfig, command.definition.database),
+                                dimensionCache=getDimensionCache(args), whereParameters=whereParameters)
+
+
+def addSplitArguments(parser, definition):
+    """Add the argument of a split export"""
+    parser.add_argument("--splitBy", choices=[genreSplit] + [columnName for columnName in definition.columns
+                                                             if columnName != genreSplit],
+                        help="split the output into a file per value of a column, from a single query, with the " +
+                             "column in braces in the output path, like {opslag}: " + genreSplit + " splits into " +
+                             "the genres " + " and ".join(genres) + " with their own layout (default none)")
+
+
+def createGenreJob(command, args, databaseConfig, writerOf, orderByOf, dimensionCache=None):
+    """Create the export job of a genre: the export of the genre, or split by a column into a file per value of
+    the column, or split into the genres with a single query
+    """
+    definition = definitionOf(command, args)
+    if not args.splitBy:
+        if getattr(args, "partitions", 1) > 1:
+            return createPartitionableJob(command, args, databaseConfig, writerOf(args.genre),
+                                          genreClauseOf(args.genre), orderByOf(args.genre))
+        return ExportJob(definition, [Output(args.outputPath, writerOf(args.genre))],
+                         whereClause=genreClauseOf(args.genre), orderBy=orderByOf(args.genre),
+                         dimensionCache=dimensionCache)
+
+    placeholder = "{" + args.splitBy + "}"
+    if not args.outputPath or placeholder not in args.outputPath:
+        print("Split output needs", placeholder, "in the output path")
+        sys.exit(1)
+    if getattr(args, "partitions", 1) > 1:
+        print("Split output does not support partitions")
+        sys.exit(1)
+
+    if args.splitBy != genreSplit:
+        # Split the rows of the genre on a column, ordered on the column first
+        splitColumn = definition.columns[args.splitBy]
+        output = SplitOutput(args.outputPath, placeholder, splitColumn.name, lambda splitValue: writerOf(args.genre),
+                             [writerOf(args.genre)])
+        return ExportJob(definition, [output], whereClause=genreClauseOf(args.genre),
+                         orderBy=[splitColumn.expression] + list(orderByOf(args.genre)), dimensionCache=dimensionCache)
+
+    # Select the rows of both genres, ordered on the genre first, and then on the order of the genre: the order
+    # expressions of the other genre are NULL
+    writers = {genre: writerOf(genre) for genre in genres}
+    orderBy = [genreSplitColumn.expression]
+    if all([list(orderByOf(genre)) == list(orderByOf(classicalGenre)) for genre in genres]):
+        orderBy += list(orderByOf(classicalGenre))
+    else:
+        orderBy += ["CASE WHEN " + genreClauseOf(genre) + " THEN " + expression + " END"
+                    for genre in genres for expression in orderByOf(genre)]
+    output = SplitOutput(args.outputPath, placeholder, genreSplitColumn.name, writers.get, list(writers.values()),
+                         initialValues=genres)
+    return ExportJob(definition, [output],
+                     whereClause=" OR ".join(["(" + genreClauseOf(genre) + ")" for genre in genres]),
+                     orderBy=orderBy, extraColumns=[genreSplitColumn], dimensionCache=dimensionCache)
+
+
+class ExportCommand(abc.ABC):
+    """An export script: the command line arguments, and the export job for the arguments"""
+
+    script = None
+    definition = None
+
+    @abc.abstractmethod
+    def addArguments(self, parser):
+        """Add the arguments of the command, except the database configuration file path"""
+
+    @abc.abstractmethod
+    def createJob(self, args, databaseConfig):
+        """Create the export job for the arguments"""
+
+
+class BoekenTitelCsv(ExportCommand):
+    script = "exportBoekenTitelCsv"
+    definition = exports.boekenTitel
+
+    def addArguments(self, parser):
+        parser.add_argument("-o", "--outputPath", help="CSV output file path (default none)")
+        addFormatArguments(parser)
+        addNestedArguments(parser, self.definition)
+
+    def createJob(self, args, databaseConfig):
+        definition = definitionOf(self, args)
+        writer = tableWriterOf(definition, args, listFieldsOf(
+            definition, projectedFieldsOf(self, args, exports.boekenTitelCsvFields), quotedList))
+        return ExportJob(definition, [Output(args.outputPath, writer)],
+                         orderBy=definition.orderExpressions(exports.boekenTitelOrderBy))
+
+
+class BoekenTitelXml(ExportCommand):
+    script = "exportBoekenTitelXml"
+    definition = exports.boekenTitel
+
+    def addArguments(self, parser):
+        parser.add_argument("-s", "--statusFilter",
+                            help="boek status filter in SQL (default the filter \"" +
+                                 filtersSqlText(self.definition, boekStatusFilters) + "\")")
+        parser.add_argument("-t", "--typeFilter", help="boek type filter in SQL (default none)")
+        addFilterArguments(parser)
+        parser.add_argument("-o", "--outputPath", help="XML output file path (default none)")
+        defaultXslPath = "boekenTitel.xsl"
+        parser.add_argument("-x", "--xslPath", help="XSL file path (default " + defaultXslPath + ")",
+                            default=defaultXslPath)
+        addNestedArguments(parser, self.definition)
+
+    def createJob(self, args, databaseConfig):
+        definition = definitionOf(self, args)
+        xmlWriter = XmlWriter("boeken", "titel", listFieldsOf(
+            definition, projectedFieldsOf(self, args, exports.boekenTitelXmlFields), textElements), args.xslPath)
+        whereClause, whereParameters = whereFilterOf(self, args, boekStatusFilters, args.typeFilter)
+        return ExportJob(definition, [Output(args.outputPath, xmlWriter)], whereClause=whereClause,
+                         orderBy=definition.orderExpressions(exports.boekenTitelOrderBy),
+                         whereParameters=whereParameters)
+
+
+class BoekenBoekXml(ExportCommand):
+    script = "exportBoekenBoekXml"
+    definition = exports.boekenBoek
+
+    def addArguments(self, parser):
+        parser.add_argument("-s", "--statusFilter",
+                            help="boek status filter in SQL (default the filter \"" +
+                                 filtersSqlText(self.definition, boekStatusFilters) + "\")")
+        parser.add_argument("-t", "--typeFilter", help="boek type filter in SQL (default none)")
+        addFilterArguments(parser)
+        parser.add_argument("-o", "--outputPath", help="XML output file path (default none)")
+        addDeltaArguments(parser)
+
+    def createJob(self, args, databaseConfig):
+        xmlWriter = XmlWriter("boeken", "boek", projectedFieldsOf(self, args, exports.boekenBoekXmlFields),
+                              "boekenBoek.xsl")
+        return createXmlJob(self, args, xmlWriter, whereFilterOf(self, args, boekStatusFilters, args.typeFilter),
+                            exports.boekenBoekOrderBy)
+
+
+class MuziekMediumCsv(ExportCommand):
+    script = "exportMuziekMediumCsv"
+    definition = exports.muziekMedium
+
+    def addArguments(self, parser):
+        parser.add_argument("-g", "--genre", help="genre (default " + classicalGenre + ")",
+                            choices=[classicalGenre, "rest"], default=classicalGenre)
+        parser.add_argument("-o", "--outputPath", help="CSV output file path (default none)")
+        addSplitArguments(parser, self.definition)
+        addDimensionArguments(parser)
+
+    def createJob(self, args, databaseConfig):
+        return createGenreJob(self, args, databaseConfig,
+                              lambda genre: CsvWriter(projectedFieldsOf(self, args,
+                                                                        exports.muziekMediumCsvFields[genre])),
+                              lambda genre: exports.muziekMediumCsvOrderBy, getDimensionCache(args))
+
+
+class MuziekMediumXml(ExportCommand):
+    script = "exportMuziekMediumXml"
+    definition = exports.muziekMedium
+
+    def addArguments(self, parser):
+        parser.add_argument("-s", "--statusFilter",
+                            help="medium status filter in SQL (default the filter \"" +
+                                 filtersSqlText(self.definition, mediumStatusFilters) + "\")")
+        parser.add_argument("-g", "--genreFilter", help="muziek genre filter in SQL (default none)")
+        addFilterArguments(parser)
+        parser.add_argument("-o", "--outputPath", help="XML output file path (default none)")
+        defaultXslPath = "muziekMedium.xsl"
+        parser.add_argument("-x", "--xslPath", help="XSL file path (default " + defaultXslPath + ")",
+                            default=defaultXslPath)
+        addDeltaArguments(parser)
+        addDimensionArguments(parser)
+
+    def createJob(self, args, databaseConfig):
+        xmlWriter = XmlWriter("muziek", "medium", projectedFieldsOf(self, args, exports.muziekMediumXmlFields),
+                              args.xslPath)
+        return createXmlJob(self, args, xmlWriter, whereFilterOf(self, args, mediumStatusFilters, args.genreFilter),
+                            exports.muziekMediumXmlOrderBy, getDimensionCache(args))
+
+
+class MuziekOpnameCsv(ExportCommand):
+    script = "exportMuziekOpnameCsv"
+    definition = exports.muziekOpname
+
+    def addArguments(self, parser):
+        parser.add_argument("-g", "--genre", help="genre (default " + classicalGenre + ")",
+                            choices=[classicalGenre, "rest"], default=classicalGenre)
+        parser.add_argument("-o", "--outputPath", help="CSV output file path (default none)")
+        addFormatArguments(parser)
+        addPartitionArguments(parser)
+        addSplitArguments(parser, self.definition)
+        addNestedArguments(parser, self.definition)
+        addDimensionArguments(parser)
+
+    def createJob(self, args, databaseConfig):
+        definition = definitionOf(self, args)
+        return createGenreJob(self, args, databaseConfig,
+                              lambda genre: tableWriterOf(definition, args, listFieldsOf(
+                                  definition, projectedFieldsOf(self, args, exports.muziekOpnameCsvFields[genre]),
+                                  quotedList)),
+                              lambda genre: definition.orderExpressions(exports.muziekOpnameCsvOrderBy[genre]),
+                              getDimensionCache(args))
+
+
+class MuziekOpnameXml(ExportCommand):
+    script = "exportMuziekOpnameXml"
+    definition = exports.muziekOpname
+
+    def addArguments(self, parser):
+        parser.add_argument("-s", "--statusFilter",
+                            help="medium status filter in SQL (default the filter \"" +
+                                 filtersSqlText(self.definition, mediumStatusFilters) + "\")")
+        parser.add_argument("-g", "--genreFilter", help="muziek genre filter in SQL (default none)")
+        addFilterArguments(parser)
+        parser.add_argument("-o", "--outputPath", help="XML output file path (default none)")
+        defaultXslPath = "muziekOpname.xsl"
+        parser.add_argument("-x", "--xslPath", help="XSL file path (default " + defaultXslPath + ")",
+                            default=defaultXslPath)
+        addPartitionArguments(parser)
+        addNestedArguments(parser, self.definition)
+        addDimensionArguments(parser)
+
+    def createJob(self, args, databaseConfig):
+        definition = definitionOf(self, args)
+        xmlWriter = XmlWriter("muziek", "opname", listFieldsOf(
+            definition, projectedFieldsOf(self, args, exports.muziekOpnameXmlFields), textElements), args.xslPath)
+        whereClause, whereParameters = whereFilterOf(self, args, mediumStatusFilters, args.genreFilter)
+        return createPartitionableJob(self, args, databaseConfig, xmlWriter, whereClause,
+                                      definition.orderExpressions(exports.muziekOpnameXmlOrderBy), whereParameters)
+
+
+class FinancienRubriekCsv(ExportCommand):
+    script = "exportFinancienRubriekCsv"
+    definition = exports.financienRubriek
+    defaultRekeningen = "1:ING Betaal, 39:ING CreditCard"
+
+    def addArguments(self, parser):
+        defaultYear = "2020"
+        parser.add_argument("-y", "--year", help="year, or range of years like 2016-2020 (default " + defaultYear + ")",
+                            type=parseYears, default=defaultYear)
+        parser.add_argument("-r", "--rekening", action="append",
+                            help="account as id:name, may be repeated (default rekeningen in section financien of " +
+                                 "the configuration file, or \"" + self.defaultRekeningen + "\")")
+        parser.add_argument("-o", "--outputPath",
+                            help="CSV output file path, with {year} for one file per year (default none)")
+        parser.add_argument("-f", "--format", choices=outputFormats, default=CSV,
+                            help="output format: the CSV report per rubriek, or the typed rows per rubriek, year " +
+                                 "and account in the columnar Arrow IPC stream or Parquet format, which need " +
+                                 "pyarrow (default " + CSV + ")")
+
+    def createJob(self, args, databaseConfig):
+        # Get the accounts from the command line, or else from the configuration file
+        try:
+            if args.rekening:
+                rekeningen = parseRekeningen(args.rekening)
+            else:
+                rekeningen = parseRekeningen(
+                    databaseConfig.get('financien', 'rekeningen', fallback=self.defaultRekeningen).split(","))
+        except ValueError as rekeningError:
+            print("Rekening error:", rekeningError)
+            sys.exit(1)
+
+        firstYear, lastYear = args.year
+        years = list(range(firstYear, lastYear + 1))
+
+        # Setup the reports: one file per year if the output path contains {year}, otherwise one file with all years.
+        # A columnar format has the rows of all years, as they are fetched, with the requested columns.
+        if args.columns and args.format == CSV:
+            print("The CSV report has fixed columns, --columns needs a columnar format")
+            sys.exit(1)
+        if args.format != CSV:
+            if args.outputPath and "{year}" in args.outputPath:
+                print("Output format", args.format, "does not support {year} in the output path")
+                sys.exit(1)
+            checkColumns(self, args)
+            checkColumnarFormat(args.format)
+            outputs = [Output(args.outputPath, ColumnarWriter(self.definition,
+                                                              args.columns or list(self.definition.columns),
+                                                              args.format))]
+        elif args.outputPath and "{year}" in args.outputPath:
+            outputs = [Output(args.outputPath.replace("{year}", str(year)), RubriekWriter([year], rekeningen))
+                       for year in years]
+        else:
+            outputs = [Output(args.outputPath, RubriekWriter(years, rekeningen))]
+
+        # Get the mutations of all years and accounts in a single scan.
+        # Exclude transfer to and from savings and stock accounts.
+        whereClause, whereParameters = filterClauseOf(self.definition, [
+            Filter("rubriek.rubriek", "notlike", ["TRANSFER:%"]),
+            Filter("rekening_mutatie.rekening_id", "in", [rekeningId for rekeningId, _ in rekeningen]),
+            Filter("rekening_mutatie.datum", "between",
+                   [datetime.date(firstYear, 1, 1), datetime.date(lastYear, 12, 31)])])
+        return ExportJob(self.definition, outputs, whereClause=whereClause,
+                         groupBy=exports.financienRubriekGroupBy, orderBy=exports.financienRubriekOrderBy,
+                         whereParameters=whereParameters)
+
+
+# The commands by the name of their export script
+commandsByScript = {command.script: command for command in [
+    BoekenTitelCsv(), BoekenTitelXml(), BoekenBoekXml(), MuziekMediumCsv(), MuziekMediumXml(), MuziekOpnameCsv(),
+    MuziekOpnameXml(), FinancienRubriekCsv()]}
+
+
+def createParser(command, prog=None):
+    """Create the parser of the command line arguments of a command"""
+    parser = argparse.ArgumentParser(prog=prog)
+    parser.add_argument("-c", "--configPath",
+                        help="database configuration file path (default " + defaultConfigPath + ")",
+                        default=defaultConfigPath)
+    command.addArguments(parser)
+    addColumnsArguments(parser, command.definition)
+    parser.add_argument("--fanOut", action="append",
+                        help="also run an export script of the same table with its arguments, like " +
+                             "\"exportMuziekMediumCsv -g rest -o muziekMedium.csv\", with the same query (may be " +
+                             "repeated)")
+    addCompressionArguments(parser)
+    addResultCacheArguments(parser)
+    addFetchArguments(parser)
+    addProfileArguments(parser)
+    return parser
+
+
+def createExportJob(command, args, databaseConfig):
+    """Create the export job of a command for the arguments, with the compression of the outputs and the fetch
+    strategy, combined with the export jobs of the fan-out scripts, and with the result cache
+    """
+    job = command.createJob(args, databaseConfig)
+    setCompression(job.outputs, args)
+    job.fetchStrategy = getFetchStrategy(args, databaseConfig, command.script)
+    if args.fanOut:
+        job = createFanOutJob(job, args, databaseConfig)
+    return cachedJobOf(command.script, args, job, getConnectorConfig(databaseConfig, job.definition.database))
+
+
+def createFanOutJob(job, args, databaseConfig):
+    """Combine the export job with the export jobs of the fan-out scripts"""
+
+    # Create the export job of each fan-out script with its arguments
+    exportJobs = [job]
+    for fanOutArgument in args.fanOut:
+        fanOutArguments = shlex.split(fanOutArgument)
+        script = os.path.splitext(fanOutArguments[0])[0] if fanOutArguments else ""
+        if script not in commandsByScript:
+            print("Fan-out has an unknown script:", script)
+            sys.exit(1)
+        fanOutCommand = commandsByScript[script]
+        fanOutArgs = createParser(fanOutCommand, prog=script + ".py").parse_args(fanOutArguments[1:])
+        exportJobs.append(createExportJob(fanOutCommand, fanOutArgs, databaseConfig))
+    if not canFanOut(exportJobs):
+        print("Fan-out needs exports of the same table, without delta, partitions, split output or GROUP BY")
+        sys.exit(1)
+    if not all([output.outputPath for exportJob in exportJobs for output in exportJob.outputs]):
+        print("Fan-out needs an output path for each export")
+        sys.exit(1)
+    return FanOutExportJob(exportJobs)
+
+
+def runCommand(command, argv=None):
+    """Run an export script: process the command line arguments, and export to the output files"""
+
+    # Process command line arguments
+    args = createParser(command).parse_args(argv)
+
+    # Read the database configuration file
+    databaseConfig = readDatabaseConfig(args.configPath)
+    mysqlConnectorConfig = getConnectorConfig(databaseConfig, command.definition.database)
+
+    # Import the MySQL connector only when the arguments and the configuration are valid, because it takes long
+    import mysql.connector
+
+    try:
+        job = createExportJob(command, args, databaseConfig)
+
+        # Setup a connection to the MySQL database, and export
+        connectStartTime = time.perf_counter()
+        mysqlConnection = mysql.connector.connect(**mysqlConnectorConfig)
+        connectTime = time.perf_counter() - connectStartTime
+        statistics = runProfiled(job, mysqlConnection, args.profileStats)
+        statistics.connectTime = connectTime
+        mysqlConnection.close()
+
+        if args.fetchReport:
+            print(statistics.report(), file=sys.stderr)
+        if args.profile:
+            writeProfileReport(args.profile, profileReport(command.script, job, statistics))
+
+    except configparser.Error as configParserError:
+        print("Configparser error:", configParserError)
+    except mysql.connector.Error as mysqlConnectionError:
+        reportMysqlError(mysqlConnectionError, mysqlConnectorConfig)
+        sys.exit(1)
+    else:
+        for output in [generatedOutput for output in job.outputs for generatedOutput in output.generatedOutputs()]:
+            if output.outputPath:
+                print(output.writer.fileType, "file", output.outputPath, "successfully generated")
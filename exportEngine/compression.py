@@ -0,0 +1,189 @@
+"""compression.py: Compress the output of an export while it is written, with blocks compressed concurrently"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import io
+import sys
+import lzma
+import zlib
+import gzip
+import collections
+import concurrent.futures
+
+# The zstd format needs zstandard, which is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+XZ = "xz"
+ZSTD = "zstd"
+NONE = "none"
+compressionFormats = [GZIP, XZ, ZSTD]
+
+# The compression format of an output file by its extension
+compressionExtensions = {".gz": GZIP, ".xz": XZ, ".zst": ZSTD}
+
+defaultCompressionLevels = {GZIP: 6, XZ: 6, ZSTD: 3}
+defaultCompressionThreads = os.cpu_count() or 1
+
+# Number of bytes compressed at once by a thread
+compressionBlockSize = 1024 * 1024
+
+
+def gzipCompressor(level):
+    def compress(block):
+        # A gzip member, with the gzip header and trailer
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(block) + compressor.flush()
+    return compress
+
+
+def xzCompressor(level):
+    return lambda block: lzma.compress(block, preset=level)
+
+
+def zstdCompressor(level):
+    # A zstandard compressor can not be used by several threads at once
+    return lambda block: zstandard.ZstdCompressor(level=level).compress(block)
+
+
+compressors = {GZIP: gzipCompressor, XZ: xzCompressor, ZSTD: zstdCompressor}
+
+
+class Compression:
+    """The compression format of an output file, with the compression level, and the number of threads compressing
+    blocks
+    """
+
+    def __init__(self, compressionFormat, level=None, threads=defaultCompressionThreads):
+        self.format = compressionFormat
+        self.level = level if level is not None else defaultCompressionLevels[compressionFormat]
+        self.threads = threads
+
+    def compressor(self):
+        """Get the function compressing a block"""
+        return compressors[self.format](self.level)
+
+
+def checkCompressionFormat(compressionFormat):
+    """Exit if the zstd format is requested, and zstandard is not available"""
+    if compressionFormat == ZSTD and zstandard is None:
+        print("Compression format", compressionFormat, "needs zstandard (pip install zstandard)")
+        sys.exit(1)
+
+
+def compressionOf(outputPath, compressionFormat=None, level=None, threads=defaultCompressionThreads):
+    """Get the compression of an output file: the compression format if given, or else the format of the extension
+    of the output path. Return None for an uncompressed output file.
+    """
+    if not compressionFormat and outputPath:
+        compressionFormat = compressionExtensions.get(os.path.splitext(outputPath)[1].lower())
+    if not compressionFormat or compressionFormat == NONE:
+        return None
+    checkCompressionFormat(compressionFormat)
+    return Compression(compressionFormat, level, threads)
+
+
+class CompressedFile(io.BufferedIOBase):
+    """A binary file which compresses the bytes written in blocks, in a pool of threads, so that compressing
+    overlaps with fetching and formatting the rows. The compressors release the GIL while compressing.
+
+    Each block is compressed into a complete gzip member, xz stream or zstd frame. The concatenation of these is a
+    valid compressed file, which gzip, xz and zstd decompress into the concatenation of the blocks.
+    """
+
+    def __init__(self, outputFile, compression, closeOutputFile=True):
+        super().__init__()
+        self.outputFile = outputFile
+        self.closeOutputFile = closeOutputFile
+        self.compress = compression.compressor()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=compression.threads,
+                                                              thread_name_prefix="compress")
+        self.maxPendingBlocks = 2 * compression.threads
+        self.pendingBlocks = collections.deque()
+        self.blockCount = 0
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= compressionBlockSize:
+            self.submitBlock(bytes(self.buffer[:compressionBlockSize]))
+            del self.buffer[:compressionBlockSize]
+        return len(data)
+
+    def submitBlock(self, block):
+        """Compress a block in the pool, and write the compressed blocks which are done, in the order of the blocks.
+        Wait for the first block when too many blocks are pending, so that the memory used is bounded.
+        """
+        self.pendingBlocks.append(self.executor.submit(self.compress, block))
+        self.blockCount += 1
+        while self.pendingBlocks and (len(self.pendingBlocks) > self.maxPendingBlocks or self.pendingBlocks[0].done()):
+            self.outputFile.write(self.pendingBlocks.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            # Compress the last block, also for an empty file, which must still be a valid compressed file
+            if self.buffer or self.blockCount == 0:
+                self.submitBlock(bytes(self.buffer))
+                self.buffer = bytearray()
+            while self.pendingBlocks:
+                self.outputFile.write(self.pendingBlocks.popleft().result())
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            if self.closeOutputFile:
+                self.outputFile.close()
+            else:
+                self.outputFile.flush()
+            super().close()
+
+
+def openCompressed(outputFile, compression, encoding=None, errors=None, closeOutputFile=True):
+    """Open a compressed file writing to the binary output file, as a text file if an encoding is given"""
+    compressedFile = CompressedFile(outputFile, compression, closeOutputFile)
+    if encoding is None:
+        return compressedFile
+    return io.TextIOWrapper(compressedFile, encoding=encoding, errors=errors)
+
+
+def openCompressedInput(inputPath, compression):
+    """Open a compressed file for reading the decompressed bytes, or the file itself if it is not compressed"""
+    if compression is None:
+        return open(inputPath, mode='rb')
+    if compression.format == GZIP:
+        return gzip.open(inputPath, mode='rb')
+    if compression.format == XZ:
+        return lzma.open(inputPath, mode='rb')
+    return zstandard.ZstdDecompressor().stream_reader(open(inputPath, mode='rb'), read_across_frames=True,
+                                                      closefd=True)
+
+
+def addCompressionArguments(parser):
+    """Add the arguments of the compression of the output files"""
+    parser.add_argument("--compression", choices=compressionFormats + [NONE],
+                        help="compress the output files, with zstd needing zstandard (default by the extension of " +
+                             "the output path: " + ", ".join([extension + " " + compressionFormat for extension,
+                                                              compressionFormat in compressionExtensions.items()]) +
+                             ")")
+    parser.add_argument("--compressionLevel", type=int,
+                        help="compression level (default " + ", ".join(
+                            [compressionFormat + " " + str(level) for compressionFormat, level in
+                             defaultCompressionLevels.items()]) + ")")
+    parser.add_argument("--compressionThreads", type=int, default=defaultCompressionThreads,
+                        help="number of threads compressing blocks of " + str(compressionBlockSize // 1024) +
+                             " KB concurrently (default " + str(defaultCompressionThreads) + ")")
+
+
+def setCompression(outputs, args):
+    """Set the compression of the outputs from the arguments"""
+    for output in outputs:
+        output.compression = compressionOf(output.outputPath, args.compression, args.compressionLevel,
+                                           max(1, args.compressionThreads))
@@ -0,0 +1,46 @@
+"""config.py: Read the database configuration file"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os.path
+import configparser
+
+defaultConfigPath = "database.ini"
+
+
+def readDatabaseConfig(configPath):
+    """Read the database configuration file, or exit if the file does not exist"""
+
+    # Check if the database configuration file exists
+    if not os.path.isfile(configPath):
+        print("Configuration file", configPath, "not found")
+        exit(1)
+
+    # Read the database configuration file
+    databaseConfig = configparser.ConfigParser()
+    databaseConfig.read(configPath)
+    return databaseConfig
+
+
+def getConnectorConfig(databaseConfig, databaseSection):
+    """Get the MySQL connector configuration of a database section (boeken, muziek, financien)"""
+    return {
+        'host': databaseConfig['connection']['host'],
+        'user': databaseConfig[databaseSection]['user'],
+        'password': databaseConfig[databaseSection]['password'],
+        'database': databaseConfig[databaseSection]['database'],
+        'raise_on_warnings': databaseConfig.getboolean('general', 'raise_on_warnings')
+    }
+
+
+def reportMysqlError(mysqlConnectionError, mysqlConnectorConfig):
+    """Print a MySQL connector error"""
+    from mysql.connector import errorcode
+    if mysqlConnectionError.errno == errorcode.ER_ACCESS_DENIED_ERROR:
+        print("Something is wrong with user name:", mysqlConnectorConfig['user'],
+              "or password:", mysqlConnectorConfig['password'])
+    elif mysqlConnectionError.errno == errorcode.ER_BAD_DB_ERROR:
+        print("Database", mysqlConnectorConfig['database'], "does not exist")
+    else:
+        print("MySQL error:", mysqlConnectionError)
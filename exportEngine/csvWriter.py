@@ -0,0 +1,92 @@
+"""csvWriter.py: Serialize rows of a database table as CSV"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+from exportEngine.definitions import listSeparator
+from exportEngine.codegen import rowGetter, valueExpression, compileFunction
+
+
+# Formatters of a field value: an empty value gives an empty field, otherwise the value is quoted
+
+def quotedText(value):
+    """Quote a text value, doubling the quotes in the text"""
+    return '"' + value.replace('"', '""') + '"' if value else ""
+
+
+def quotedPlain(value):
+    """Quote a value which cannot contain quotes (type, status, etc.)"""
+    return '"' + value + '"' if value else ""
+
+
+def quotedInt(value):
+    """Quote an int value"""
+    return '"' + str(value) + '"' if value else ""
+
+
+def quotedDate(dateFormat):
+    """Get a formatter which quotes a date value, formatted with dateFormat"""
+    def formatDate(value):
+        return '"' + value.strftime(dateFormat) + '"' if value else ""
+    formatDate.expression = "'\"' + {0}.strftime(" + repr(dateFormat) + ") + '\"' if {0} else ''"
+    return formatDate
+
+
+def quotedList(value):
+    """Quote a list of text values, separated by ; in the field"""
+    return quotedText(value.replace(listSeparator, "; ")) if value else ""
+
+
+# The Python expression of each formatter, with {0} for the value, used in the generated row formatter
+quotedText.expression = "'\"' + {0}.replace('\"', '\"\"') + '\"' if {0} else ''"
+quotedPlain.expression = "'\"' + {0} + '\"' if {0} else ''"
+quotedInt.expression = "'\"' + str({0}) + '\"' if {0} else ''"
+quotedList.expression = "'\"' + {0}.replace('\"', '\"\"').replace(" + repr(listSeparator) + \
+    ", '; ') + '\"' if {0} else ''"
+
+
+class CsvWriter:
+    """Format complete rows as CSV lines in one pass.
+
+    Each field is given as a tuple with the header of the field, the name of the column and the formatter of
+    the column value. When the export starts, a row formatter is generated for the fields, with the expression of
+    each formatter inlined, so that formatting a row has no loop over the fields and no calls of the formatters.
+    """
+
+    fileType = "CSV"
+    encoding = "iso-8859-1"
+    errors = None
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.columnNames = [columnName for _, columnName, _ in fields]
+        self.rowFormatter = None
+
+    def begin(self, columnNames):
+        """Generate the row formatter for the index in the row of each field, and return the CSV header line"""
+        self.rowFormatter = self.compileRowFormatter([columnNames.index(columnName)
+                                                      for _, columnName, _ in self.fields])
+        return ",".join([header for header, _, _ in self.fields]) + "\n"
+
+    def compileRowFormatter(self, indexes):
+        """Generate the function formatting a batch of rows as CSV lines, like:
+
+            def formatRows(rows):
+                return "".join([",".join((('"' + v0 + '"' if v0 else ''), ...)) + "\\n"
+                                for v0, ... in map(getter, rows)])
+        """
+        namespace = {"getter": rowGetter(indexes)}
+        valueNames = ["v" + str(fieldIndex) for fieldIndex in range(len(self.fields))]
+        fieldExpressions = [valueExpression(formatter, valueName, namespace)
+                            for (_, _, formatter), valueName in zip(self.fields, valueNames)]
+        return compileFunction("formatRows", [
+            "def formatRows(rows):",
+            "    return \"\".join([\",\".join((" + ", ".join(fieldExpressions) + ",)) + \"\\n\"",
+            "                    for " + ", ".join(valueNames) + ", in map(getter, rows)])"], namespace)
+
+    def formatRows(self, rows):
+        """Format a batch of rows as CSV lines"""
+        return self.rowFormatter(rows)
+
+    def end(self):
+        return ""
@@ -0,0 +1,185 @@
+"""definitions.py: Declarative definition of an export: the table, its joins and its columns"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import re
+
+# Kinds of column values
+TEXT = "text"
+INT = "int"
+DATE = "date"
+DECIMAL = "decimal"
+LIST = "list"
+
+# Separator of the values of a list column, which does not occur in text
+listSeparator = "\x1f"
+
+# Table names referenced in an SQL expression, like persoon in persoon.persoon
+tableReferencePattern = re.compile(r"\b([A-Za-z_][A-Za-z0-9_]*)\.[A-Za-z_]")
+
+# An SQL expression which is just a column of a table, like persoon.persoon
+tableColumnPattern = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_]*)")
+
+# An SQL expression which is an aggregate of the rows of a group, like sum(rekening_mutatie.mutatie_in)
+aggregatePattern = re.compile(r"(?:sum|count|avg|min|max|group_concat|std|stddev|variance)\s*\(", re.IGNORECASE)
+
+
+def referencedTables(sqlExpression):
+    """Get the names of the tables referenced in an SQL expression"""
+    return tableReferencePattern.findall(sqlExpression) if sqlExpression else []
+
+
+def sortKeyOf(sortValues):
+    """Get the key to sort rows in Python on the values of their sort key expressions, with NULL first as in the
+    database
+    """
+    return tuple([(0, 0) if sortValue is None else (1, sortValue) for sortValue in sortValues])
+
+
+class Join:
+    """LEFT JOIN of a table on table.key = foreignKey.
+
+    A join with fanOut set gives more than one row for a row of the joined-from table (like the persons of
+    auteurs), and is therefore always part of the query.
+    A join with dimension set is a small lookup table (like genre), of which the columns can be looked up in the
+    client on the foreign key instead of joined by the server.
+    """
+
+    def __init__(self, table, key, foreignKey, fanOut=False, dimension=False):
+        self.table = table
+        self.key = key
+        self.foreignKey = foreignKey
+        self.fanOut = fanOut
+        self.dimension = dimension
+        self.requiredTables = referencedTables(foreignKey)
+
+    def sql(self):
+        return "LEFT JOIN " + self.table + " ON " + self.table + "." + self.key + " = " + self.foreignKey
+
+
+class Column:
+    """A column of an export: its name, the SQL expression, and the kind of value. An expression with a filter has
+    the values of its %s placeholders as parameters. An aggregate column (like a sum) has a value per group of rows,
+    and cannot be used in the WHERE clause.
+    """
+
+    def __init__(self, name, expression, kind=TEXT, parameters=()):
+        self.name = name
+        self.expression = expression
+        self.kind = kind
+        self.parameters = tuple(parameters)
+        self.requiredTables = referencedTables(expression)
+        self.aggregate = bool(aggregatePattern.match(expression))
+
+
+class ExportDefinition:
+    """The definition of an export: the database section, the driving table with its primary key, the joins
+    and the columns which can be exported, and optionally the date on which a row was last changed.
+    """
+
+    def __init__(self, name, database, table, primaryKey, joins, columns, changeDate=None):
+        self.name = name
+        self.database = database
+        self.table = table
+        self.primaryKey = primaryKey
+        self.joins = joins
+        self.columns = {column.name: column for column in columns}
+        self.joinsByTable = {join.table: join for join in joins}
+        self.changeDate = changeDate
+        self.listExpressions = {}
+        self.nested = None
+
+    def dimensionJoin(self, column):
+        """Get the dimension join of a column which is just a column of a dimension table, or None"""
+        tableColumnMatch = tableColumnPattern.fullmatch(column.expression)
+        if not tableColumnMatch:
+            return None
+        join = self.joinsByTable.get(tableColumnMatch.group(1))
+        return join if join and join.dimension else None
+
+    def sortKeyExpression(self, orderExpression):
+        """Get the expression of the sort key of an ORDER BY expression, which sorts in Python in the same way as
+        in the database: the weight string of the collation for text columns, otherwise the value itself
+        """
+        for column in self.columns.values():
+            if column.expression == orderExpression and column.kind in (TEXT, LIST):
+                return "WEIGHT_STRING(" + orderExpression + ")"
+        return orderExpression
+
+    def nestedDefinition(self):
+        """Get the definition with a row per row of the table, instead of a row per row of the fan-out joins. The
+        columns of the tables joined through a fan-out join are lists: a subquery concatenates the values of the
+        rows of the fan-out join, sorted and separated by the list separator.
+        """
+        if self.nested is not None:
+            return self.nested
+
+        # The tables joined through a fan-out join, in the order of the definition
+        fanOutTables = []
+        for join in self.joins:
+            if join.fanOut or set(join.requiredTables) & set(fanOutTables):
+                fanOutTables.append(join.table)
+
+        columns = []
+        listExpressions = {}
+        for column in self.columns.values():
+            if set(column.requiredTables) & set(fanOutTables):
+                listExpressions[column.expression] = self.listExpression(column.expression, fanOutTables)
+                column = Column(column.name, listExpressions[column.expression], LIST)
+            columns.append(column)
+        self.nested = ExportDefinition(self.name + "Nested", self.database, self.table, self.primaryKey,
+                                       [join for join in self.joins if join.table not in fanOutTables], columns,
+                                       self.changeDate)
+        self.nested.listExpressions = listExpressions
+        return self.nested
+
+    def listExpression(self, expression, fanOutTables):
+        """Get the subquery concatenating the values of an expression on tables joined through a fan-out join"""
+        requiredTables = set()
+        tables = [table for table in referencedTables(expression) if table in fanOutTables]
+        while tables:
+            table = tables.pop()
+            if table not in requiredTables:
+                requiredTables.add(table)
+                tables += [table for table in self.joinsByTable[table].requiredTables if table in fanOutTables]
+        joins = [join for join in self.joins if join.table in requiredTables]
+        fanOutJoin = joins[0]
+        return "(SELECT GROUP_CONCAT({0} ORDER BY {0} SEPARATOR '{1}') FROM {2} {3}WHERE {2}.{4} = {5})".format(
+            expression, listSeparator, fanOutJoin.table, "".join([join.sql() + " " for join in joins[1:]]),
+            fanOutJoin.key, fanOutJoin.foreignKey)
+
+    def orderExpressions(self, orderBy):
+        """Get the ORDER BY expressions for the definition, with the list of a nested definition instead of the
+        column of a fan-out join
+        """
+        return [self.listExpressions.get(expression, expression) for expression in orderBy]
+
+    def requiredJoins(self, expressions):
+        """Get the joins needed for the SQL expressions, in the order of the definition"""
+        requiredTables = set()
+        tables = [table for expression in expressions for table in referencedTables(expression)]
+        tables += [join.table for join in self.joins if join.fanOut]
+        while tables:
+            table = tables.pop()
+            if table in requiredTables or table not in self.joinsByTable:
+                continue
+            requiredTables.add(table)
+            tables += self.joinsByTable[table].requiredTables
+        return [join for join in self.joins if join.table in requiredTables]
+
+    def buildQuery(self, columns, whereClause=None, orderBy=(), groupBy=()):
+        """Build the query of the columns, with only the joins needed by the columns, WHERE, GROUP BY and
+        ORDER BY clauses
+        """
+        expressions = [column.expression for column in columns]
+        joins = self.requiredJoins(expressions + [whereClause] + list(orderBy) + list(groupBy))
+        query = "SELECT " + ", ".join(expressions) + " FROM " + self.table + " "
+        query += "".join([join.sql() + " " for join in joins])
+        if whereClause:
+            query += "WHERE " + whereClause + " "
+        if groupBy:
+            query += "GROUP BY " + ", ".join(groupBy) + " "
+        if orderBy:
+            query += "ORDER BY " + ", ".join(orderBy)
+        return query.rstrip()
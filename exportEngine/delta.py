@@ -0,0 +1,276 @@
+"""delta.py: Export only the rows changed since the last export, and merge these into the previous XML output"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import re
+import json
+import time
+import heapq
+import hashlib
+import datetime
+import threading
+import xml.etree.ElementTree as ElementTree
+from exportEngine.definitions import Column, sortKeyOf
+from exportEngine.executor import Output, ExportJob, runExport, formatAndWrite, queryParametersOf, executeQuery, \
+    closeAfterError
+from exportEngine.compression import openCompressedInput
+from exportEngine.fetch import FetchStatistics
+
+defaultStatePath = "exportState.json"
+
+# Names of the extra columns of a delta export
+keyColumnName = "delta_key"
+changeDateColumnName = "delta_change_date"
+inFilterColumnName = "delta_in_filter"
+sortKeyColumnPrefix = "delta_sort_key_"
+
+# Number of merged rows written at once
+mergeBatchSize = 1000
+
+# The state file is shared by the exports of a job list, which can run concurrently
+stateLock = threading.Lock()
+
+
+def jsonValue(value):
+    """Convert a sort key value of the database to a JSON value which sorts in the same way"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def readStates(statePath):
+    """Read the states of the delta exports"""
+    if not os.path.isfile(statePath):
+        return {}
+    with open(statePath, encoding="utf8") as stateFile:
+        return json.load(stateFile)
+
+
+def updateState(statePath, stateKey, state):
+    """Update (or with state None remove) the state of a delta export in the state file"""
+    with stateLock:
+        states = readStates(statePath)
+        if state is None:
+            states.pop(stateKey, None)
+        else:
+            states[stateKey] = state
+        with open(statePath + ".tmp", mode='w', encoding="utf8") as stateFile:
+            json.dump(states, stateFile, indent=2, sort_keys=True)
+        os.replace(statePath + ".tmp", statePath)
+
+
+class KeyIndexWriter:
+    """Write the primary key and the sort key values of each row as a JSON line, which are needed to merge the
+    changed rows of the next delta export into the output. Keep the latest change date as the high-water mark.
+    """
+
+    fileType = "Key index"
+    encoding = "utf8"
+    errors = None
+
+    def __init__(self, sortKeyColumnNames):
+        self.columnNames = [keyColumnName, changeDateColumnName] + sortKeyColumnNames
+        self.columnIndexes = []
+        self.highWaterMark = None
+
+    def begin(self, columnNames):
+        self.columnIndexes = [columnNames.index(columnName) for columnName in self.columnNames]
+        return ""
+
+    def formatRows(self, rows):
+        keyIndex, changeDateIndex = self.columnIndexes[0:2]
+        sortKeyIndexes = self.columnIndexes[2:]
+        lines = []
+        for row in rows:
+            changeDate = row[changeDateIndex]
+            if changeDate is not None and (self.highWaterMark is None or changeDate > self.highWaterMark):
+                self.highWaterMark = changeDate
+            lines.append(json.dumps([row[keyIndex], [jsonValue(row[index]) for index in sortKeyIndexes]]) + "\n")
+        return "".join(lines)
+
+    def end(self):
+        return ""
+
+
+class DeltaExportJob(ExportJob):
+    """An export to an XML file, which after a first full export only fetches the rows with a change date on or
+    after the high-water mark of the previous export. Changed rows replace the previous version of the row, and are
+    merged into the previous output in the order of the query, using the collation weights of the ORDER BY columns.
+
+    The high-water mark, and a fingerprint of the query, are kept in the state file. Next to the output file a key
+    index file keeps the primary key and the sort key of each row. A full export is done when there is no state,
+    the query changed, or the number of rows after the merge does not match the number of rows in the database
+    (because of deleted rows, or rows without change date).
+    """
+
+    def __init__(self, definition, outputs, whereClause=None, orderBy=(), statePath=defaultStatePath, stateKey=None,
+                 dimensionCache=None, whereParameters=()):
+        super().__init__(definition, outputs, whereClause, orderBy, dimensionCache=dimensionCache,
+                         whereParameters=whereParameters)
+        self.statePath = statePath
+        self.stateKey = stateKey
+        self.output = outputs[0]
+        self.keysPath = self.output.outputPath + ".keys"
+
+        # The previous output is parsed again, which must give the same texts
+        self.output.writer.keepCarriageReturns = True
+        fingerprintText = self.query
+        if self.queryParameters:
+            fingerprintText += json.dumps(self.queryParameters, default=str)
+        self.fingerprint = hashlib.sha256(fingerprintText.encode("utf-8")).hexdigest()
+
+        # The extra columns to merge the changed rows into the previous output
+        self.keyColumn = Column(keyColumnName, definition.table + "." + definition.primaryKey)
+        self.changeDateColumn = Column(changeDateColumnName, definition.changeDate)
+        self.sortKeyColumns = [Column(sortKeyColumnPrefix + str(orderIndex), definition.sortKeyExpression(expression))
+                               for orderIndex, expression in enumerate(orderBy)]
+
+    def run(self, mysqlConnection):
+        state = readStates(self.statePath).get(self.stateKey)
+
+        # Remove the state during the export, so that a failed export is never the base of a delta export
+        updateState(self.statePath, self.stateKey, None)
+
+        deltaResult = None
+        if state and state.get("fingerprint") == self.fingerprint and state.get("highWaterMark") and \
+                os.path.isfile(self.output.outputPath) and os.path.isfile(self.keysPath):
+            deltaResult = self.runDelta(mysqlConnection, state["highWaterMark"])
+        statistics, highWaterMark = deltaResult if deltaResult else self.runFull(mysqlConnection)
+
+        updateState(self.statePath, self.stateKey, {
+            "fingerprint": self.fingerprint,
+            "highWaterMark": jsonValue(highWaterMark) if highWaterMark else None
+        })
+        return statistics
+
+    def runFull(self, mysqlConnection):
+        """Export all rows, with the key index. Return the statistics and the high-water mark."""
+        keysOutput = Output(self.keysPath, KeyIndexWriter([column.name for column in self.sortKeyColumns]))
+        job = ExportJob(self.definition, self.outputs + [keysOutput], self.whereClause, self.orderBy,
+                        extraColumns=[self.keyColumn, self.changeDateColumn] + self.sortKeyColumns,
+                        dimensionCache=self.dimensionCache, whereParameters=self.whereParameters)
+        job.fetchStrategy = self.fetchStrategy
+        statistics = runExport(mysqlConnection, job)
+        return statistics, keysOutput.writer.highWaterMark
+
+    def runDelta(self, mysqlConnection, highWaterMark):
+        """Fetch the rows changed since the high-water mark, and merge these into the previous output.
+        Return the statistics and the new high-water mark, or None if a full export is needed.
+        """
+        if not re.match(r"^[0-9][0-9 :.T-]*$", highWaterMark):
+            return None
+
+        statistics = FetchStatistics(self.fetchStrategy)
+        startTime = time.perf_counter()
+        self.prepareSession(mysqlConnection)
+        self.loadDimensions(mysqlConnection)
+
+        # Get the number of rows the output must have after the merge
+        countCursor = mysqlConnection.cursor(buffered=True)
+        executeQuery(countCursor, self.definition.buildQuery([Column("row_count", "count(*)")], self.whereClause),
+                     self.whereParameters)
+        (expectedRowCount,) = countCursor.fetchone()
+        countCursor.close()
+
+        # Get the changed rows, whether or not they are selected by the filter: a changed row which is no longer
+        # selected must be removed from the output
+        inFilterColumn = Column(inFilterColumnName,
+                                "CASE WHEN " + self.whereClause + " THEN 1 ELSE 0 END" if self.whereClause else "1",
+                                parameters=self.whereParameters)
+        deltaColumns = self.columns + [self.keyColumn, self.changeDateColumn, inFilterColumn] + self.sortKeyColumns
+        deltaColumnNames = [column.name for column in deltaColumns]
+        deltaQuery = self.definition.buildQuery(deltaColumns, self.definition.changeDate + " >= %s", self.orderBy)
+        cursor = self.fetchStrategy.cursor(mysqlConnection, prepared=True)
+        executeQuery(cursor, deltaQuery, queryParametersOf(deltaColumns, [highWaterMark]))
+        statistics.executeTime = time.perf_counter() - startTime
+
+        xmlWriter = self.output.writer
+        header = xmlWriter.begin(deltaColumnNames)
+        keyIndex = deltaColumnNames.index(keyColumnName)
+        changeDateIndex = deltaColumnNames.index(changeDateColumnName)
+        inFilterIndex = deltaColumnNames.index(inFilterColumnName)
+        sortKeyIndexes = [deltaColumnNames.index(column.name) for column in self.sortKeyColumns]
+
+        changedKeys = set()
+        changedEntries = []
+        try:
+            for rows in self.fetchStrategy.fetchBatches(cursor, statistics):
+                for row in self.resolveDimensions(rows):
+                    changedKeys.add(row[keyIndex])
+                    changeDate = jsonValue(row[changeDateIndex])
+                    if changeDate is not None and changeDate > highWaterMark:
+                        highWaterMark = changeDate
+                    if row[inFilterIndex]:
+                        sortValues = [jsonValue(row[index]) for index in sortKeyIndexes]
+                        changedEntries.append((sortKeyOf(sortValues), row[keyIndex], sortValues,
+                                               xmlWriter.fieldTexts(row)))
+        except BaseException:
+            closeAfterError(cursor)
+            raise
+        cursor.close()
+        changedEntries.sort(key=lambda entry: entry[0])
+
+        # Merge the unchanged rows of the previous output and the changed rows into new files
+        unchangedEntries = (entry for entry in self.previousEntries() if entry[1] not in changedKeys)
+        mergedEntries = heapq.merge(unchangedEntries, changedEntries, key=lambda entry: entry[0])
+        mergedOutput = Output(self.output.outputPath + ".tmp", xmlWriter)
+        mergedOutput.compression = self.output.compression
+        mergedKeysPath = self.keysPath + ".tmp"
+        try:
+            mergedOutput.open()
+            mergedOutput.write(header)
+            rowCount = 0
+            with open(mergedKeysPath, mode='w', encoding="utf8") as mergedKeysFile:
+                while True:
+                    entries = [entry for _, entry in zip(range(mergeBatchSize), mergedEntries)]
+                    if not entries:
+                        break
+                    rowCount += len(entries)
+                    formatAndWrite(mergedOutput, xmlWriter.formatTextRows,
+                                   [fieldTexts for _, _, _, fieldTexts in entries], statistics)
+                    mergedKeysFile.write("".join([json.dumps([key, sortValues]) + "\n"
+                                                  for _, key, sortValues, _ in entries]))
+            mergedOutput.write(xmlWriter.end())
+            mergedOutput.close()
+            statistics.bytesWritten = mergedOutput.bytesWritten
+
+            # Deleted rows, or rows without change date, are not noticed by the delta: export all rows instead
+            if rowCount != expectedRowCount:
+                return None
+
+            os.replace(mergedOutput.outputPath, self.output.outputPath)
+            os.replace(mergedKeysPath, self.keysPath)
+        finally:
+            # The merged files which were not renamed are incomplete, or do not match the database
+            mergedOutput.discard()
+            for mergedPath in [mergedOutput.outputPath, mergedKeysPath]:
+                if os.path.exists(mergedPath):
+                    os.remove(mergedPath)
+        statistics.totalTime = time.perf_counter() - startTime
+        return statistics, highWaterMark
+
+    def previousEntries(self):
+        """Read the rows of the previous output with their key and sort values, without keeping the XML tree"""
+        fieldTags = [fieldTag for fieldTag, _, _ in self.output.writer.fields]
+        with open(self.keysPath, encoding="utf8") as keysFile, \
+                openCompressedInput(self.output.outputPath, self.output.compression) as outputFile:
+            xmlEvents = ElementTree.iterparse(outputFile, events=("start", "end"))
+            tableElement = None
+            for event, element in xmlEvents:
+                if event == "start":
+                    # The first element after the database element is the table element
+                    if tableElement is None and element.tag == self.output.writer.tableTag:
+                        tableElement = element
+                    continue
+                if element.tag != "row":
+                    continue
+                fieldTexts = {fieldElement.tag: fieldElement.text or "" for fieldElement in element}
+                key, sortValues = json.loads(keysFile.readline())
+                yield sortKeyOf(sortValues), key, sortValues, [fieldTexts.get(fieldTag, "") for fieldTag in fieldTags]
+
+                # Remove the row which has been read from the tree
+                tableElement.clear()
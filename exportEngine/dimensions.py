@@ -0,0 +1,97 @@
+"""dimensions.py: Cache of the small lookup tables of a database, to look up names in the client instead of joining"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import json
+import threading
+
+defaultDimensionCachePath = "dimensionCache"
+
+# The caches by path, shared by the exports running in one process
+dimensionCaches = {}
+dimensionCachesLock = threading.Lock()
+
+
+class DimensionCache:
+    """Maps of id to value of the columns of dimension tables, loaded once per process, and kept on disk in a
+    directory with a JSON file per column. A file is used as long as the row count and the checksum of its table
+    did not change.
+    """
+
+    def __init__(self, cachePath):
+        self.cachePath = cachePath
+        self.valueMaps = {}
+        self.lock = threading.Lock()
+
+    def valueMap(self, mysqlConnection, database, table, key, column):
+        """Get the map of the key to the value of a column of a dimension table"""
+        mapKey = (database, table, key, column)
+        with self.lock:
+            if mapKey not in self.valueMaps:
+                self.valueMaps[mapKey] = self.loadValueMap(mysqlConnection, database, table, key, column)
+            return self.valueMaps[mapKey]
+
+    def loadValueMap(self, mysqlConnection, database, table, key, column):
+        """Load the map from the cache file if the table did not change, otherwise from the table"""
+        cursor = mysqlConnection.cursor(buffered=True)
+        cursor.execute("SELECT count(*) FROM " + table)
+        (rowCount,) = cursor.fetchone()
+        cursor.execute("CHECKSUM TABLE " + table)
+        _, checksum = cursor.fetchone()
+
+        valueMap = self.readCacheFile(database, table, key, column, rowCount, checksum)
+        if valueMap is None:
+            cursor.execute(valuesQueryOf(table, key, column))
+            valueMap = self.writeCacheFile(database, table, key, column, rowCount, checksum, cursor.fetchall())
+        cursor.close()
+        return valueMap
+
+    def cacheFilePath(self, database, table, column):
+        return os.path.join(self.cachePath, "{}.{}.{}.json".format(database, table, column))
+
+    def readCacheFile(self, database, table, key, column, rowCount, checksum):
+        """Get the map from the cache file if the row count and the checksum of the table did not change, or None"""
+        cacheFilePath = self.cacheFilePath(database, table, column)
+        if not os.path.isfile(cacheFilePath):
+            return None
+        with open(cacheFilePath, encoding="utf8") as cacheFile:
+            cached = json.load(cacheFile)
+        if cached["rowCount"] != rowCount or cached["checksum"] != checksum or cached["key"] != key:
+            return None
+        return {rowKey: value for rowKey, value in cached["values"]}
+
+    def writeCacheFile(self, database, table, key, column, rowCount, checksum, values):
+        """Write the key and value pairs of the table to the cache file, and return the map"""
+        # Write the cache file via a temporary file, so that a concurrent export never reads half a file
+        cacheFilePath = self.cacheFilePath(database, table, column)
+        os.makedirs(self.cachePath, exist_ok=True)
+        with open(cacheFilePath + ".tmp", mode='w', encoding="utf8") as cacheFile:
+            json.dump({"rowCount": rowCount, "checksum": checksum, "key": key, "values": values}, cacheFile)
+        os.replace(cacheFilePath + ".tmp", cacheFilePath)
+        return {rowKey: value for rowKey, value in values}
+
+
+def valuesQueryOf(table, key, column):
+    """Get the query of the key and the value of a column of a dimension table"""
+    return "SELECT {0}.{1}, {0}.{2} FROM {0}".format(table, key, column)
+
+
+def getDimensionCache(args):
+    """Get the dimension cache of the arguments, shared by the exports in the process, or None if not used"""
+    if not args.dimensionCache:
+        return None
+    with dimensionCachesLock:
+        if args.dimensionCachePath not in dimensionCaches:
+            dimensionCaches[args.dimensionCachePath] = DimensionCache(args.dimensionCachePath)
+        return dimensionCaches[args.dimensionCachePath]
+
+
+def addDimensionArguments(parser):
+    """Add the arguments of the dimension cache"""
+    parser.add_argument("--dimensionCache", action="store_true",
+                        help="look up the names of small lookup tables in the client instead of joining them")
+    parser.add_argument("--dimensionCachePath",
+                        help="dimension cache directory (default " + defaultDimensionCachePath + ")",
+                        default=defaultDimensionCachePath)
@@ -0,0 +1,259 @@
+"""executor.py: Execute the query of an export, and write the rows to the outputs"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import sys
+import time
+from exportEngine.definitions import INT, Column
+from exportEngine.fetch import FetchStrategy, FetchStatistics
+from exportEngine.compression import compressionOf, openCompressed
+from exportEngine.pipeline import runPipeline
+
+# The lists of a nested export are concatenated by GROUP_CONCAT, which MySQL truncates at group_concat_max_len
+# (1024 bytes by default): allow lists up to the maximum size of a packet, the limit of any value of a row
+groupConcatMaxLenStatement = "SET SESSION group_concat_max_len = @@max_allowed_packet"
+
+
+class Output:
+    """An output file of an export, with the writer formatting the rows for the file.
+
+    A writer has the columnNames it needs, the fileType, encoding and errors of the output file, and the methods
+    begin(columnNames), formatRows(rows) and end(), which return the text to write. A writer without encoding
+    returns bytes, for a binary output file.
+    Without an output path the output is written to stdout. The output is compressed while it is written if the
+    output path has the extension of a compression format (like .gz), or if the compression is set.
+    """
+
+    def __init__(self, outputPath, writer):
+        self.outputPath = outputPath
+        self.writer = writer
+        self.compression = compressionOf(outputPath)
+        self.outputFile = None
+        self.bytesWritten = 0
+
+    def open(self, append=False):
+        """Open the output file, or open it to append to what was written before"""
+        fileMode = 'a' if append else 'w'
+        if self.compression:
+            # The compressed blocks appended to a compressed file are a valid compressed file
+            outputFile = open(self.outputPath, mode=fileMode + 'b') if self.outputPath else sys.stdout.buffer
+            self.outputFile = openCompressed(outputFile, self.compression, self.writer.encoding, self.writer.errors,
+                                             closeOutputFile=bool(self.outputPath))
+        elif self.writer.encoding is None:
+            self.outputFile = open(self.outputPath, mode=fileMode + 'b') if self.outputPath else sys.stdout.buffer
+        else:
+            self.outputFile = open(self.outputPath, mode=fileMode, encoding=self.writer.encoding,
+                                   errors=self.writer.errors) if self.outputPath else sys.stdout
+
+    def write(self, text):
+        if text:
+            self.outputFile.write(text)
+
+    def close(self):
+        if self.outputPath or self.compression:
+            self.outputFile.close()
+        else:
+            self.outputFile.flush()
+        self.outputFile = None
+        if self.outputPath:
+            self.bytesWritten = os.path.getsize(self.outputPath)
+
+    def discard(self):
+        """Close the output file of an export which failed, and remove it. An output which is not open was not
+        written, or was closed when it was complete, and is kept.
+        """
+        if self.outputFile is None:
+            return
+        try:
+            self.close()
+        except Exception:
+            # The output file is removed anyway
+            self.outputFile = None
+        if self.outputPath and os.path.exists(self.outputPath):
+            os.remove(self.outputPath)
+
+    def generatedOutputs(self):
+        """Get the outputs of the files which were written"""
+        return [self]
+
+
+def queryParametersOf(columns, whereParameters=()):
+    """Get the values of the %s placeholders of a query: the parameters of the columns, and of the WHERE clause"""
+    return tuple([parameter for column in columns for parameter in column.parameters]) + tuple(whereParameters)
+
+
+def executeQuery(cursor, query, parameters):
+    """Execute a query, with its parameters if it has any"""
+    if parameters:
+        cursor.execute(query, parameters)
+    else:
+        cursor.execute(query)
+
+
+class ExportJob:
+    """An export of a definition to one or more outputs, with the query of the columns needed by the writers,
+    and the strategy to fetch the rows. Writers may also need extra columns, which are not in the definition.
+    With a dimension cache the columns of dimension tables are selected as their foreign key, and looked up in
+    the client.
+    """
+
+    def __init__(self, definition, outputs, whereClause=None, orderBy=(), groupBy=(), extraColumns=(),
+                 dimensionCache=None, whereParameters=()):
+        self.definition = definition
+        self.outputs = outputs
+        self.fetchStrategy = FetchStrategy()
+        self.whereClause = whereClause
+        self.whereParameters = tuple(whereParameters)
+        self.orderBy = orderBy
+        self.groupBy = groupBy
+
+        # Select the columns of all writers, each column only once
+        self.columnNames = []
+        for output in outputs:
+            for columnName in output.writer.columnNames:
+                if columnName not in self.columnNames:
+                    self.columnNames.append(columnName)
+        extraColumnsByName = {column.name: column for column in extraColumns}
+        self.columns = [extraColumnsByName[columnName] if columnName in extraColumnsByName
+                        else definition.columns[columnName] for columnName in self.columnNames]
+
+        # Select the foreign key of the columns of dimension tables
+        self.dimensionCache = dimensionCache
+        self.dimensionColumns = []
+        self.dimensionValueMaps = []
+        if dimensionCache:
+            for columnIndex, column in enumerate(self.columns):
+                join = definition.dimensionJoin(column)
+                if join:
+                    self.dimensionColumns.append((columnIndex, join, column.expression.partition(".")[2]))
+                    self.columns[columnIndex] = Column(column.name, join.foreignKey, INT)
+
+        self.query = definition.buildQuery(self.columns, whereClause, orderBy, groupBy)
+        self.queryParameters = queryParametersOf(self.columns, self.whereParameters)
+
+    def run(self, mysqlConnection):
+        """Run the export on the connection, and return the statistics of the export"""
+        return runExport(mysqlConnection, self)
+
+    def sourceTables(self):
+        """Get the tables read by the export: the tables of the query, and the dimension tables"""
+        expressions = [column.expression for column in self.columns] + [self.whereClause] + list(self.orderBy) + \
+            list(self.groupBy)
+        tables = [self.definition.table] + [join.table for join in self.definition.requiredJoins(expressions)]
+        return tables + [join.table for _, join, _ in self.dimensionColumns if join.table not in tables]
+
+    def prepareSession(self, mysqlConnection):
+        """Prepare the session of a connection for the query: allow long lists if the definition is nested"""
+        if self.definition.listExpressions:
+            cursor = mysqlConnection.cursor()
+            cursor.execute(groupConcatMaxLenStatement)
+            cursor.close()
+
+    def loadDimensions(self, mysqlConnection):
+        """Get the maps of the dimension columns from the dimension cache"""
+        self.dimensionValueMaps = [
+            (columnIndex, self.dimensionCache.valueMap(mysqlConnection, self.definition.database, join.table,
+                                                       join.key, dimensionColumn))
+            for columnIndex, join, dimensionColumn in self.dimensionColumns]
+
+    def resolveDimensions(self, rows):
+        """Replace the foreign keys of the dimension columns in a batch of rows by the values of the columns"""
+        if not self.dimensionValueMaps:
+            return rows
+        resolvedRows = []
+        for row in rows:
+            row = list(row)
+            for columnIndex, valueMap in self.dimensionValueMaps:
+                row[columnIndex] = valueMap.get(row[columnIndex])
+            resolvedRows.append(row)
+        return resolvedRows
+
+
+def formatAndWrite(output, formatRows, rows, statistics):
+    """Format a batch of rows for an output, write the text, and add the time spent to the statistics"""
+    formatStartTime = time.perf_counter()
+    text = formatRows(rows)
+    writeStartTime = time.perf_counter()
+    output.write(text)
+    statistics.formatTime += writeStartTime - formatStartTime
+    statistics.writeTime += time.perf_counter() - writeStartTime
+
+
+def openOutputs(job):
+    """Open the output files of the export job, and write the headers"""
+    for output in job.outputs:
+        output.open()
+        output.write(output.writer.begin(job.columnNames))
+
+
+def closeOutputs(job, statistics):
+    """Write the end of the outputs of the export job, and close the output files. If an output fails, the outputs
+    which are not closed yet are discarded.
+    """
+    try:
+        for output in job.outputs:
+            output.write(output.writer.end())
+            output.close()
+            statistics.bytesWritten += output.bytesWritten
+    finally:
+        discardOutputs(job)
+
+
+def discardOutputs(job):
+    """Close the outputs of the export job which are still open because the export failed, and remove their files,
+    so that an incomplete output file is not taken for an export
+    """
+    for output in job.outputs:
+        output.discard()
+
+
+def closeAfterError(cursor):
+    """Close the cursor of an export which failed, without hiding the error of the export by an error of the close,
+    like the rows of the query which were not read
+    """
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+def runExport(mysqlConnection, job):
+    """Execute the query of the export job on the connection, and write the rows to the outputs.
+    Return the statistics of the export.
+    """
+    statistics = FetchStatistics(job.fetchStrategy)
+    startTime = time.perf_counter()
+    job.prepareSession(mysqlConnection)
+    job.loadDimensions(mysqlConnection)
+
+    # Execute the query, with a cursor for the fetch strategy, as a prepared statement if the query has parameters
+    cursor = job.fetchStrategy.cursor(mysqlConnection, prepared=bool(job.queryParameters))
+    try:
+        executeQuery(cursor, job.query, job.queryParameters)
+        statistics.executeTime = time.perf_counter() - startTime
+
+        # Open the output files and write the headers
+        openOutputs(job)
+
+        # Format and write the rows in batches, one after the other, or concurrently in a pipeline
+        batches = job.fetchStrategy.fetchBatches(cursor, statistics)
+        if job.fetchStrategy.pipelined:
+            runPipeline(job, batches, statistics)
+        else:
+            for rows in batches:
+                rows = job.resolveDimensions(rows)
+                for output in job.outputs:
+                    formatAndWrite(output, output.writer.formatRows, rows, statistics)
+
+        # Write the end of the outputs, and close the output files
+        closeOutputs(job, statistics)
+    except BaseException:
+        # The outputs which are still open are incomplete, because the export failed
+        discardOutputs(job)
+        closeAfterError(cursor)
+        raise
+    cursor.close()
+    statistics.totalTime = time.perf_counter() - startTime
+    return statistics
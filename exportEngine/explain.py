@@ -0,0 +1,216 @@
+"""explain.py: Report the query plan of the export jobs, with the full scans, filesorts and temporary tables, and
+suggest indexes for the joins, the filters and the order
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import re
+from exportEngine.config import getConnectorConfig, reportMysqlError
+
+# Column references in an SQL expression, like medium.genre_id
+columnReferencePattern = re.compile(r"\b([A-Za-z_][A-Za-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_]*)\b")
+
+# Text literals in an SQL expression, which are not column references
+textLiteralPattern = re.compile(r"'[^']*'")
+
+# Access types of a plan step reading all rows of the table, or of an index
+fullScanTypes = {"ALL": "full scan", "index": "full index scan"}
+
+# Maximum length of an index name in MySQL
+maxIndexNameLength = 64
+
+
+def referencedColumns(sqlExpression, table):
+    """Get the columns of a table referenced in an SQL expression, in the order of their first reference"""
+    if not sqlExpression:
+        return []
+    columns = []
+    for referencedTable, column in columnReferencePattern.findall(textLiteralPattern.sub("''", sqlExpression)):
+        if referencedTable == table and column not in columns:
+            columns.append(column)
+    return columns
+
+
+def exportJobOf(exportJob):
+    """Get the export job which runs the query: the job itself, or the job wrapped by the result cache"""
+    return getattr(exportJob, "job", exportJob)
+
+
+def planSteps(cursor):
+    """Get the steps of the executed EXPLAIN as dicts by column name"""
+    columnNames = [description[0] for description in cursor.description]
+    return [dict(zip(columnNames, row)) for row in cursor.fetchall()]
+
+
+def stepNotes(step):
+    """Get the notes of a plan step: full scans, filesorts, temporary tables and joins without index"""
+    notes = []
+    if step.get("type") in fullScanTypes:
+        notes.append(fullScanTypes[step["type"]])
+    extra = step.get("Extra") or ""
+    if "Using filesort" in extra:
+        notes.append("filesort")
+    if "Using temporary" in extra:
+        notes.append("temporary table")
+    if "Using join buffer" in extra:
+        notes.append("join without index")
+    return notes
+
+
+def existingIndexes(cursor, table, indexCache):
+    """Get the columns of the indexes of a table, in the order of each index"""
+    if table not in indexCache:
+        cursor.execute("SHOW INDEX FROM " + table)
+        indexColumns = {}
+        for indexRow in planSteps(cursor):
+            indexColumns.setdefault(indexRow["Key_name"], []).append((indexRow["Seq_in_index"],
+                                                                      indexRow["Column_name"]))
+        indexCache[table] = [[column for _, column in sorted(columns)] for columns in indexColumns.values()]
+    return indexCache[table]
+
+
+class IndexAdvisor:
+    """Suggest composite indexes for the steps of the plan of an export job which read all rows: on the key of a
+    joined table with the columns the next joins need, and on the columns of the driving table in the WHERE
+    clause, followed by the GROUP BY or ORDER BY columns of the driving table
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.definition = job.definition
+        self.suggestions = []
+        self.remarks = []
+
+    def suggest(self, table, columns, reason):
+        if columns and (table, columns) not in [(suggestedTable, suggestedColumns)
+                                                for suggestedTable, suggestedColumns, _ in self.suggestions]:
+            self.suggestions.append((table, columns, reason))
+
+    def adviseJoin(self, join):
+        """Suggest an index on the key of a joined table, with the columns of the table the next joins need"""
+        columns = [join.key]
+        for nextJoin in self.definition.joins:
+            for column in referencedColumns(nextJoin.foreignKey, join.table):
+                if column not in columns:
+                    columns.append(column)
+        self.suggest(join.table, columns, "join on " + join.table + "." + join.key + " = " + join.foreignKey)
+
+    def adviseDrivingTable(self, notes):
+        """Suggest an index on the columns of the driving table in the WHERE clause, and in the GROUP BY or ORDER BY"""
+        table = self.definition.table
+        filterColumns = referencedColumns(self.job.whereClause, table)
+        orderExpressions = list(self.job.groupBy) or list(self.job.orderBy)
+        orderColumns = []
+        for expression in orderExpressions:
+            orderColumns += [column for column in referencedColumns(expression, table) if column not in orderColumns]
+        orderTables = set([referencedTable for expression in orderExpressions
+                           for referencedTable, _ in columnReferencePattern.findall(expression)])
+        if orderTables - {table} and "filesort" in notes:
+            self.remarks.append("the order on the joined tables " + ", ".join(sorted(orderTables - {table})) +
+                                " always needs a filesort")
+            orderColumns = []
+        columns = filterColumns + [column for column in orderColumns if column not in filterColumns]
+        if "full scan" in notes and filterColumns:
+            self.suggest(table, columns, "filter" + (" and order" if len(columns) > len(filterColumns) else ""))
+        elif "filesort" in notes or "temporary table" in notes:
+            self.suggest(table, columns, "order")
+
+    def advise(self, steps):
+        """Suggest indexes for the steps which read all rows of their table, or sort"""
+        for step in steps:
+            notes = stepNotes(step)
+            if step.get("table") == self.definition.table:
+                self.adviseDrivingTable(notes)
+            elif step.get("table") in self.definition.joinsByTable and \
+                    (step.get("type") in fullScanTypes or "join without index" in notes):
+                self.adviseJoin(self.definition.joinsByTable[step["table"]])
+
+    def newSuggestions(self, cursor, indexCache):
+        """Get the suggestions which are not covered by an existing index starting with the same columns"""
+        return [(table, columns, reason) for table, columns, reason in self.suggestions
+                if not any([indexColumns[:len(columns)] == columns
+                            for indexColumns in existingIndexes(cursor, table, indexCache)])]
+
+
+def createIndexStatement(table, columns):
+    """Get the statement creating an index on the columns of a table"""
+    indexName = "_".join([table] + columns)[:maxIndexNameLength]
+    return "CREATE INDEX {} ON {} ({});".format(indexName, table, ", ".join(columns))
+
+
+def explainReport(name, job, steps, suggestions, remarks, analyzeText=None):
+    """Format the plan of an export job: a line per step with the access type, the index, the estimated rows read
+    and after the step (the rows of the previous steps times the rows of the step and its filtered percentage), and
+    the notes of the step, followed by the suggested indexes
+    """
+    lines = ["Job " + name + " (" + job.definition.name + ")"]
+    lines.append("  {:<4} {:<20} {:<8} {:<24} {:>10} {:>9} {:>12}  {}".format(
+        "id", "table", "type", "key", "rows", "filtered", "rows after", "notes"))
+    estimatedRows = 1.0
+    for step in steps:
+        stepRows = step.get("rows") or 0
+        filtered = step.get("filtered")
+        filtered = 100.0 if filtered is None else float(filtered)
+        if step.get("select_type") in ("SIMPLE", "PRIMARY"):
+            estimatedRows *= stepRows * filtered / 100.0
+        lines.append("  {:<4} {:<20} {:<8} {:<24} {:>10} {:>9.1f} {:>12.0f}  {}".format(
+            str(step.get("id") or ""), str(step.get("table") or ""), str(step.get("type") or ""),
+            str(step.get("key") or "-")[:24], stepRows, filtered, estimatedRows, ", ".join(stepNotes(step))))
+    for remark in remarks:
+        lines.append("  Note: " + remark)
+    if suggestions:
+        lines.append("  Suggested indexes:")
+        for table, columns, reason in suggestions:
+            lines.append("    " + createIndexStatement(table, columns) + "  -- " + reason)
+    else:
+        lines.append("  No indexes to suggest")
+    if analyzeText:
+        lines.append("  EXPLAIN ANALYZE:")
+        lines += ["    " + line for line in analyzeText.splitlines()]
+    return "\n".join(lines)
+
+
+def explainJob(mysqlConnection, name, exportJob, indexCache, analyze=False):
+    """Explain the query of an export job with the parameters of its filters, and report the plan"""
+    job = exportJobOf(exportJob)
+    cursor = mysqlConnection.cursor(buffered=True)
+    cursor.execute("EXPLAIN " + job.query, job.queryParameters or None)
+    steps = planSteps(cursor)
+    analyzeText = None
+    if analyze:
+        # EXPLAIN ANALYZE runs the query, and reports the actual rows and time of each step (MySQL 8.0.18 or later)
+        cursor.execute("EXPLAIN ANALYZE " + job.query, job.queryParameters or None)
+        analyzeText = "\n".join([str(row[0]) for row in cursor.fetchall()])
+    indexAdvisor = IndexAdvisor(job)
+    indexAdvisor.advise(steps)
+    suggestions = indexAdvisor.newSuggestions(cursor, indexCache)
+    cursor.close()
+    return explainReport(name, job, steps, suggestions, indexAdvisor.remarks, analyzeText)
+
+
+def explainJobs(batchJobs, databaseConfig, analyze=False):
+    """Explain the query of each job of the job list, on a connection per database. Return the number of jobs
+    which could not be explained.
+    """
+    import mysql.connector
+    failedJobs = 0
+    connections = {}
+    indexCaches = {}
+    try:
+        for batchJob in batchJobs:
+            # EXPLAIN gives a note with the rewritten query, which must not be raised as an error
+            mysqlConnectorConfig = dict(getConnectorConfig(databaseConfig, batchJob.database), raise_on_warnings=False)
+            try:
+                if batchJob.database not in connections:
+                    connections[batchJob.database] = mysql.connector.connect(**mysqlConnectorConfig)
+                print(explainJob(connections[batchJob.database], batchJob.name, batchJob.exportJob,
+                                 indexCaches.setdefault(batchJob.database, {}), analyze))
+            except mysql.connector.Error as mysqlConnectionError:
+                print("Explain of", batchJob.name, "failed")
+                reportMysqlError(mysqlConnectionError, mysqlConnectorConfig)
+                failedJobs += 1
+    finally:
+        for mysqlConnection in connections.values():
+            mysqlConnection.close()
+    return failedJobs
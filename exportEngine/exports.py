@@ -0,0 +1,253 @@
+"""exports.py: Definitions of the exports of databases boeken, muziek and financien, and their CSV and XML layouts"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+from exportEngine.definitions import ExportDefinition, Join, Column, INT, DATE, DECIMAL
+from exportEngine.csvWriter import quotedText, quotedPlain, quotedInt, quotedDate
+from exportEngine.xmlWriter import intText, dateText
+
+# Table titel of database boeken
+boekenTitel = ExportDefinition(
+    "boekenTitel", "boeken", "titel", "titel_id",
+    [Join("auteurs", "auteurs_id", "titel.auteurs_id"),
+     Join("auteurs_persoon", "auteurs_id", "titel.auteurs_id", fanOut=True),
+     Join("persoon", "persoon_id", "auteurs_persoon.persoon_id"),
+     Join("onderwerp", "onderwerp_id", "titel.onderwerp_id", dimension=True),
+     Join("vorm", "vorm_id", "titel.vorm_id", dimension=True),
+     Join("taal", "taal_id", "titel.taal_id", dimension=True),
+     Join("boek", "boek_id", "titel.boek_id"),
+     Join("type", "type_id", "boek.type_id", dimension=True),
+     Join("uitgever", "uitgever_id", "boek.uitgever_id"),
+     Join("status", "status_id", "boek.status_id", dimension=True)],
+    [Column("titel", "titel.titel"),
+     Column("auteurs", "auteurs.auteurs"),
+     Column("persoon", "persoon.persoon"),
+     Column("jaar", "titel.jaar", INT),
+     Column("opmerkingen", "titel.opmerkingen"),
+     Column("type", "type.type"),
+     Column("onderwerp", "onderwerp.onderwerp"),
+     Column("vorm", "vorm.vorm"),
+     Column("taal", "taal.taal"),
+     Column("boek", "boek.boek"),
+     Column("uitgever", "uitgever.uitgever"),
+     Column("status", "status.status"),
+     Column("datum", "boek.datum", DATE)])
+
+boekenTitelCsvFields = [
+    ("Titel", "titel", quotedText),
+    ("Auteurs", "auteurs", quotedText),
+    ("Auteur", "persoon", quotedText),
+    ("Jaar", "jaar", quotedInt),
+    ("Type", "type", quotedPlain),
+    ("Onderwerp", "onderwerp", quotedPlain),
+    ("Vorm", "vorm", quotedPlain),
+    ("Taal", "taal", quotedPlain),
+    ("Opmerkingen", "opmerkingen", quotedText),
+    ("Boek", "boek", quotedText),
+    ("Uitgever", "uitgever", quotedText),
+    ("Status", "status", quotedPlain),
+    ("Datum", "datum", quotedDate("%d-%m-%Y"))]
+
+boekenTitelXmlFields = [
+    ("titel", "titel", None),
+    ("auteurs", "auteurs", None),
+    ("persoon", "persoon", None),
+    ("jaar", "jaar", intText),
+    ("opmerkingen", "opmerkingen", None),
+    ("type", "type", None),
+    ("onderwerp", "onderwerp", None),
+    ("vorm", "vorm", None),
+    ("taal", "taal", None),
+    ("boek", "boek", None),
+    ("uitgever", "uitgever", None),
+    ("status", "status", None),
+    ("datum", "datum", dateText("%Y-%m-%d"))]
+
+boekenTitelOrderBy = ["persoon.persoon", "titel.titel"]
+
+# Table boek of database boeken
+boekenBoek = ExportDefinition(
+    "boekenBoek", "boeken", "boek", "boek_id",
+    [Join("type", "type_id", "boek.type_id", dimension=True),
+     Join("uitgever", "uitgever_id", "boek.uitgever_id"),
+     Join("status", "status_id", "boek.status_id", dimension=True),
+     Join("label", "label_id", "boek.label_id")],
+    [Column("boek", "boek.boek"),
+     Column("type", "type.type"),
+     Column("uitgever", "uitgever.uitgever"),
+     Column("isbn_1", "uitgever.isbn_1"),
+     Column("isbn_2", "uitgever.isbn_2"),
+     Column("isbn_3", "boek.isbn_3"),
+     Column("isbn_4", "boek.isbn_4"),
+     Column("status", "status.status"),
+     Column("label", "label.label"),
+     Column("datum", "boek.datum", DATE),
+     Column("opmerkingen", "boek.opmerkingen")],
+    changeDate="boek.datum")
+
+boekenBoekXmlFields = [
+    ("boek", "boek", None),
+    ("type", "type", None),
+    ("uitgever", "uitgever", None),
+    ("isbn_1", "isbn_1", None),
+    ("isbn_2", "isbn_2", None),
+    ("isbn_3", "isbn_3", None),
+    ("isbn_4", "isbn_4", None),
+    ("status", "status", None),
+    ("label", "label", None),
+    ("datum", "datum", dateText("%Y-%m-%d")),
+    ("opmerkingen", "opmerkingen", None)]
+
+boekenBoekOrderBy = ["label.label", "boek.boek"]
+
+# Table medium of database muziek
+muziekMedium = ExportDefinition(
+    "muziekMedium", "muziek", "medium", "medium_id",
+    [Join("genre", "genre_id", "medium.genre_id", dimension=True),
+     Join("subgenre", "subgenre_id", "medium.subgenre_id", dimension=True),
+     Join("medium_type", "medium_type_id", "medium.medium_type_id", dimension=True),
+     Join("medium_status", "medium_status_id", "medium.medium_status_id", dimension=True),
+     Join("label", "label_id", "medium.label_id", dimension=True),
+     Join("opslag", "opslag_id", "medium.opslag_id", dimension=True)],
+    [Column("medium_titel", "medium.medium_titel"),
+     Column("uitvoerenden", "medium.uitvoerenden"),
+     Column("genre", "genre.genre"),
+     Column("subgenre", "subgenre.subgenre"),
+     Column("medium_type", "medium_type.medium_type"),
+     Column("medium_status", "medium_status.medium_status"),
+     Column("label", "label.label"),
+     Column("label_nummer", "medium.label_nummer"),
+     Column("opslag", "opslag.opslag"),
+     Column("medium_datum", "medium.medium_datum", DATE),
+     Column("opmerkingen", "medium.opmerkingen")],
+    changeDate="medium.medium_datum")
+
+# The CSV layout of the classical genre has the sub-genre, the layout of the other genres has the genre
+muziekMediumCsvFields = {
+    "classical": [
+        ("Medium Titel", "medium_titel", quotedText),
+        ("Uitvoerenden", "uitvoerenden", quotedText),
+        ("Sub-genre", "subgenre", quotedText),
+        ("Type", "medium_type", quotedPlain),
+        ("Status", "medium_status", quotedPlain),
+        ("Label", "label", quotedText),
+        ("Label Nummer", "label_nummer", quotedText),
+        ("Datum", "medium_datum", quotedDate("%Y-%m-%d")),
+        ("Opslag", "opslag", quotedText)],
+    "rest": [
+        ("Medium Titel", "medium_titel", quotedText),
+        ("Uitvoerenden", "uitvoerenden", quotedText),
+        ("Genre", "genre", quotedPlain),
+        ("Type", "medium_type", quotedPlain),
+        ("Status", "medium_status", quotedPlain),
+        ("Label", "label", quotedText),
+        ("Label Nummer", "label_nummer", quotedText),
+        ("Datum", "medium_datum", quotedDate("%Y-%m-%d")),
+        ("Opslag", "opslag", quotedText)]}
+
+muziekMediumXmlFields = [
+    ("medium_titel", "medium_titel", None),
+    ("uitvoerenden", "uitvoerenden", None),
+    ("genre", "genre", None),
+    ("subgenre", "subgenre", None),
+    ("medium_type", "medium_type", None),
+    ("medium_status", "medium_status", None),
+    ("label", "label", None),
+    ("label_nummer", "label_nummer", None),
+    ("opslag", "opslag", None),
+    ("medium_datum", "medium_datum", dateText("%Y-%m-%d")),
+    ("opmerkingen", "opmerkingen", None)]
+
+muziekMediumCsvOrderBy = ["medium.medium_titel"]
+muziekMediumXmlOrderBy = ["opslag.opslag", "medium.subgenre_id", "medium.medium_titel"]
+
+# Table opname of database muziek
+muziekOpname = ExportDefinition(
+    "muziekOpname", "muziek", "opname", "opname_id",
+    [Join("opus", "opus_id", "opname.opus_id"),
+     Join("type", "type_id", "opus.type_id", dimension=True),
+     Join("tijdperk", "tijdperk_id", "opus.tijdperk_id", dimension=True),
+     Join("genre", "genre_id", "opus.genre_id", dimension=True),
+     Join("componisten", "componisten_id", "opus.componisten_id"),
+     Join("componisten_persoon", "componisten_id", "opus.componisten_id", fanOut=True),
+     Join("persoon", "persoon_id", "componisten_persoon.persoon_id", dimension=True),
+     Join("musici", "musici_id", "opname.musici_id"),
+     Join("opname_datum", "opname_datum_id", "opname.opname_datum_id"),
+     Join("opname_plaats", "opname_plaats_id", "opname.opname_plaats_id"),
+     Join("producers", "producers_id", "opname.producers_id"),
+     Join("medium", "medium_id", "opname.medium_id"),
+     Join("medium_type", "medium_type_id", "medium.medium_type_id", dimension=True),
+     Join("medium_status", "medium_status_id", "medium.medium_status_id", dimension=True),
+     Join("label", "label_id", "medium.label_id", dimension=True)],
+    [Column("opus_titel", "opus.opus_titel"),
+     Column("opus_nummer", "opus.opus_nummer"),
+     Column("type", "type.type"),
+     Column("tijdperk", "tijdperk.tijdperk"),
+     Column("genre", "genre.genre"),
+     Column("componisten", "componisten.componisten"),
+     Column("componist", "persoon.persoon"),
+     Column("musici", "musici.musici"),
+     Column("opname_datum", "opname_datum.opname_datum"),
+     Column("opname_plaats", "opname_plaats.opname_plaats"),
+     Column("producers", "producers.producers"),
+     Column("medium_type", "medium_type.medium_type"),
+     Column("medium_status", "medium_status.medium_status"),
+     Column("label", "label.label"),
+     Column("label_nummer", "medium.label_nummer"),
+     Column("medium_titel", "medium.medium_titel")])
+
+# The CSV layout of the classical genre starts with the componist and the opus, the layout of the other genres
+# starts with the titel and the genre
+muziekOpnameCsvFields = {
+    "classical": [
+        ("Componist", "componist", quotedText),
+        ("Titel", "opus_titel", quotedText),
+        ("Opus", "opus_nummer", quotedText),
+        ("Type", "type", quotedPlain),
+        ("Tijdperk", "tijdperk", quotedPlain)],
+    "rest": [
+        ("Titel", "opus_titel", quotedText),
+        ("Genre", "genre", quotedPlain),
+        ("Componist", "componist", quotedText)]}
+for genreFields in muziekOpnameCsvFields.values():
+    genreFields += [
+        ("Musici", "musici", quotedText),
+        ("Medium", "medium_type", quotedPlain),
+        ("Status", "medium_status", quotedPlain),
+        ("Label", "label", quotedText),
+        ("Label Nummer", "label_nummer", quotedText),
+        ("Medium Titel", "medium_titel", quotedText)]
+
+muziekOpnameXmlFields = [
+    ("opus_titel", "opus_titel", None),
+    ("opus_nummer", "opus_nummer", None),
+    ("genre", "genre", None),
+    ("type", "type", None),
+    ("componisten", "componisten", None),
+    ("componist", "componist", None),
+    ("musici", "musici", None),
+    ("opname_datum", "opname_datum", None),
+    ("opname_plaats", "opname_plaats", None),
+    ("producers", "producers", None),
+    ("medium_titel", "medium_titel", None)]
+
+muziekOpnameCsvOrderBy = {
+    "classical": ["persoon.persoon", "type.type", "opus.opus_titel", "opus.opus_nummer", "musici.musici"],
+    "rest": ["opus.opus_titel", "musici.musici"]}
+muziekOpnameXmlOrderBy = ["persoon.persoon", "opus.opus_titel", "musici.musici"]
+
+# Table rekening_mutatie of database financien, summed per rubriek, year and account
+financienRubriek = ExportDefinition(
+    "financienRubriek", "financien", "rekening_mutatie", "rekening_mutatie_id",
+    [Join("rubriek", "rubriek_id", "rekening_mutatie.rubriek_id")],
+    [Column("rubriek_id", "rubriek.rubriek_id", INT),
+     Column("rubriek", "rubriek.rubriek"),
+     Column("jaar", "year(rekening_mutatie.datum)", INT),
+     Column("rekening_id", "rekening_mutatie.rekening_id", INT),
+     Column("mutatie_in", "sum(rekening_mutatie.mutatie_in)", DECIMAL),
+     Column("mutatie_uit", "sum(rekening_mutatie.mutatie_uit)", DECIMAL)])
+
+financienRubriekGroupBy = ["rubriek.rubriek_id", "rubriek.rubriek", "year(rekening_mutatie.datum)",
+                           "rekening_mutatie.rekening_id"]
+financienRubriekOrderBy = ["rubriek.rubriek", "rubriek.rubriek_id"]
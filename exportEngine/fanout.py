@@ -0,0 +1,175 @@
+"""fanout.py: Run the exports of the same definition with a single query, writing each row to the outputs of all
+exports
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import heapq
+import pickle
+import tempfile
+from exportEngine.definitions import INT, Column, sortKeyOf
+from exportEngine.executor import Output, ExportJob
+
+# Name prefixes of the extra columns with the filter and the sort key values of an export
+filterColumnPrefix = "fan_out_filter_"
+sortKeyColumnPrefix = "fan_out_sort_key_"
+
+# Number of rows of an export in another order kept in memory, before they are sorted and spilled to a temporary file
+sortRunSize = 100000
+
+# Number of rows pickled at once in a temporary file
+spillBatchSize = 1000
+
+
+def canFanOut(exportJobs):
+    """Check whether export jobs can run with a single query: plain exports of the same definition, to plain
+    outputs, without GROUP BY
+    """
+    return all([type(exportJob) is ExportJob and exportJob.definition is exportJobs[0].definition and
+                not exportJob.groupBy and all([type(output) is Output for output in exportJob.outputs])
+                for exportJob in exportJobs])
+
+
+class SortedRuns:
+    """Rows with their sort key, sorted in runs of which all but the last are spilled to temporary files, and merged
+    when read
+    """
+
+    def __init__(self):
+        self.runFiles = []
+        self.rows = []
+
+    def add(self, sortKey, row):
+        self.rows.append((sortKey, row))
+        if len(self.rows) >= sortRunSize:
+            self.spill()
+
+    def spill(self):
+        """Sort the rows in memory, and write them to a temporary file"""
+        self.rows.sort(key=lambda entry: entry[0])
+        runFile = tempfile.TemporaryFile(prefix="fanOut")
+        for startIndex in range(0, len(self.rows), spillBatchSize):
+            pickle.dump(self.rows[startIndex:startIndex + spillBatchSize], runFile, pickle.HIGHEST_PROTOCOL)
+        runFile.seek(0)
+        self.runFiles.append(runFile)
+        self.rows = []
+
+    @staticmethod
+    def readRun(runFile):
+        try:
+            while True:
+                yield from pickle.load(runFile)
+        except EOFError:
+            runFile.close()
+
+    def sortedRows(self):
+        """Get the rows in the order of the sort key. Rows with the same sort key stay in the order they were added."""
+        self.rows.sort(key=lambda entry: entry[0])
+        runs = [self.readRun(runFile) for runFile in self.runFiles] + [iter(self.rows)]
+        for _, row in heapq.merge(*runs, key=lambda entry: entry[0]):
+            yield row
+        self.runFiles = []
+        self.rows = []
+
+
+class FanOutWriter:
+    """The writer of an output of an export in a fan-out: pass the rows selected by the filter of the export to the
+    writer of the output. If the export has another order than the query, the rows are sorted on the sort key of the
+    order of the export, and written at the end.
+    """
+
+    def __init__(self, output, filterColumnName=None, sortKeyColumnNames=(), batchSize=1000):
+        self.output = output
+        self.writer = output.writer
+        self.fileType = self.writer.fileType
+        self.encoding = self.writer.encoding
+        self.errors = self.writer.errors
+        self.columnNames = self.writer.columnNames + ([filterColumnName] if filterColumnName else []) + \
+            list(sortKeyColumnNames)
+        self.filterColumnName = filterColumnName
+        self.sortKeyColumnNames = list(sortKeyColumnNames)
+        self.batchSize = batchSize
+        self.filterIndex = None
+        self.sortKeyIndexes = []
+        self.sortedRuns = None
+
+    def begin(self, columnNames):
+        if self.filterColumnName:
+            self.filterIndex = columnNames.index(self.filterColumnName)
+        self.sortKeyIndexes = [columnNames.index(columnName) for columnName in self.sortKeyColumnNames]
+        self.sortedRuns = SortedRuns() if self.sortKeyIndexes else None
+        return self.writer.begin(columnNames)
+
+    def formatRows(self, rows):
+        if self.filterIndex is not None:
+            filterIndex = self.filterIndex
+            rows = [row for row in rows if row[filterIndex]]
+        if self.sortedRuns is None:
+            return self.writer.formatRows(rows)
+        for row in rows:
+            self.sortedRuns.add(sortKeyOf([row[index] for index in self.sortKeyIndexes]), row)
+        return None
+
+    def end(self):
+        if self.sortedRuns is not None:
+            # Write the sorted rows in batches directly, and not as a single text
+            rows = []
+            for row in self.sortedRuns.sortedRows():
+                rows.append(row)
+                if len(rows) == self.batchSize:
+                    self.output.write(self.writer.formatRows(rows))
+                    rows = []
+            self.output.write(self.writer.formatRows(rows))
+        return self.writer.end()
+
+
+class FanOutExportJob(ExportJob):
+    """Export jobs of the same definition run with a single query, in the order of the first export, with the rows
+    selected by the filter of any of the exports. Each row is written to the outputs of all exports which select the
+    row. The outputs of an export in another order are sorted on the collation weights of their ORDER BY columns,
+    in temporary files if they have many rows.
+    """
+
+    def __init__(self, exportJobs):
+        firstJob = exportJobs[0]
+        definition = firstJob.definition
+
+        # Select the rows selected by any of the exports
+        whereFilters = list(dict.fromkeys([(exportJob.whereClause, exportJob.whereParameters)
+                                           for exportJob in exportJobs]))
+        if None in [clause for clause, _ in whereFilters]:
+            whereClause, whereParameters = None, ()
+        elif len(whereFilters) == 1:
+            whereClause, whereParameters = whereFilters[0]
+        else:
+            whereClause = " OR ".join(["(" + clause + ")" for clause, _ in whereFilters])
+            whereParameters = tuple([parameter for _, parameters in whereFilters for parameter in parameters])
+
+        # Wrap the writers of each export, with the columns of the filter and the sort key of the export if needed
+        outputs = []
+        extraColumns = []
+        for jobIndex, exportJob in enumerate(exportJobs):
+            filterColumnName = None
+            if (exportJob.whereClause, exportJob.whereParameters) != (whereClause, whereParameters):
+                filterColumnName = filterColumnPrefix + str(jobIndex)
+                extraColumns.append(Column(filterColumnName, "CASE WHEN " + exportJob.whereClause +
+                                           " THEN 1 ELSE 0 END", INT, exportJob.whereParameters))
+            sortKeyColumnNames = []
+            if list(exportJob.orderBy) != list(firstJob.orderBy):
+                # Rows which are equal on the ORDER BY are ordered on the primary key, like a partitioned export
+                sortKeyExpressions = [definition.sortKeyExpression(expression) for expression in exportJob.orderBy]
+                sortKeyExpressions.append(definition.table + "." + definition.primaryKey)
+                for orderIndex, expression in enumerate(sortKeyExpressions):
+                    sortKeyColumnNames.append(sortKeyColumnPrefix + "{}_{}".format(jobIndex, orderIndex))
+                    extraColumns.append(Column(sortKeyColumnNames[-1], expression))
+            for output in exportJob.outputs:
+                output.writer = FanOutWriter(output, filterColumnName, sortKeyColumnNames,
+                                             firstJob.fetchStrategy.batchSize)
+                outputs.append(output)
+
+        dimensionCache = next((exportJob.dimensionCache for exportJob in exportJobs if exportJob.dimensionCache), None)
+        super().__init__(definition, outputs, whereClause, firstJob.orderBy, extraColumns=extraColumns,
+                         dimensionCache=dimensionCache, whereParameters=whereParameters)
+        self.fetchStrategy = firstJob.fetchStrategy
+        self.exportJobs = exportJobs
@@ -0,0 +1,170 @@
+"""fetch.py: Strategies to fetch the rows of an export query, and statistics of the fetch"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import sys
+import time
+
+# The resource module is not available on all platforms
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Fetch modes: stream the rows from the server in batches with an unbuffered cursor, so that the client never holds
+# more than a batch, or buffer all rows in the client when the query is executed
+STREAM = "stream"
+BUFFERED = "buffered"
+fetchModes = [STREAM, BUFFERED]
+
+defaultFetchMode = STREAM
+defaultFetchBatchSize = 1000
+
+
+class FetchStrategy:
+    """The fetch mode, the number of rows fetched, formatted and written at once, and whether fetching, formatting
+    and writing run concurrently in a pipeline
+    """
+
+    def __init__(self, mode=defaultFetchMode, batchSize=defaultFetchBatchSize, pipelined=False):
+        self.mode = mode
+        self.batchSize = batchSize
+        self.pipelined = pipelined
+
+    def cursor(self, mysqlConnection, prepared=False):
+        """Get a cursor for the fetch mode, or a cursor for a server-side prepared statement. The connector has no
+        buffered prepared cursor, so a prepared statement is buffered by fetching all rows when it is executed.
+        """
+        if prepared:
+            preparedCursor = mysqlConnection.cursor(prepared=True)
+            return BufferedPreparedCursor(preparedCursor) if self.mode == BUFFERED else preparedCursor
+        return mysqlConnection.cursor(buffered=(self.mode == BUFFERED))
+
+    def fetchBatches(self, cursor, statistics):
+        """Fetch the rows of the executed query in batches, and update the statistics"""
+        while True:
+            fetchStartTime = time.perf_counter()
+            rows = cursor.fetchmany(self.batchSize)
+            fetchTime = time.perf_counter() - fetchStartTime
+            statistics.fetchTime += fetchTime
+            if not rows:
+                return
+            statistics.batchFetchTimes.append(fetchTime)
+            statistics.rowCount += len(rows)
+            statistics.batchCount += 1
+            yield rows
+
+
+class BufferedPreparedCursor:
+    """A cursor for a prepared statement which fetches all rows when the statement is executed, like a buffered
+    cursor, and returns the fetched rows in batches
+    """
+
+    def __init__(self, preparedCursor):
+        self.preparedCursor = preparedCursor
+        self.rows = []
+        self.rowIndex = 0
+
+    def execute(self, query, parameters=None):
+        self.preparedCursor.execute(query, parameters)
+        self.rows = self.preparedCursor.fetchall()
+        self.rowIndex = 0
+
+    def fetchmany(self, size=1):
+        rows = self.rows[self.rowIndex:self.rowIndex + size]
+        self.rowIndex += len(rows)
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows) - self.rowIndex)
+
+    def close(self):
+        self.rows = []
+        self.preparedCursor.close()
+
+
+class FetchStatistics:
+    """Statistics of an export: the number of rows and batches, the time spent connecting, executing, fetching,
+    formatting and writing, the fetch time of each batch, the number of bytes written, and whether the output files
+    came from the result cache
+    """
+
+    def __init__(self, fetchStrategy):
+        self.fetchStrategy = fetchStrategy
+        self.rowCount = 0
+        self.batchCount = 0
+        self.connectTime = 0.0
+        self.executeTime = 0.0
+        self.fetchTime = 0.0
+        self.formatTime = 0.0
+        self.writeTime = 0.0
+        self.totalTime = 0.0
+        self.batchFetchTimes = []
+        self.bytesWritten = 0
+        self.resultCacheHit = False
+
+    def report(self):
+        """Report the throughput and the peak memory of the process"""
+        rowsPerSecond = self.rowCount / self.totalTime if self.totalTime > 0 else 0.0
+        report = "Fetched {} rows in {} batches ({}, batch size {}{}): execute {:.3f} s, fetch {:.3f} s, " \
+                 "format and write {:.3f} s, total {:.3f} s, {:.0f} rows/s".format(
+                     self.rowCount, self.batchCount, self.fetchStrategy.mode, self.fetchStrategy.batchSize,
+                     ", pipelined" if self.fetchStrategy.pipelined else "",
+                     self.executeTime, self.fetchTime, self.totalTime - self.executeTime - self.fetchTime,
+                     self.totalTime, rowsPerSecond)
+        if self.resultCacheHit:
+            report += ", from the result cache"
+        peakMemory = getPeakMemory()
+        if peakMemory is not None:
+            report += ", peak memory {:.1f} MB".format(peakMemory / (1024 * 1024))
+        return report
+
+
+def getPeakMemory():
+    """Get the peak resident memory of the process in bytes, or None if not available"""
+    if resource is None:
+        return None
+    maxResidentSize = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # The maximum resident set size is in bytes on macOS, and in kilobytes on other platforms
+    return maxResidentSize if sys.platform == "darwin" else maxResidentSize * 1024
+
+
+def addFetchArguments(parser):
+    """Add the arguments of the fetch strategy"""
+    parser.add_argument("--fetch", choices=fetchModes,
+                        help="fetch mode (default fetch in the section of the script or in section general of the " +
+                             "configuration file, or " + defaultFetchMode + ")")
+    parser.add_argument("--fetchBatchSize", type=int,
+                        help="number of rows fetched at once (default fetch_batch_size in the section of the script " +
+                             "or in section general of the configuration file, or " + str(defaultFetchBatchSize) + ")")
+    parser.add_argument("--pipeline", action="store_true", default=None,
+                        help="fetch, format and write the rows concurrently (default pipeline in the section of the " +
+                             "script or in section general of the configuration file, or no)")
+    parser.add_argument("--fetchReport", action="store_true",
+                        help="report the throughput and memory of the export on stderr")
+
+
+def getFetchStrategy(args, databaseConfig, script):
+    """Get the fetch strategy from the arguments, or else from the section of the script or section general of the
+    database configuration
+    """
+    configSections = [section for section in [script, 'general'] if databaseConfig.has_section(section)]
+
+    def configValue(key, getValue):
+        for section in configSections:
+            if databaseConfig.has_option(section, key):
+                return getValue(section, key)
+        return None
+
+    mode = args.fetch or configValue('fetch', databaseConfig.get) or defaultFetchMode
+    if mode not in fetchModes:
+        print("Invalid fetch mode:", mode, "(choose from " + ", ".join(fetchModes) + ")")
+        sys.exit(1)
+    batchSize = args.fetchBatchSize or configValue('fetch_batch_size', databaseConfig.getint) or \
+        defaultFetchBatchSize
+    if batchSize < 1:
+        print("Invalid fetch batch size:", batchSize)
+        sys.exit(1)
+    pipelined = args.pipeline or configValue('pipeline', databaseConfig.getboolean) or False
+    return FetchStrategy(mode, batchSize, pipelined)
@@ -0,0 +1,188 @@
+"""filters.py: Structured filters on the fields of an export, compiled to a WHERE clause with parameters"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import re
+import argparse
+from exportEngine.definitions import tableColumnPattern
+
+# Operators of a filter, with the number of values: exactly one, at least one (None), two or none
+operatorValueCounts = {
+    "=": 1,
+    "!=": 1,
+    "<": 1,
+    "<=": 1,
+    ">": 1,
+    ">=": 1,
+    "like": 1,
+    "notlike": 1,
+    "in": None,
+    "notin": None,
+    "between": 2,
+    "null": 0,
+    "notnull": 0
+}
+
+# A filter argument: the field, the operator, and the comma separated values, like "boek.status_id != 10" or
+# "medium.medium_status_id notin 1,9"
+filterPattern = re.compile(r"\s*([A-Za-z_][A-Za-z0-9_.]*)\s*(!=|<=|>=|=|<|>|\b(?:notlike|like|notin|in|between|"
+                           r"notnull|null)\b)\s*(.*?)\s*$", re.IGNORECASE)
+
+# An integer value, which is compared as a number
+integerPattern = re.compile(r"-?[0-9]+")
+
+# The tokens of a filter in SQL which are replaced: a quoted text literal (with the quote doubled or escaped by a
+# backslash inside), and the % operator. A quoted identifier is matched to keep it as is.
+sqlTokenPattern = re.compile(r"'(?:[^'\\]|''|\\.)*'|\"(?:[^\"\\]|\"\"|\\.)*\"|`[^`]*`|%", re.DOTALL)
+
+# The characters of the backslash escapes in a text literal; MySQL keeps the backslash of \% and \_ for LIKE
+sqlEscapes = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "%": "\\%", "_": "\\_"}
+
+
+def filterValueOf(valueText):
+    """Get the value of a filter: an integer, or a text which may be quoted"""
+    valueText = valueText.strip()
+    if integerPattern.fullmatch(valueText):
+        return int(valueText)
+    if len(valueText) >= 2 and valueText[0] == valueText[-1] and valueText[0] in "'\"":
+        return valueText[1:-1]
+    return valueText
+
+
+class Filter:
+    """A filter on a field of an export: a column of the definition (like jaar), or a column of the driving table
+    or a joined table (like medium.genre_id), compared with the values. The values are parameters of the query,
+    and never part of the SQL text, so that the query of a filter is the same for all values.
+    """
+
+    def __init__(self, field, operator, values=()):
+        self.field = field
+        self.operator = operator.lower()
+        self.values = list(values)
+
+    def __repr__(self):
+        return "{} {} {}".format(self.field, self.operator, ",".join([str(value) for value in self.values])).strip()
+
+    def fieldExpression(self, definition):
+        """Get the SQL expression of the field, or raise a ValueError if the definition has no such field, or if the
+        field is an aggregate column, which has no value in the WHERE clause
+        """
+        if self.field in definition.columns:
+            if definition.columns[self.field].aggregate:
+                raise ValueError("unknown filter field " + self.field + " of " + definition.name +
+                                 ": an aggregate column cannot be filtered")
+            return definition.columns[self.field].expression
+        tableColumnMatch = tableColumnPattern.fullmatch(self.field)
+        if tableColumnMatch and (tableColumnMatch.group(1) == definition.table or
+                                 tableColumnMatch.group(1) in definition.joinsByTable):
+            return self.field
+        raise ValueError("unknown filter field " + self.field + " of " + definition.name)
+
+    def sql(self, definition):
+        """Get the SQL condition with a %s placeholder per value, and the values"""
+        expression = self.fieldExpression(definition)
+        if self.operator == "null":
+            return expression + " IS NULL", []
+        if self.operator == "notnull":
+            return expression + " IS NOT NULL", []
+        if self.operator == "between":
+            return expression + " BETWEEN %s AND %s", self.values
+        if self.operator in ("in", "notin"):
+            return "{} {}IN ({})".format(expression, "NOT " if self.operator == "notin" else "",
+                                         ", ".join(["%s"] * len(self.values))), self.values
+        if self.operator in ("like", "notlike"):
+            return "{} {}LIKE %s".format(expression, "NOT " if self.operator == "notlike" else ""), self.values
+        return expression + " " + self.operator + " %s", self.values
+
+    def sqlText(self, definition):
+        """Get the SQL condition with the values as literals, to show the filter as SQL"""
+        clause, values = self.sql(definition)
+        for value in values:
+            clause = clause.replace("%s", sqlLiteralOf(value), 1)
+        return clause
+
+
+def sqlLiteralOf(value):
+    """Get the SQL literal of a filter value: a number as is, and other values as a quoted text"""
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sqlLiteralValueOf(sqlLiteral):
+    """Get the value of a quoted text literal in SQL"""
+    quote = sqlLiteral[0]
+
+    def unescape(escapeMatch):
+        if escapeMatch.group(1) is None:
+            return quote
+        return sqlEscapes.get(escapeMatch.group(1), escapeMatch.group(1))
+
+    return re.sub(r"\\(.)|" + quote + quote, unescape, sqlLiteral[1:-1], flags=re.DOTALL)
+
+
+def sqlFilterClauseOf(sqlFilter):
+    """Get the clause of a filter in SQL with a %s placeholder for each text literal, and the values of the literals.
+    The literals are parameters like the values of the other filters, so that a % in a literal (like in
+    LIKE '%soul%') is never taken for a placeholder. The % operator is replaced by MOD, so that the SQL text of the
+    query has no % other than the placeholders.
+    """
+    values = []
+
+    def parameterize(tokenMatch):
+        token = tokenMatch.group(0)
+        if token == "%":
+            return " MOD "
+        if token[0] == "`":
+            return token
+        values.append(sqlLiteralValueOf(token))
+        return "%s"
+
+    return sqlTokenPattern.sub(parameterize, sqlFilter), values
+
+
+def filtersSqlText(definition, filters):
+    """Get the SQL text of the filters, to show them in the help of an argument"""
+    return " AND ".join([exportFilter.sqlText(definition) for exportFilter in filters])
+
+
+def parseFilter(filterArgument):
+    """Parse a filter argument of the form field operator values, with the values separated by a comma"""
+    filterMatch = filterPattern.fullmatch(filterArgument)
+    if not filterMatch:
+        raise argparse.ArgumentTypeError("invalid filter: " + filterArgument)
+    field, operator, valuesText = filterMatch.groups()
+    operator = operator.lower()
+    values = [filterValueOf(valueText) for valueText in valuesText.split(",")] if valuesText else []
+    valueCount = operatorValueCounts[operator]
+    if (valueCount is None and not values) or (valueCount is not None and len(values) != valueCount):
+        raise argparse.ArgumentTypeError("invalid number of values of operator " + operator + ": " + filterArgument)
+    return Filter(field, operator, values)
+
+
+def filterClauseOf(definition, filters, *sqlFilters):
+    """Combine the filters, and the SQL filters which are set, into a WHERE clause (without WHERE) with its
+    parameters, which include the text literals of the SQL filters. The clause is None if there is no filter.
+    """
+    clauses = []
+    parameters = []
+    for exportFilter in filters or []:
+        clause, values = exportFilter.sql(definition)
+        clauses.append("(" + clause + ")")
+        parameters += values
+    for sqlFilter in sqlFilters:
+        if sqlFilter:
+            clause, values = sqlFilterClauseOf(sqlFilter)
+            clauses.append("(" + clause + ")")
+            parameters += values
+    return " AND ".join(clauses) if clauses else None, tuple(parameters)
+
+
+def addFilterArguments(parser):
+    """Add the argument of the structured filters"""
+    parser.add_argument("--filter", action="append", type=parseFilter,
+                        help="filter as field operator values, like \"medium.medium_status_id notin 1,9\", on a " +
+                             "column of the export or of a table of the export; the operator is one of " +
+                             ", ".join(operatorValueCounts) + ", and the values are separated by a comma (may be " +
+                             "repeated, all filters must match)")
@@ -0,0 +1,156 @@
+"""partition.py: Export in key ranges of the driving table, fetched concurrently and merged in the order of the query"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import time
+import heapq
+import queue
+import itertools
+import threading
+from exportEngine.definitions import INT, Column, sortKeyOf
+from exportEngine.executor import ExportJob, formatAndWrite, queryParametersOf, executeQuery, openOutputs, \
+    closeOutputs, discardOutputs
+from exportEngine.fetch import FetchStatistics
+from exportEngine.pipeline import putUnlessStopped
+
+# Name prefix of the extra columns with the sort key values
+sortKeyColumnPrefix = "partition_sort_key_"
+
+# Number of fetched batches a partition can be ahead of the merge
+partitionQueueSize = 4
+
+
+class PartitionedExportJob(ExportJob):
+    """An export which splits the rows in ranges of the primary key of the driving table. Each range is fetched
+    concurrently in a thread on its own connection, and the rows of the ranges are merged in the order of the query
+    with a k-way merge on the collation weights of the ORDER BY columns. Rows which are equal on the ORDER BY are
+    ordered on the primary key, so that the merge has a single result.
+    """
+
+    def __init__(self, definition, outputs, whereClause=None, orderBy=(), partitions=2, mysqlConnectorConfig=None,
+                 dimensionCache=None, whereParameters=()):
+        self.primaryKeyExpression = definition.table + "." + definition.primaryKey
+        orderBy = list(orderBy) + [self.primaryKeyExpression]
+        super().__init__(definition, outputs, whereClause, orderBy, dimensionCache=dimensionCache,
+                         whereParameters=whereParameters)
+        self.partitions = partitions
+        self.mysqlConnectorConfig = mysqlConnectorConfig
+
+        # Add the sort key values, for the merge in Python
+        self.sortKeyColumns = [Column(sortKeyColumnPrefix + str(orderIndex), definition.sortKeyExpression(expression))
+                               for orderIndex, expression in enumerate(orderBy[:-1])]
+        self.sortKeyColumns.append(Column(sortKeyColumnPrefix + str(len(orderBy) - 1), self.primaryKeyExpression, INT))
+        self.columns = self.columns + self.sortKeyColumns
+        self.columnNames = [column.name for column in self.columns]
+        self.query = definition.buildQuery(self.columns, whereClause, orderBy)
+        self.queryParameters = queryParametersOf(self.columns, self.whereParameters)
+
+    def keyRanges(self, mysqlConnection):
+        """Split the primary keys of the driving table in ranges of about the same size"""
+        cursor = mysqlConnection.cursor(buffered=True)
+        cursor.execute("SELECT min({0}), max({0}) FROM {1}".format(self.primaryKeyExpression, self.definition.table))
+        minKey, maxKey = cursor.fetchone()
+        cursor.close()
+        if minKey is None:
+            return [(0, 0)]
+        rangeSize = (maxKey - minKey) // self.partitions + 1
+        return [(firstKey, min(firstKey + rangeSize - 1, maxKey))
+                for firstKey in range(minKey, maxKey + 1, rangeSize)]
+
+    def partitionQuery(self):
+        """Get the query of the rows of a range of primary keys, which is the same for all partitions, with the
+        first and last key as the last parameters
+        """
+        rangeClause = self.primaryKeyExpression + " BETWEEN %s AND %s"
+        whereClause = "(" + self.whereClause + ") AND (" + rangeClause + ")" if self.whereClause else rangeClause
+        return self.definition.buildQuery(self.columns, whereClause, self.orderBy)
+
+    def fetchPartition(self, query, parameters, partitionQueue, partitionStatistics, stopEvent):
+        """Fetch the rows of a partition on its own connection, and put the batches in the queue of the partition.
+        End with None when done, or with the error if the fetch failed.
+        """
+        def put(item):
+            # Do not block forever when the export stopped because of an error in another partition
+            return putUnlessStopped(partitionQueue, item, stopEvent)
+
+        import mysql.connector
+        try:
+            startTime = time.perf_counter()
+            mysqlConnection = mysql.connector.connect(**self.mysqlConnectorConfig)
+            try:
+                self.prepareSession(mysqlConnection)
+                cursor = self.fetchStrategy.cursor(mysqlConnection, prepared=True)
+                executeQuery(cursor, query, parameters)
+                partitionStatistics.executeTime = time.perf_counter() - startTime
+                for rows in self.fetchStrategy.fetchBatches(cursor, partitionStatistics):
+                    if not put(rows):
+                        return
+                cursor.close()
+            finally:
+                mysqlConnection.close()
+            put(None)
+        except Exception as partitionError:
+            # Any error must reach the merge, which otherwise waits for the partition forever
+            put(partitionError)
+
+    def run(self, mysqlConnection):
+        statistics = FetchStatistics(self.fetchStrategy)
+        startTime = time.perf_counter()
+        self.loadDimensions(mysqlConnection)
+
+        # Start fetching the partitions, each with the same prepared statement and the key range as parameters
+        partitionQuery = self.partitionQuery()
+        partitionParameters = [self.queryParameters + keyRange for keyRange in self.keyRanges(mysqlConnection)]
+        partitionQueues = [queue.Queue(maxsize=partitionQueueSize) for _ in partitionParameters]
+        partitionStatistics = [FetchStatistics(self.fetchStrategy) for _ in partitionParameters]
+        stopEvent = threading.Event()
+        partitionThreads = [threading.Thread(target=self.fetchPartition, daemon=True,
+                                             args=(partitionQuery, parameters, partitionQueue, partitionStat,
+                                                   stopEvent))
+                            for parameters, partitionQueue, partitionStat in
+                            zip(partitionParameters, partitionQueues, partitionStatistics)]
+        for partitionThread in partitionThreads:
+            partitionThread.start()
+
+        def partitionRows(partitionQueue):
+            while True:
+                waitStartTime = time.perf_counter()
+                rows = partitionQueue.get()
+                statistics.fetchTime += time.perf_counter() - waitStartTime
+                if rows is None:
+                    return
+                if isinstance(rows, Exception):
+                    raise rows
+                yield from rows
+
+        # Merge the rows of the partitions on their sort key, and write them in batches
+        sortKeyIndexes = [self.columnNames.index(column.name) for column in self.sortKeyColumns]
+        mergedRows = heapq.merge(*[partitionRows(partitionQueue) for partitionQueue in partitionQueues],
+                                 key=lambda row: sortKeyOf([row[index] for index in sortKeyIndexes]))
+        try:
+            openOutputs(self)
+            while True:
+                rows = self.resolveDimensions(list(itertools.islice(mergedRows, self.fetchStrategy.batchSize)))
+                if not rows:
+                    break
+                for output in self.outputs:
+                    formatAndWrite(output, output.writer.formatRows, rows, statistics)
+            closeOutputs(self, statistics)
+        finally:
+            stopEvent.set()
+            # The outputs which are still open are incomplete, because a partition or the merge failed
+            discardOutputs(self)
+        for partitionThread in partitionThreads:
+            partitionThread.join()
+
+        # The execute time is the time until the last partition started returning rows, and the fetch time the time
+        # the merge waited for rows
+        statistics.rowCount = sum([partitionStat.rowCount for partitionStat in partitionStatistics])
+        statistics.batchCount = sum([partitionStat.batchCount for partitionStat in partitionStatistics])
+        statistics.executeTime = max([partitionStat.executeTime for partitionStat in partitionStatistics])
+        statistics.batchFetchTimes = [batchFetchTime for partitionStat in partitionStatistics
+                                      for batchFetchTime in partitionStat.batchFetchTimes]
+        statistics.fetchTime = max(0.0, statistics.fetchTime - statistics.executeTime)
+        statistics.totalTime = time.perf_counter() - startTime
+        return statistics
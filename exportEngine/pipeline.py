@@ -0,0 +1,103 @@
+"""pipeline.py: Fetch, format and write the rows of an export concurrently, connected by bounded queues"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import time
+import queue
+import threading
+
+# Number of batches a stage can be ahead of the next stage
+pipelineQueueSize = 4
+
+# Seconds between checks of a waiting stage whether the export stopped
+stopCheckInterval = 0.5
+
+
+def putUnlessStopped(itemQueue, item, stopEvent):
+    """Put an item in a bounded queue, waiting while the queue is full, unless the stop event is set.
+    Return whether the item was put.
+    """
+    while not stopEvent.is_set():
+        try:
+            itemQueue.put(item, timeout=stopCheckInterval)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def getUnlessStopped(itemQueue, stopEvent):
+    """Get an item from a queue, waiting while the queue is empty, unless the stop event is set.
+    Return None if the stop event is set.
+    """
+    while not stopEvent.is_set():
+        try:
+            return itemQueue.get(timeout=stopCheckInterval)
+        except queue.Empty:
+            pass
+    return None
+
+
+def runPipeline(job, batches, statistics):
+    """Fetch the batches in a thread, format them for the outputs in this thread, and write the text in another
+    thread. The bounded queues between the stages stop a stage which is ahead of the next stage. An error in a stage
+    stops the other stages, and is raised here. The batches are written in the order they are fetched, so the
+    output is the same as without the pipeline.
+    """
+    stopEvent = threading.Event()
+    rowsQueue = queue.Queue(maxsize=pipelineQueueSize)
+    textQueue = queue.Queue(maxsize=pipelineQueueSize)
+    writeErrors = []
+
+    def fetchStage():
+        # End with None when done, or with the error if the fetch failed
+        try:
+            for rows in batches:
+                if not putUnlessStopped(rowsQueue, rows, stopEvent):
+                    return
+            putUnlessStopped(rowsQueue, None, stopEvent)
+        except Exception as fetchError:
+            putUnlessStopped(rowsQueue, fetchError, stopEvent)
+
+    def writeStage():
+        try:
+            while True:
+                texts = getUnlessStopped(textQueue, stopEvent)
+                if texts is None:
+                    return
+                writeStartTime = time.perf_counter()
+                for output, text in zip(job.outputs, texts):
+                    output.write(text)
+                statistics.writeTime += time.perf_counter() - writeStartTime
+        except Exception as writeError:
+            writeErrors.append(writeError)
+            stopEvent.set()
+
+    fetchThread = threading.Thread(target=fetchStage, name="fetch", daemon=True)
+    writeThread = threading.Thread(target=writeStage, name="write", daemon=True)
+    fetchThread.start()
+    writeThread.start()
+    try:
+        while True:
+            rows = getUnlessStopped(rowsQueue, stopEvent)
+            if rows is None:
+                break
+            if isinstance(rows, Exception):
+                raise rows
+            rows = job.resolveDimensions(rows)
+            formatStartTime = time.perf_counter()
+            texts = [output.writer.formatRows(rows) for output in job.outputs]
+            statistics.formatTime += time.perf_counter() - formatStartTime
+            if not putUnlessStopped(textQueue, texts, stopEvent):
+                break
+
+        # Let the write stage write the remaining text
+        putUnlessStopped(textQueue, None, stopEvent)
+        writeThread.join()
+    finally:
+        stopEvent.set()
+        fetchThread.join()
+        writeThread.join()
+    if writeErrors:
+        raise writeErrors[0]
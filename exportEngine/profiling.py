@@ -0,0 +1,110 @@
+"""profiling.py: Machine-readable report of the phases of an export, and an optional cProfile dump of the export"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import sys
+import json
+import cProfile
+from exportEngine.fetch import getPeakMemory
+
+# Environment variables with the default profile report and cProfile dump paths
+profileEnvironmentVariable = "EXPORT_PROFILE"
+profileStatsEnvironmentVariable = "EXPORT_PROFILE_STATS"
+
+# Upper bounds in seconds of the buckets of the batch fetch time histogram
+histogramBounds = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+
+def histogramLabel(bound):
+    return "{:g}ms".format(bound * 1000) if bound < 1.0 else "{:g}s".format(bound)
+
+
+histogramLabels = ["<" + histogramLabel(bound) for bound in histogramBounds] + \
+    [">=" + histogramLabel(histogramBounds[-1])]
+
+
+def batchFetchTimeReport(batchFetchTimes):
+    """Get the distribution of the batch fetch times: the count, mean, percentiles and a histogram"""
+    if not batchFetchTimes:
+        return {"count": 0}
+    sortedTimes = sorted(batchFetchTimes)
+
+    def percentile(fraction):
+        return sortedTimes[min(len(sortedTimes) - 1, int(fraction * len(sortedTimes)))]
+
+    histogram = {label: 0 for label in histogramLabels}
+    for batchFetchTime in sortedTimes:
+        bucket = next((index for index, bound in enumerate(histogramBounds) if batchFetchTime < bound),
+                      len(histogramBounds))
+        histogram[histogramLabels[bucket]] += 1
+    return {
+        "count": len(sortedTimes),
+        "min": sortedTimes[0],
+        "mean": sum(sortedTimes) / len(sortedTimes),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": sortedTimes[-1],
+        "histogram": histogram
+    }
+
+
+def profileReport(name, job, statistics):
+    """Get the profile report of an export job as a dictionary"""
+    measuredTime = (statistics.executeTime + statistics.fetchTime + statistics.formatTime +
+                    statistics.writeTime)
+    return {
+        "export": name,
+        "outputs": [output.outputPath for output in job.outputs],
+        "fetch": {"mode": job.fetchStrategy.mode, "batchSize": job.fetchStrategy.batchSize,
+                  "pipelined": job.fetchStrategy.pipelined},
+        "rows": statistics.rowCount,
+        "batches": statistics.batchCount,
+        "bytesWritten": statistics.bytesWritten,
+        "resultCacheHit": statistics.resultCacheHit,
+        "phases": {
+            "connect": statistics.connectTime,
+            "execute": statistics.executeTime,
+            "fetch": statistics.fetchTime,
+            "format": statistics.formatTime,
+            "write": statistics.writeTime,
+            "other": max(0.0, statistics.totalTime - measuredTime),
+            "total": statistics.connectTime + statistics.totalTime
+        },
+        "batchFetchTime": batchFetchTimeReport(statistics.batchFetchTimes),
+        "peakMemory": getPeakMemory()
+    }
+
+
+def writeProfileReport(profilePath, report):
+    """Write the profile report as JSON to the file, or to stderr if the path is -"""
+    reportText = json.dumps(report, indent=2)
+    if profilePath == "-":
+        print(reportText, file=sys.stderr)
+    else:
+        with open(profilePath, mode='w', encoding="utf8") as profileFile:
+            profileFile.write(reportText + "\n")
+
+
+def runProfiled(job, mysqlConnection, profileStatsPath=None):
+    """Run an export job, in cProfile if a path for the profile statistics is given"""
+    if not profileStatsPath:
+        return job.run(mysqlConnection)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(job.run, mysqlConnection)
+    finally:
+        profiler.dump_stats(profileStatsPath)
+
+
+def addProfileArguments(parser):
+    """Add the arguments of the profile report"""
+    parser.add_argument("--profile", default=os.environ.get(profileEnvironmentVariable),
+                        help="write a JSON report with the time of each phase, the rows, bytes, batch fetch times " +
+                             "and peak memory to this path, or - for stderr (default environment variable " +
+                             profileEnvironmentVariable + ")")
+    parser.add_argument("--profileStats", default=os.environ.get(profileStatsEnvironmentVariable),
+                        help="dump the cProfile statistics of the export to this path, for pstats or snakeviz " +
+                             "(default environment variable " + profileStatsEnvironmentVariable + ")")
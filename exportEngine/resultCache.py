@@ -0,0 +1,212 @@
+"""resultCache.py: Skip an export when its query and the tables it reads did not change, and reuse the previous
+output files
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from exportEngine.fetch import FetchStatistics
+from exportEngine.delta import DeltaExportJob
+from exportEngine.split import SplitOutput
+
+defaultResultCachePath = "resultCache"
+defaultResultCacheSize = 1024
+
+# Arguments which do not change the content of the output files
+ignoredArguments = ["outputPath", "configPath", "resultCache", "resultCachePath", "resultCacheSize", "fetch",
+                    "fetchBatchSize", "fetchReport", "pipeline", "profile", "profileStats", "compressionThreads"]
+
+# The caches by path, shared by the exports running in one process
+resultCaches = {}
+resultCachesLock = threading.Lock()
+
+
+def linkOrCopy(sourcePath, targetPath):
+    """Hard link the target path to the source file, or copy the file if the file system has no hard links"""
+    try:
+        os.link(sourcePath, targetPath)
+    except OSError:
+        shutil.copyfile(sourcePath, targetPath)
+
+
+class ResultCache:
+    """The output files of exports, in a directory per fingerprint of the export, with the checksums of the tables
+    read by the export. The output files are hard links of the cached files where possible, so that the cache
+    takes no extra space. When the cache is larger than its maximum size, the least recently used exports are
+    removed.
+    """
+
+    def __init__(self, cachePath, maxSize):
+        self.cachePath = cachePath
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+
+    def entryPath(self, fingerprint):
+        return os.path.join(self.cachePath, fingerprint)
+
+    def lookup(self, fingerprint, checksums):
+        """Get the entry of the export if the checksums of its tables did not change, and its files are unchanged,
+        or None
+        """
+        entryPath = self.entryPath(fingerprint)
+        try:
+            with open(os.path.join(entryPath, "entry.json"), encoding="utf8") as entryFile:
+                entry = json.load(entryFile)
+            if entry["checksums"] != checksums:
+                return None
+            # A cached file must not have been written since it was cached, like through a hard link
+            for cachedFile in entry["files"]:
+                fileStat = os.stat(os.path.join(entryPath, cachedFile["name"]))
+                if fileStat.st_size != cachedFile["size"] or fileStat.st_mtime_ns != cachedFile["mtime"]:
+                    return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return entry
+
+    def restore(self, fingerprint, entry, outputs):
+        """Replace the output files by the cached files, unless they are the cached files already"""
+        entryPath = self.entryPath(fingerprint)
+        for output, cachedFile in zip(outputs, entry["files"]):
+            cachedPath = os.path.join(entryPath, cachedFile["name"])
+            output.bytesWritten = cachedFile["size"]
+            if os.path.isfile(output.outputPath) and os.path.samefile(output.outputPath, cachedPath):
+                continue
+            linkOrCopy(cachedPath, output.outputPath + ".tmp")
+            os.replace(output.outputPath + ".tmp", output.outputPath)
+        os.utime(entryPath)
+
+    def store(self, fingerprint, checksums, outputs, rowCount):
+        """Keep the output files of an export, and remove the least recently used exports if the cache is full"""
+        entryPath = self.entryPath(fingerprint)
+        temporaryPath = entryPath + ".tmp" + str(threading.get_ident())
+        shutil.rmtree(temporaryPath, ignore_errors=True)
+        os.makedirs(temporaryPath)
+        cachedFiles = []
+        for outputIndex, output in enumerate(outputs):
+            cachedName = "output{}{}".format(outputIndex, os.path.splitext(output.outputPath)[1])
+            linkOrCopy(output.outputPath, os.path.join(temporaryPath, cachedName))
+            fileStat = os.stat(os.path.join(temporaryPath, cachedName))
+            cachedFiles.append({"name": cachedName, "outputPath": output.outputPath, "size": fileStat.st_size,
+                                "mtime": fileStat.st_mtime_ns})
+        with open(os.path.join(temporaryPath, "entry.json"), mode='w', encoding="utf8") as entryFile:
+            json.dump({"checksums": checksums, "rowCount": rowCount, "files": cachedFiles}, entryFile, indent=2)
+        with self.lock:
+            shutil.rmtree(entryPath, ignore_errors=True)
+            os.replace(temporaryPath, entryPath)
+            self.evict(fingerprint)
+
+    def evict(self, keepFingerprint):
+        """Remove the least recently used exports until the cache is not larger than its maximum size"""
+        entries = []
+        for fingerprint in os.listdir(self.cachePath):
+            entryPath = self.entryPath(fingerprint)
+            if fingerprint == keepFingerprint or not os.path.isdir(entryPath) or ".tmp" in fingerprint:
+                continue
+            entrySize = sum([os.path.getsize(os.path.join(entryPath, fileName)) for fileName in os.listdir(entryPath)])
+            entries.append((os.path.getmtime(entryPath), entrySize, entryPath))
+        keepPath = self.entryPath(keepFingerprint)
+        cacheSize = sum([entrySize for _, entrySize, _ in entries]) + \
+            sum([os.path.getsize(os.path.join(keepPath, fileName)) for fileName in os.listdir(keepPath)])
+        for _, entrySize, entryPath in sorted(entries):
+            if cacheSize <= self.maxSize:
+                break
+            shutil.rmtree(entryPath, ignore_errors=True)
+            cacheSize -= entrySize
+
+
+class CachedExportJob:
+    """An export job which is skipped when the result cache has its output files for the checksums of the tables
+    read by the export
+    """
+
+    def __init__(self, job, resultCache, fingerprint):
+        self.job = job
+        self.resultCache = resultCache
+        self.fingerprint = fingerprint
+        self.definition = job.definition
+        self.outputs = job.outputs
+
+    @property
+    def fetchStrategy(self):
+        return self.job.fetchStrategy
+
+    @fetchStrategy.setter
+    def fetchStrategy(self, fetchStrategy):
+        self.job.fetchStrategy = fetchStrategy
+
+    def tableChecksums(self, mysqlConnection):
+        """Get the checksums of the tables read by the export, or None if a table has no checksum"""
+        tables = self.job.sourceTables()
+        cursor = mysqlConnection.cursor(buffered=True)
+        cursor.execute("CHECKSUM TABLE " + ", ".join(tables))
+        checksums = {table.rpartition(".")[2]: checksum for table, checksum in cursor.fetchall()}
+        cursor.close()
+        if any([checksums.get(table) is None for table in tables]):
+            return None
+        return checksums
+
+    def run(self, mysqlConnection):
+        startTime = time.perf_counter()
+        checksums = self.tableChecksums(mysqlConnection)
+        entry = self.resultCache.lookup(self.fingerprint, checksums) if checksums else None
+        if entry:
+            self.resultCache.restore(self.fingerprint, entry, self.outputs)
+            statistics = FetchStatistics(self.fetchStrategy)
+            statistics.resultCacheHit = True
+            statistics.rowCount = entry["rowCount"]
+            statistics.executeTime = time.perf_counter() - startTime
+            statistics.bytesWritten = sum([cachedFile["size"] for cachedFile in entry["files"]])
+            statistics.totalTime = statistics.executeTime
+            return statistics
+
+        # Write new output files, and not through a hard link to a cached file
+        for output in self.outputs:
+            if os.path.isfile(output.outputPath):
+                os.remove(output.outputPath)
+        statistics = self.job.run(mysqlConnection)
+        if checksums:
+            self.resultCache.store(self.fingerprint, checksums, self.outputs, statistics.rowCount)
+        return statistics
+
+
+def fingerprintOf(script, args, job, mysqlConnectorConfig):
+    """Get the fingerprint of an export: the script, the database, the query, and the arguments which change the
+    output files
+    """
+    arguments = {name: value for name, value in sorted(vars(args).items()) if name not in ignoredArguments}
+    fingerprintText = json.dumps([script, mysqlConnectorConfig['host'], mysqlConnectorConfig['database'],
+                                  job.query, arguments] + ([list(job.queryParameters)] if job.queryParameters else []),
+                                 default=str)
+    return hashlib.sha256(fingerprintText.encode("utf-8")).hexdigest()
+
+
+def cachedJobOf(script, args, job, mysqlConnectorConfig):
+    """Get the job with the result cache if requested, and possible for the job: all outputs must have a path, a
+    delta export keeps its own state, and the files of a split output are known only when the export is done
+    """
+    if not args.resultCache or isinstance(job, DeltaExportJob) or \
+            not all([output.outputPath and not isinstance(output, SplitOutput) for output in job.outputs]):
+        return job
+    with resultCachesLock:
+        if args.resultCachePath not in resultCaches:
+            resultCaches[args.resultCachePath] = ResultCache(args.resultCachePath,
+                                                             args.resultCacheSize * 1024 * 1024)
+        resultCache = resultCaches[args.resultCachePath]
+    return CachedExportJob(job, resultCache, fingerprintOf(script, args, job, mysqlConnectorConfig))
+
+
+def addResultCacheArguments(parser):
+    """Add the arguments of the result cache"""
+    parser.add_argument("--resultCache", action="store_true",
+                        help="skip the export if the query and the checksums of the tables did not change, and " +
+                             "reuse the previous output files (needs an output path)")
+    parser.add_argument("--resultCachePath", help="result cache directory (default " + defaultResultCachePath + ")",
+                        default=defaultResultCachePath)
+    parser.add_argument("--resultCacheSize", type=int, default=defaultResultCacheSize,
+                        help="maximum size of the result cache in MB (default " + str(defaultResultCacheSize) + ")")
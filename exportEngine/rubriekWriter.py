@@ -0,0 +1,84 @@
+"""rubriekWriter.py: Pivot the mutations per rubriek, year and account into a CSV report per rubriek"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+
+def formatAmount(amount):
+    """Format an amount with two decimals and a decimal comma"""
+    return "{:.2f}".format(amount).replace('.', ',')
+
+
+class RubriekWriter:
+    """Format the mutation in/out per rubriek, year and account as one CSV line per rubriek, followed by the sums.
+
+    The rows of a rubriek must be consecutive. Each year of the report has the mutation in/out of each account,
+    and the total in/out of the accounts. The columns of a year are prefixed with the year, if the report contains
+    more than one year.
+    """
+
+    fileType = "CSV"
+    encoding = "iso-8859-1"
+    errors = None
+    columnNames = ["rubriek_id", "rubriek", "jaar", "rekening_id", "mutatie_in", "mutatie_uit"]
+
+    def __init__(self, years, rekeningen):
+        self.years = years
+        self.rekeningen = rekeningen
+        self.rubriekId = None
+        self.rubriek = None
+        self.rekeningMutaties = {}
+        self.sums = [0] * (len(years) * (2 * len(rekeningen) + 3))
+        self.columnIndexes = []
+
+    def begin(self, columnNames):
+        """Get the index in the row of each column, and return the CSV header line"""
+        self.columnIndexes = [columnNames.index(columnName) for columnName in self.columnNames]
+        headerColumns = ["Rubriek"]
+        for year in self.years:
+            yearPrefix = str(year) + " " if len(self.years) > 1 else ""
+            for _, rekeningName in self.rekeningen:
+                headerColumns += [yearPrefix + rekeningName + " in", yearPrefix + rekeningName + " uit"]
+            headerColumns += [yearPrefix + "Totaal in", yearPrefix + "Totaal uit", yearPrefix + "Totaal"]
+        return ";".join(headerColumns) + "\n"
+
+    def formatRows(self, rows):
+        """Pivot the rows per rubriek, and return the lines of the rubrieken which are complete"""
+        lines = []
+        rubriekIdIndex, rubriekIndex, jaarIndex, rekeningIdIndex, mutatieInIndex, mutatieUitIndex = \
+            self.columnIndexes
+        for row in rows:
+            if row[rubriekIdIndex] != self.rubriekId:
+                lines.append(self.formatRubriek())
+                self.rubriekId = row[rubriekIdIndex]
+                self.rubriek = row[rubriekIndex]
+                self.rekeningMutaties = {}
+            mutatieIn = row[mutatieInIndex]
+            mutatieUit = row[mutatieUitIndex]
+            self.rekeningMutaties[(row[jaarIndex], row[rekeningIdIndex])] = (mutatieIn if mutatieIn else 0,
+                                                                            mutatieUit if mutatieUit else 0)
+        return "".join(lines)
+
+    def formatRubriek(self):
+        """Return the line of the current rubriek, if there are any mutations in the years of the report"""
+        amounts = []
+        for year in self.years:
+            totalIn = 0
+            totalUit = 0
+            for rekeningId, _ in self.rekeningen:
+                mutatieIn, mutatieUit = self.rekeningMutaties.get((year, rekeningId), (0, 0))
+                amounts += [mutatieIn, mutatieUit]
+                totalIn += mutatieIn
+                totalUit += mutatieUit
+            amounts += [totalIn, totalUit, totalIn - totalUit]
+
+        if not any([amount != 0 for amount in amounts]):
+            return ""
+
+        # Update the sums
+        self.sums = [amountSum + amount for amountSum, amount in zip(self.sums, amounts)]
+        return ";".join([self.rubriek] + [formatAmount(amount) for amount in amounts]) + "\n"
+
+    def end(self):
+        """Return the line of the last rubriek, and the sums of all mutations"""
+        return self.formatRubriek() + ";".join(["Totaal"] + [formatAmount(amountSum) for amountSum in self.sums]) + "\n"
@@ -0,0 +1,133 @@
+"""split.py: Split the rows of a single query into an output file per value of a column"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import re
+import itertools
+from exportEngine.executor import Output
+
+# Characters of a split value which are not used in a file name
+fileNameReplacePattern = re.compile(r"[^\w-]+")
+
+
+def fileNameOf(splitValue):
+    """Get the part of a file name for a split value: the value with each sequence of other characters than
+    letters, digits, - and _ replaced by _, or none for NULL
+    """
+    if splitValue is None:
+        return "none"
+    return fileNameReplacePattern.sub("_", str(splitValue)) or "_"
+
+
+class SplitWriter:
+    """The writer of a split output: write each row to the part of the output of its split value. The columns are
+    the columns of the writers of the parts, and the split column.
+    """
+
+    encoding = None
+    errors = None
+
+    def __init__(self, splitOutput, splitColumnName, partWriters):
+        self.splitOutput = splitOutput
+        self.splitColumnName = splitColumnName
+        self.fileType = partWriters[0].fileType
+        self.columnNames = []
+        for columnName in [columnName for writer in partWriters for columnName in writer.columnNames] + \
+                [splitColumnName]:
+            if columnName not in self.columnNames:
+                self.columnNames.append(columnName)
+        self.splitIndex = None
+
+    def begin(self, columnNames):
+        self.splitIndex = columnNames.index(self.splitColumnName)
+        self.splitOutput.columnNames = columnNames
+        return None
+
+    def formatRows(self, rows):
+        splitIndex = self.splitIndex
+        for splitValue, valueRows in itertools.groupby(rows, key=lambda row: row[splitIndex]):
+            part = self.splitOutput.partOf(splitValue)
+            part.write(part.writer.formatRows(list(valueRows)))
+        return None
+
+    def end(self):
+        self.splitOutput.endParts()
+        return None
+
+
+class SplitOutput(Output):
+    """An output split into a file per value of the split column, with the value in the placeholder of the output
+    path (like {opslag}), and the writer of the value. The parts of the values are created as their first row
+    arrives, and the parts of the initial values are always created, also without rows.
+
+    Only one part is open at a time: the query is ordered on the split column first, so that the rows of a part
+    arrive together. A part of which the rows do arrive apart, like values which are equal in the collation of the
+    column, is opened again to append the rows. All parts are ended when the export is done.
+    """
+
+    def __init__(self, outputPath, placeholder, splitColumnName, writerOf, partWriters, initialValues=()):
+        super().__init__(outputPath, SplitWriter(self, splitColumnName, partWriters))
+        self.placeholder = placeholder
+        self.writerOf = writerOf
+        self.initialValues = initialValues
+        self.columnNames = None
+        self.parts = {}
+        self.openPart = None
+        self.complete = False
+
+    def open(self, append=False):
+        # The parts are opened when their rows arrive
+        self.complete = False
+
+    def partOf(self, splitValue):
+        """Get the open part of a split value, and suspend the part which was open"""
+        partPath = self.outputPath.replace(self.placeholder, fileNameOf(splitValue))
+        part = self.parts.get(partPath)
+        if part is not None and part is self.openPart:
+            return part
+        if self.openPart is not None:
+            self.openPart.close()
+        if part is None:
+            part = Output(partPath, self.writerOf(splitValue))
+            part.compression = self.compression
+            part.open()
+            part.write(part.writer.begin(self.columnNames))
+            self.parts[partPath] = part
+        else:
+            part.open(append=True)
+        self.openPart = part
+        return part
+
+    def endParts(self):
+        """Create the parts of the initial values without rows, and write the end of all parts"""
+        for splitValue in self.initialValues:
+            self.partOf(splitValue)
+        for part in self.parts.values():
+            if part is not self.openPart:
+                part.open(append=True)
+            part.write(part.writer.end())
+            part.close()
+        self.openPart = None
+
+    def close(self):
+        self.bytesWritten = sum([part.bytesWritten for part in self.parts.values()])
+        self.openPart = None
+        self.complete = True
+
+    def discard(self):
+        """Close the open part of an export which failed, and remove the files of all parts, which are not complete
+        until all parts are ended
+        """
+        if self.complete:
+            return
+        for part in self.parts.values():
+            part.discard()
+            if os.path.exists(part.outputPath):
+                os.remove(part.outputPath)
+        self.parts = {}
+        self.openPart = None
+
+    def generatedOutputs(self):
+        return list(self.parts.values())
@@ -0,0 +1,209 @@
+"""synthetic.py: Create synthetic databases with the tables and columns used by the export definitions"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import re
+import random
+import decimal
+import datetime
+from exportEngine import exports
+from exportEngine.definitions import TEXT, INT, DATE, DECIMAL
+
+# The definitions, and the ORDER BY expressions, which together give the tables and columns of the databases
+definitions = [exports.boekenTitel, exports.boekenBoek, exports.muziekMedium, exports.muziekOpname,
+               exports.financienRubriek]
+orderByExpressions = (exports.boekenTitelOrderBy + exports.boekenBoekOrderBy + exports.muziekMediumCsvOrderBy +
+                      exports.muziekMediumXmlOrderBy + exports.muziekOpnameXmlOrderBy +
+                      [expression for orderBy in exports.muziekOpnameCsvOrderBy.values() for expression in orderBy] +
+                      exports.financienRubriekOrderBy)
+
+# Columns referenced in an SQL expression, like persoon.persoon
+columnReferencePattern = re.compile(r"\b([A-Za-z_][A-Za-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_]*)")
+
+sqlTypes = {TEXT: "VARCHAR(200)", INT: "INT", DATE: "DATE", DECIMAL: "DECIMAL(10,2)"}
+
+# Number of rows of a lookup table, like type or genre
+lookupRowCount = 50
+
+# Number of rows of the other tables which are not a driving table, per row of a driving table
+tableRowRatio = 0.2
+
+# Values with the characters which must be escaped in XML and quoted in CSV
+words = ["Bach", "Beethoven", "Éluard", "opus", "live", "rock & roll", "<remastered>", "the \"best\"", "Zappa",
+         "sonate", "Quartet", "Müller", "deel", "1", "2", "III", "de", "van"]
+
+# Values of columns which the exports filter on, so that the filters select part of the rows
+specialValues = {
+    "rekening_mutatie.rekening_id": lambda rowRandom: rowRandom.choice([1, 1, 1, 39, 39, 2, 3]),
+    "rubriek.rubriek": lambda rowRandom: rowRandom.choice(["TRANSFER:", "", "", ""]) + randomText(rowRandom)
+}
+
+
+def guessKind(columnName):
+    """Guess the kind of a column which is not exported itself, like a foreign key or a column used in a function"""
+    if columnName.endswith("_id"):
+        return INT
+    if columnName.startswith("mutatie"):
+        return DECIMAL
+    if columnName == "datum":
+        return DATE
+    return TEXT
+
+
+def randomText(rowRandom):
+    return " ".join(rowRandom.sample(words, rowRandom.randint(1, 4)))
+
+
+def parseScale(scaleArgument):
+    """Parse a number of rows like 10000, 100k or 1M"""
+    multipliers = {"k": 1000, "K": 1000, "m": 1000000, "M": 1000000}
+    try:
+        if scaleArgument[-1:] in multipliers:
+            return int(scaleArgument[:-1]) * multipliers[scaleArgument[-1]]
+        return int(scaleArgument)
+    except ValueError:
+        raise ValueError("invalid scale: " + scaleArgument)
+
+
+class SyntheticTable:
+    """A table of a synthetic database: the primary key, or the key of a fan-out table, the columns with their
+    kind, and the table referenced by each foreign key column
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.key = None
+        self.fanOutKey = None
+        self.driving = False
+        self.columns = {}
+        self.references = {}
+        self.rowCount = 0
+
+    def addColumn(self, columnName, kind):
+        if columnName not in (self.key, self.fanOutKey) and columnName not in self.columns:
+            self.columns[columnName] = kind
+
+    def isLookup(self):
+        """A lookup table has only a column with the name of the table, like type.type"""
+        return not self.driving and not self.fanOutKey and list(self.columns) == [self.name]
+
+    def createStatement(self):
+        columnDefinitions = [column + " " + sqlTypes[kind] + " NULL" for column, kind in self.columns.items()]
+        if self.key:
+            columnDefinitions.insert(0, self.key + " INT NOT NULL PRIMARY KEY")
+        else:
+            columnDefinitions.insert(0, self.fanOutKey + " INT NOT NULL")
+        indexes = ["INDEX (" + column + ")" for column in self.references]
+        return "CREATE TABLE {} ({}) DEFAULT CHARSET=utf8mb4".format(self.name, ", ".join(columnDefinitions + indexes))
+
+    def columnNames(self):
+        return [self.key or self.fanOutKey] + list(self.columns)
+
+
+def getTables(database, scale):
+    """Get the tables of a database used by the export definitions, with the number of rows for the scale"""
+    tables = {}
+
+    def table(tableName):
+        if tableName not in tables:
+            tables[tableName] = SyntheticTable(tableName)
+        return tables[tableName]
+
+    databaseDefinitions = [definition for definition in definitions if definition.database == database]
+    for definition in databaseDefinitions:
+        table(definition.table).key = definition.primaryKey
+        table(definition.table).driving = True
+
+    # The keys of the joined tables, and the foreign keys referencing them
+    for definition in databaseDefinitions:
+        referencedTables = {join.foreignKey: join.table for join in definition.joins if not join.fanOut}
+        for join in definition.joins:
+            foreignTable, foreignColumn = columnReferencePattern.fullmatch(join.foreignKey).groups()
+            if join.fanOut:
+                table(join.table).fanOutKey = join.key
+                table(join.table).references[join.key] = referencedTables.get(join.foreignKey)
+            else:
+                table(join.table).key = join.key
+            table(foreignTable).addColumn(foreignColumn, INT)
+            table(foreignTable).references[foreignColumn] = join.table if not join.fanOut else \
+                referencedTables.get(join.foreignKey)
+
+    # The columns of the exports, and the other columns used in the export queries
+    for definition in databaseDefinitions:
+        expressions = [(column.expression, column.kind) for column in definition.columns.values()]
+        expressions += [(expression, None) for expression in orderByExpressions + [definition.changeDate]
+                        if expression]
+        for expression, kind in expressions:
+            for tableName, columnName in columnReferencePattern.findall(expression):
+                if tableName in tables:
+                    isColumn = kind and expression == tableName + "." + columnName
+                    table(tableName).addColumn(columnName, kind if isColumn else guessKind(columnName))
+
+    for syntheticTable in tables.values():
+        if syntheticTable.driving:
+            syntheticTable.rowCount = scale
+        elif syntheticTable.isLookup():
+            syntheticTable.rowCount = lookupRowCount
+        else:
+            syntheticTable.rowCount = max(lookupRowCount, int(scale * tableRowRatio))
+    return tables
+
+
+def generateRows(syntheticTable, tables):
+    """Generate the rows of a table, with random values for its columns, and foreign keys to existing rows"""
+    rowRandom = random.Random(syntheticTable.name)
+    firstDate = datetime.date(2015, 1, 1).toordinal()
+    lastDate = datetime.date(2021, 12, 31).toordinal()
+
+    def columnValue(columnName, kind):
+        special = specialValues.get(syntheticTable.name + "." + columnName)
+        if special:
+            return special(rowRandom)
+        referencedTable = syntheticTable.references.get(columnName)
+        if rowRandom.random() < 0.05:
+            return None
+        if referencedTable:
+            return rowRandom.randint(1, tables[referencedTable].rowCount)
+        if kind == INT:
+            return rowRandom.randint(1900, 2021) if columnName == "jaar" else rowRandom.randint(1, 50)
+        if kind == DATE:
+            return datetime.date.fromordinal(rowRandom.randint(firstDate, lastDate))
+        if kind == DECIMAL:
+            return decimal.Decimal(rowRandom.randint(0, 100000)) / 100
+        return randomText(rowRandom)
+
+    if syntheticTable.fanOutKey:
+        # One to three rows per row of the table referenced by the fan-out key
+        referencedTable = syntheticTable.references.get(syntheticTable.fanOutKey)
+        referencedRowCount = tables[referencedTable].rowCount if referencedTable else syntheticTable.rowCount
+        for referencedKey in range(1, referencedRowCount + 1):
+            for _ in range(rowRandom.randint(1, 3)):
+                yield tuple([referencedKey] + [columnValue(columnName, kind)
+                                               for columnName, kind in syntheticTable.columns.items()])
+    else:
+        for key in range(1, syntheticTable.rowCount + 1):
+            yield tuple([key] + [columnValue(columnName, kind) for columnName, kind in syntheticTable.columns.items()])
+
+
+def createDatabase(mysqlConnection, database, scale, insertBatchSize=1000):
+    """Create the tables of a database, and fill them with synthetic rows for the scale"""
+    tables = getTables(database, scale)
+    cursor = mysqlConnection.cursor()
+    for syntheticTable in tables.values():
+        cursor.execute("DROP TABLE IF EXISTS " + syntheticTable.name)
+        cursor.execute(syntheticTable.createStatement())
+        columnNames = syntheticTable.columnNames()
+        insertStatement = "INSERT INTO {} ({}) VALUES ({})".format(
+            syntheticTable.name, ", ".join(columnNames), ", ".join(["%s"] * len(columnNames)))
+        rows = []
+        for row in generateRows(syntheticTable, tables):
+            rows.append(row)
+            if len(rows) == insertBatchSize:
+                cursor.executemany(insertStatement, rows)
+                rows = []
+        if rows:
+            cursor.executemany(insertStatement, rows)
+        mysqlConnection.commit()
+    cursor.close()
+    return tables
@@ -0,0 +1,176 @@
+"""xmlWriter.py: Stream rows of a database table as XML"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+from exportEngine.definitions import listSeparator
+from exportEngine.codegen import rowGetter, valueExpression, compileFunction
+
+
+def escapeText(text):
+    """Escape the text of an XML element in the same way as ElementTree does"""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escapeTextKeepingCarriageReturns(text):
+    """Escape the text of an XML element, and escape a carriage return as a character reference, which an XML
+    parser would otherwise read as a line feed
+    """
+    text = escapeText(text)
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    return text
+
+
+# Formatters of a field value to the text of the XML element, for values which are not text
+
+def intText(value):
+    """Convert an int value to text"""
+    return "" if value is None else str(value)
+
+
+def dateText(dateFormat):
+    """Get a formatter which converts a date value to text formatted with dateFormat"""
+    def formatDate(value):
+        return "" if value is None else value.strftime(dateFormat)
+    formatDate.expression = "'' if {0} is None else {0}.strftime(" + repr(dateFormat) + ")"
+    return formatDate
+
+
+def textElements(value):
+    """Split a list of text values, of which each value is written as an element with the tag of the field"""
+    return value.split(listSeparator) if value else []
+
+
+# The Python expression of each formatter, with {0} for the value, used in the generated row formatter
+textElements.repeated = True
+intText.expression = "'' if {0} is None else str({0})"
+
+
+class XmlWriter:
+    """Format each row as XML as soon as it is available, instead of building an ElementTree in memory.
+
+    The output is identical to writing an ElementTree with the structure <database><table><row>...</row></table>
+    </database>, preceded by the XML header and the XSL stylesheet reference.
+    Each field is given as a tuple with the tag of the element, the name of the column and the formatter of the
+    column value, or None for a text value. A list of text values (textElements) is written as an element per
+    value, like the persons of a titel. When the export starts, a row formatter is generated for the fields,
+    with the elements and the expression of each formatter inlined.
+    With keepCarriageReturns a carriage return in a text is written as &#13;, so that the text is the same when the
+    output is parsed again, like the previous output of a delta export. The output then differs from ElementTree,
+    which writes a carriage return as is.
+    """
+
+    fileType = "XML"
+    encoding = "utf8"
+    errors = "xmlcharrefreplace"
+
+    def __init__(self, databaseTag, tableTag, fields, xslPath):
+        self.databaseTag = databaseTag
+        self.tableTag = tableTag
+        self.fields = fields
+        self.xslPath = xslPath
+        self.columnNames = [columnName for _, columnName, _ in fields]
+        self.fieldElements = []
+        self.rowFormatter = None
+        self.rowCount = 0
+        self.keepCarriageReturns = False
+
+    def textEscaper(self):
+        """Get the function escaping the text of an element"""
+        return escapeTextKeepingCarriageReturns if self.keepCarriageReturns else escapeText
+
+    def begin(self, columnNames):
+        """Get the index in the row of each field, and return the XML file header and the start of the database
+        element
+        """
+        # Prepare the start, end and empty element of each field once
+        self.fieldElements = [(columnNames.index(columnName), formatter,
+                               "<" + fieldTag + ">", "</" + fieldTag + ">", "<" + fieldTag + " />")
+                              for fieldTag, columnName, formatter in self.fields]
+        self.rowFormatter = self.compileRowFormatter()
+        self.rowCount = 0
+        return ("<?xml version=\"1.0\" encoding=\"utf-8\" standalone=\"yes\"?>\n" +
+                "<?xml-stylesheet type=\"text/xsl\" href=\"{}\"?>\n".format(self.xslPath) +
+                "<" + self.databaseTag + ">")
+
+    def compileRowFormatter(self):
+        """Generate the function formatting a batch of rows as XML row elements, like:
+
+            def formatRows(rows):
+                rowTexts = []
+                append = rowTexts.append
+                for v0, v1, ... in map(getter, rows):
+                    t1 = ('' if v1 is None else str(v1))
+                    append("".join(("<row>", ('<titel>' + escapeText(v0) + '</titel>' if v0 else '<titel />'), ...,
+                                     "</row>")))
+                return "".join(rowTexts)
+        """
+        namespace = {"getter": rowGetter([index for index, _, _, _, _ in self.fieldElements]),
+                     "escapeText": self.textEscaper()}
+        valueNames = ["v" + str(fieldIndex) for fieldIndex in range(len(self.fieldElements))]
+        textLines = []
+        elementExpressions = []
+        for (_, formatter, startTag, endTag, emptyElement), valueName in zip(self.fieldElements, valueNames):
+            if getattr(formatter, "repeated", False):
+                elementExpressions.append(
+                    "(\"\".join([{} + escapeText(text) + {} for text in {}.split({})]) if {} else {})".format(
+                        repr(startTag), repr(endTag), valueName, repr(listSeparator), valueName, repr(emptyElement)))
+                continue
+            textName = valueName
+            if formatter is not None:
+                textName = "t" + valueName[1:]
+                textLines.append("        " + textName + " = " + valueExpression(formatter, valueName, namespace))
+            elementExpressions.append("({} + escapeText({}) + {} if {} else {})".format(
+                repr(startTag), textName, repr(endTag), textName, repr(emptyElement)))
+        return compileFunction("formatRows", [
+            "def formatRows(rows):",
+            "    rowTexts = []",
+            "    append = rowTexts.append",
+            "    for " + ", ".join(valueNames) + ", in map(getter, rows):"] + textLines + [
+            "        append(\"\".join((\"<row>\", " + ", ".join(elementExpressions) + ", \"</row>\")))",
+            "    return \"\".join(rowTexts)"], namespace)
+
+    def formatRows(self, rows):
+        """Format a batch of rows as XML row elements"""
+        if not rows:
+            return ""
+        text = self.rowFormatter(rows)
+        if not self.rowCount:
+            text = "<" + self.tableTag + ">" + text
+        self.rowCount += len(rows)
+        return text
+
+    def fieldTexts(self, row):
+        """Get the texts of the fields of a row, in the order of the fields"""
+        return [row[index] if formatter is None else formatter(row[index])
+                for index, formatter, _, _, _ in self.fieldElements]
+
+    def formatTextRows(self, textRows):
+        """Format a batch of rows given as the texts of the fields, like the rows read from a previous XML file"""
+        if not textRows:
+            return ""
+        rowParts = [] if self.rowCount else ["<" + self.tableTag + ">"]
+        escape = self.textEscaper()
+        for fieldTexts in textRows:
+            rowParts.append("<row>")
+            for fieldText, (_, _, startTag, endTag, emptyElement) in zip(fieldTexts, self.fieldElements):
+                if fieldText:
+                    rowParts.append(startTag + escape(fieldText) + endTag)
+                else:
+                    rowParts.append(emptyElement)
+            rowParts.append("</row>")
+        self.rowCount += len(textRows)
+        return "".join(rowParts)
+
+    def end(self):
+        """Close the table and database elements"""
+        if self.rowCount:
+            return "</" + self.tableTag + "></" + self.databaseTag + ">"
+        return "<" + self.tableTag + " /></" + self.databaseTag + ">"
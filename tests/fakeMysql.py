@@ -0,0 +1,368 @@
+"""fakeMysql.py: A fake MySQL connection for the tests, which returns the given rows for every query"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import types
+import random
+import datetime
+import contextlib
+import configparser
+from exportEngine import exports
+from exportEngine.batch import BatchJob
+from exportEngine.commands import createParser, createExportJob
+from exportEngine.definitions import sortKeyOf
+from exportEngine.fetch import FetchStrategy, FetchStatistics
+
+
+class FakeCursor:
+    """A cursor returning the rows of its connection, which records the calls of the export in the events"""
+
+    def __init__(self, connection, kind):
+        self.connection = connection
+        self.kind = kind
+        self.rows = []
+        self.description = None
+
+    def execute(self, query, parameters=None):
+        self.connection.events.append(("execute", self.kind, query, parameters))
+        self.rows = list(self.connection.rowsOf(query))
+
+    def executemany(self, query, rows):
+        self.connection.events.append(("executemany", self.kind, query, rows))
+
+    def fetchmany(self, size=1):
+        self.connection.events.append(("fetchmany", self.kind))
+        if not self.rows and self.connection.fetchError:
+            raise self.connection.fetchError
+        rows = self.rows[:size]
+        del self.rows[:size]
+        return rows
+
+    def fetchone(self):
+        self.connection.events.append(("fetchone", self.kind))
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        self.connection.events.append(("fetchall", self.kind))
+        rows = self.rows
+        self.rows = []
+        return rows
+
+    def close(self):
+        self.connection.events.append(("close", self.kind))
+
+
+class FakeConnection:
+    """A connection with cursors returning the rows, or the rows of a function of the query, and then failing with
+    the fetch error if it is set
+    """
+
+    def __init__(self, rows=(), fetchError=None):
+        self.rowsOf = rows if callable(rows) else lambda query: rows
+        self.fetchError = fetchError
+        self.events = []
+
+    def cursor(self, buffered=False, prepared=False):
+        return FakeCursor(self, "prepared" if prepared else "buffered" if buffered else "unbuffered")
+
+    def commit(self):
+        self.events.append(("commit",))
+
+    def close(self):
+        pass
+
+
+class FakeAsyncCursor:
+    """An aiomysql cursor of a fake connection"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def execute(self, query, parameters=None):
+        self.cursor.execute(query, parameters)
+
+    async def fetchmany(self, size=1):
+        return self.cursor.fetchmany(size)
+
+    async def fetchone(self):
+        return self.cursor.fetchone()
+
+    async def fetchall(self):
+        return self.cursor.fetchall()
+
+    async def close(self):
+        self.cursor.close()
+
+
+class FakeAsyncConnection:
+    """An aiomysql connection with the cursors of a fake connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def cursor(self, cursorClass=None):
+        return FakeAsyncCursor(self.connection.cursor(buffered=cursorClass == "Cursor"))
+
+
+class FakeAsyncConnectionPool:
+    """An aiomysql connection pool of which each connection is a fake connection returning the rows"""
+
+    def __init__(self, rows=(), fetchError=None):
+        self.rows = rows
+        self.fetchError = fetchError
+        self.closed = False
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield FakeAsyncConnection(FakeConnection(self.rows, self.fetchError))
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+def fakeAiomysql(rows=(), fetchError=None):
+    """Get a fake aiomysql module, of which the connection pools return the rows, and which keeps its pools"""
+    async def createPool(**poolConfig):
+        connectionPool = FakeAsyncConnectionPool(rows, fetchError)
+        fakeModule.pools.append(connectionPool)
+        return connectionPool
+
+    fakeModule = types.SimpleNamespace(MySQLError=type("MySQLError", (Exception,), {}), Cursor="Cursor",
+                                       SSCursor="SSCursor", create_pool=createPool, pools=[])
+    return fakeModule
+
+
+def selectExpressions(query):
+    """Get the expressions of the SELECT list of a query, which can have subqueries"""
+    expressions = [""]
+    depth = 0
+    position = query.index("SELECT ") + len("SELECT ")
+    while depth > 0 or not query.startswith(" FROM ", position):
+        character = query[position]
+        depth += {"(": 1, ")": -1}.get(character, 0)
+        if character == "," and depth == 0:
+            expressions.append("")
+        else:
+            expressions[-1] += character
+        position += 1
+    return [expression.strip() for expression in expressions]
+
+
+def splitOutsideParentheses(text, separator):
+    """Split a text on the separator where it is not in parentheses"""
+    parts = [""]
+    depth = 0
+    position = 0
+    while position < len(text):
+        if depth == 0 and text.startswith(separator, position):
+            parts.append("")
+            position += len(separator)
+            continue
+        depth += {"(": 1, ")": -1}.get(text[position], 0)
+        parts[-1] += text[position]
+        position += 1
+    return parts
+
+
+def enclosedInParentheses(text):
+    """Check whether a text is in parentheses as a whole, like (a OR b) but not like (a) OR (b)"""
+    depth = 0
+    for position, character in enumerate(text):
+        depth += {"(": 1, ")": -1}.get(character, 0)
+        if depth == 0:
+            return character == ")" and position == len(text) - 1
+    return False
+
+
+def fakeValue(expression, rowNumber):
+    """Get a fake value of an SQL expression in a row, which is the same for the same expression and row, like the
+    value of a column in the database, whatever its alias: text with the characters to escape, a date, a year or a
+    key
+    """
+    expression = expression.lower().split(" as ")[0]
+    valueRandom = random.Random(expression + "|" + str(rowNumber))
+    if expression.startswith("weight_string"):
+        return "{:08d}".format(rowNumber).encode()
+    if expression.endswith("datum") and "opname" not in expression:
+        return valueRandom.choice([None, datetime.date(2020, 1, 2), datetime.date(1999, 12, 31)])
+    if expression.endswith("jaar"):
+        return valueRandom.choice([None, 0, 1999])
+    if expression.endswith("_id"):
+        return rowNumber + 1
+    return valueRandom.choice([None, "", "plain {}".format(rowNumber), "quo\"te <&> \u00e9 {}".format(rowNumber), "x"])
+
+
+def fakeRowsOf(rowCount):
+    """Get a function answering a query with the fake values of its SELECT list in each of the rows"""
+    return lambda query: [tuple([fakeValue(expression, rowNumber) for expression in selectExpressions(query)])
+                          for rowNumber in range(rowCount)]
+
+
+class FakeTable:
+    """A fake table of which each row is a dict with the values of the SQL expressions, which answers the queries of
+    an export like MySQL: the rows selected by the filter, or the rows in a range of primary keys, or the rows changed
+    since a date, in the order of the ORDER BY with the collation of text columns. The filter is the function of the
+    WHERE clause in the conditions, or of each condition of an OR of conditions, and otherwise the function inFilter.
+    A CASE expression gives its THEN or ELSE result, a number or a text literal, or the value of an expression.
+    The connections of the table can be used concurrently.
+    """
+
+    def __init__(self, rows, primaryKey, changeDate=None, inFilter=lambda row: True, conditions=None):
+        self.rows = rows
+        self.primaryKey = primaryKey
+        self.changeDate = changeDate
+        self.inFilter = inFilter
+        self.conditions = conditions or {}
+        self.connections = []
+
+    def connect(self, **connectorConfig):
+        connection = FakeConnection()
+        connection.rowsOf = lambda query: self.rowsOf(query, connection.events[-1][3])
+        self.connections.append(connection)
+        return connection
+
+    def valueOf(self, row, expression):
+        if expression.startswith("WEIGHT_STRING("):
+            value = self.valueOf(row, expression[len("WEIGHT_STRING("):-1])
+            return None if value is None else value.casefold().encode("utf-8")
+        if expression.startswith("CASE WHEN ") and expression.endswith(" END"):
+            condition, _, results = expression[len("CASE WHEN "):-len(" END")].partition(" THEN ")
+            thenResult, _, elseResult = results.partition(" ELSE ")
+            return self.valueOf(row, thenResult if self.holds(row, condition) else elseResult)
+        if not expression:
+            return None
+        if expression.isdigit():
+            return int(expression)
+        if expression.startswith("'") and expression.endswith("'"):
+            return expression[1:-1]
+        return row.get(expression)
+
+    def holds(self, row, condition):
+        """Check whether a row is selected by the condition of a WHERE clause"""
+        while enclosedInParentheses(condition):
+            condition = condition[1:-1]
+        if condition in self.conditions:
+            return self.conditions[condition](row)
+        orConditions = splitOutsideParentheses(condition, " OR ")
+        if len(orConditions) > 1:
+            return any([self.holds(row, orCondition) for orCondition in orConditions])
+        return self.inFilter(row)
+
+    def sortValueOf(self, row, expression):
+        value = self.valueOf(row, expression)
+        return self.valueOf(row, "WEIGHT_STRING(" + expression + ")") if isinstance(value, str) else value
+
+    def rowsOf(self, query, parameters):
+        if not query.startswith("SELECT "):
+            # A statement like SET SESSION has no rows
+            return []
+        if "count(*)" in query:
+            return [(len([row for row in self.rows if self.inFilter(row)]),)]
+        if query.startswith("SELECT min("):
+            keys = [row[self.primaryKey] for row in self.rows]
+            return [(min(keys), max(keys)) if keys else (None, None)]
+        if self.changeDate and self.changeDate + " >= %s" in query:
+            changeDate = datetime.date.fromisoformat(parameters[-1])
+            rows = [row for row in self.rows if row[self.changeDate] >= changeDate]
+        elif self.primaryKey + " BETWEEN %s AND %s" in query:
+            firstKey, lastKey = parameters[-2:]
+            rows = [row for row in self.rows if self.inFilter(row) and firstKey <= row[self.primaryKey] <= lastKey]
+        elif len(splitOutsideParentheses(query, " WHERE ")) > 1:
+            whereClause = splitOutsideParentheses(splitOutsideParentheses(query, " WHERE ")[1], " ORDER BY ")[0]
+            rows = [row for row in self.rows if self.holds(row, whereClause)]
+        else:
+            rows = [row for row in self.rows if self.inFilter(row)]
+        if len(splitOutsideParentheses(query, " ORDER BY ")) > 1:
+            orderBy = splitOutsideParentheses(splitOutsideParentheses(query, " ORDER BY ")[-1], ", ")
+            rows = sorted(rows, key=lambda row: sortKeyOf([self.sortValueOf(row, expression)
+                                                           for expression in orderBy]))
+        expressions = selectExpressions(query)
+        return [tuple([self.valueOf(row, expression) for expression in expressions]) for row in rows]
+
+
+# The outputs of the export scripts before the export engine, on the rows of fakeRowsOf(baselineRowCount)
+baselineDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "baseline")
+baselineRowCount = 6
+
+
+def baselinePath(outputName):
+    """Get the path of the output of an export script before the export engine"""
+    return os.path.join(baselineDirectory, outputName)
+
+
+def fakeExportJob(command, arguments):
+    """Create the export job of a command for the command line arguments, with the fake database configuration"""
+    return createExportJob(command, createParser(command).parse_args(arguments), fakeDatabaseConfig())
+
+
+def fakeDatabaseConfig():
+    """Get a database configuration with the sections of all databases"""
+    databaseConfig = configparser.ConfigParser()
+    databaseConfig.read_string("[connection]\nhost = localhost\n[general]\nraise_on_warnings = true\n" +
+                               "".join(["[{0}]\nuser = user\npassword = password\ndatabase = {0}\n".format(database)
+                                        for database in ["boeken", "muziek", "financien"]]))
+    return databaseConfig
+
+
+class FakePooledConnection(FakeConnection):
+    """A connection of a connection pool, which returns to the pool when it is closed"""
+
+    def __init__(self, connectionPool, rows=()):
+        super().__init__(rows)
+        self.connectionPool = connectionPool
+
+    def close(self):
+        self.connectionPool.idleConnections.append(self)
+
+
+class FakeConnectionPool:
+    """A connection pool with pool_size connections returning the rows, which fails like the MySQL connector when all
+    connections are in use
+    """
+
+    def __init__(self, rows=(), **poolConfig):
+        self.poolConfig = poolConfig
+        self.connections = [FakePooledConnection(self, rows) for _ in range(poolConfig['pool_size'])]
+        self.idleConnections = list(self.connections)
+
+    def get_connection(self):
+        if not self.idleConnections:
+            raise RuntimeError("Failed getting connection; pool exhausted")
+        return self.idleConnections.pop()
+
+
+class FailingExportJob:
+    """An export job failing with another error than a MySQL error"""
+    definition = exports.muziekMedium
+    outputs = []
+
+    def run(self, mysqlConnection):
+        raise OSError("No space left on device")
+
+
+class SucceedingExportJob:
+    """An export job without outputs which succeeds"""
+    definition = exports.muziekMedium
+    outputs = []
+
+    def run(self, mysqlConnection):
+        return FetchStatistics(FetchStrategy())
+
+
+def checkFailingJobDoesNotStopOtherJobs(testCase, runJobs):
+    """Check that a job runner, which runs the batch jobs and returns the number of failed jobs, reports a job which
+    fails with another error than a MySQL error, and still runs the other jobs
+    """
+    batchJobs = [BatchJob("failing", FailingExportJob()), BatchJob("succeeding", SucceedingExportJob())]
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        failedJobs = runJobs(batchJobs)
+    testCase.assertEqual(failedJobs, 1)
+    testCase.assertIn("Export failing failed: No space left on device", report.getvalue())
+    testCase.assertIn("1 of 2 exports done", report.getvalue())
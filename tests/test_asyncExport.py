@@ -0,0 +1,251 @@
+"""test_asyncExport.py: Test running the exports of a job list on the event loop, with the same output as the blocking
+exports
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import time
+import filecmp
+import threading
+import tempfile
+import asyncio
+import unittest
+import contextlib
+from unittest import mock
+from exportEngine import asyncExport
+from exportEngine.batch import BatchJob
+from exportEngine.commands import BoekenBoekXml, BoekenTitelCsv, MuziekMediumCsv, MuziekMediumXml, MuziekOpnameCsv, \
+    createParser, createExportJob
+from exportEngine.config import getConnectorConfig
+from exportEngine.executor import Output
+from tests.fakeMysql import FakeAsyncConnection, FakeConnection, SucceedingExportJob, baselinePath, \
+    baselineRowCount, checkFailingJobDoesNotStopOtherJobs, fakeAiomysql, fakeDatabaseConfig, fakeExportJob, fakeRowsOf
+
+
+async def runFakeExport(connection, job):
+    """Run an export job without a connection, which fails like the job, or returns its statistics"""
+    return job.run(connection)
+
+
+class RunJobsOnLoopTest(unittest.TestCase):
+
+    def runJobsOnLoop(self, batchJobs, workers=2):
+        with mock.patch.object(asyncExport, "aiomysql", fakeAiomysql()):
+            return asyncio.run(asyncExport.runJobsOnLoop(batchJobs, fakeDatabaseConfig(), workers))
+
+    def testFailingJobDoesNotStopOtherJobs(self):
+        with mock.patch.object(asyncExport, "runExportAsync", runFakeExport):
+            checkFailingJobDoesNotStopOtherJobs(self, self.runJobsOnLoop)
+
+    def testJobsRunConcurrentlyWithAtMostAJobPerWorker(self):
+        runningJobs = []
+        maximumRunningJobs = []
+
+        async def runSlowExport(connection, job):
+            runningJobs.append(job)
+            maximumRunningJobs.append(len(runningJobs))
+            await asyncio.sleep(0.01)
+            runningJobs.remove(job)
+            return job.run(connection)
+
+        batchJobs = [BatchJob("medium" + str(jobNumber), SucceedingExportJob()) for jobNumber in range(5)]
+        with mock.patch.object(asyncExport, "runExportAsync", runSlowExport), \
+                contextlib.redirect_stdout(io.StringIO()):
+            failedJobs = self.runJobsOnLoop(batchJobs, workers=2)
+        self.assertEqual(failedJobs, 0)
+        self.assertEqual(len(maximumRunningJobs), 5)
+        self.assertEqual(max(maximumRunningJobs), 2)
+
+    def testCancelledRunCancelsRunningJobs(self):
+        startedJobs = []
+        cancelledJobs = []
+
+        async def runEndlessExport(connection, job):
+            startedJobs.append(job)
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelledJobs.append(job)
+                raise
+
+        async def runAndCancel(fakeModule):
+            batchJobs = [BatchJob("medium" + str(jobNumber), SucceedingExportJob()) for jobNumber in range(3)]
+            runTask = asyncio.create_task(asyncExport.runJobsOnLoop(batchJobs, fakeDatabaseConfig(), 2))
+            while len(startedJobs) < 2:
+                await asyncio.sleep(0)
+            runTask.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await runTask
+            # The cancelled jobs are done when the run is cancelled, and the job waiting for a worker never starts
+            self.assertEqual(cancelledJobs, startedJobs)
+            self.assertTrue(all([connectionPool.closed for connectionPool in fakeModule.pools]))
+
+        fakeModule = fakeAiomysql()
+        with mock.patch.object(asyncExport, "aiomysql", fakeModule), \
+                mock.patch.object(asyncExport, "runExportAsync", runEndlessExport):
+            asyncio.run(runAndCancel(fakeModule))
+        self.assertEqual(len(startedJobs), 2)
+
+
+class AsyncOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def testOutputIsIdenticalToBaseline(self):
+        outputs = [("boekenBoek.xml", BoekenBoekXml(), []),
+                   ("boekenTitel.csv", BoekenTitelCsv(), ["--fetch", "buffered"]),
+                   ("muziekMedium.xml", MuziekMediumXml(), ["--fetchBatchSize", "1"]),
+                   ("muziekMediumClassical.csv", MuziekMediumCsv(), []),
+                   ("muziekOpnameRest.csv", MuziekOpnameCsv(), ["-g", "rest", "--fetchBatchSize", "4"])]
+        batchJobs = [BatchJob(outputName, fakeExportJob(command, arguments + [
+            "-o", os.path.join(self.outputDirectory, outputName)])) for outputName, command, arguments in outputs]
+        fakeModule = fakeAiomysql(fakeRowsOf(baselineRowCount))
+        createPool = fakeModule.create_pool
+        poolConfigs = []
+
+        async def recordCreatePool(**poolConfig):
+            poolConfigs.append(poolConfig)
+            return await createPool(**poolConfig)
+
+        fakeModule.create_pool = recordCreatePool
+        with mock.patch.object(asyncExport, "aiomysql", fakeModule), contextlib.redirect_stdout(io.StringIO()):
+            failedJobs = asyncio.run(asyncExport.runJobsOnLoop(batchJobs, fakeDatabaseConfig(), 3))
+        self.assertEqual(failedJobs, 0)
+        for outputName, _, _ in outputs:
+            with self.subTest(outputName=outputName):
+                self.assertTrue(filecmp.cmp(os.path.join(self.outputDirectory, outputName), baselinePath(outputName),
+                                            shallow=False))
+
+        # A connection pool per database, with at most a connection per worker
+        self.assertEqual(sorted([(poolConfig["db"], poolConfig["maxsize"]) for poolConfig in poolConfigs]),
+                         [("boeken", 2), ("muziek", 3)])
+        self.assertTrue(all([connectionPool.closed for connectionPool in fakeModule.pools]))
+
+    def testCursorOfFetchMode(self):
+        for fetchMode, cursorKind in [("stream", "unbuffered"), ("buffered", "buffered")]:
+            with self.subTest(fetchMode=fetchMode):
+                job = fakeExportJob(MuziekMediumXml(), ["--fetch", fetchMode,
+                                                        "-o", os.path.join(self.outputDirectory, "medium.xml")])
+                mysqlConnection = FakeConnection(fakeRowsOf(baselineRowCount))
+                with mock.patch.object(asyncExport, "aiomysql", fakeAiomysql()):
+                    statistics = asyncio.run(asyncExport.runExportAsync(FakeAsyncConnection(mysqlConnection), job))
+                self.assertEqual(mysqlConnection.events[0][:2], ("execute", cursorKind))
+                self.assertEqual(statistics.rowCount, baselineRowCount)
+                self.assertTrue(filecmp.cmp(os.path.join(self.outputDirectory, "medium.xml"),
+                                            baselinePath("muziekMedium.xml"), shallow=False))
+
+    def testBatchesAreWrittenInOrder(self):
+        # The first batch takes longest to write, but the next batches are written after it
+        outputPath = os.path.join(self.outputDirectory, "medium.xml")
+        job = fakeExportJob(MuziekMediumXml(), ["--fetchBatchSize", "1", "-o", outputPath])
+        formatAndWriteBatch = asyncExport.formatAndWriteBatch
+        writtenBatches = []
+
+        def slowFirstBatch(job, rows, statistics):
+            if not writtenBatches:
+                time.sleep(0.05)
+            writtenBatches.append(rows)
+            formatAndWriteBatch(job, rows, statistics)
+
+        mysqlConnection = FakeConnection(fakeRowsOf(baselineRowCount))
+        with mock.patch.object(asyncExport, "aiomysql", fakeAiomysql()), \
+                mock.patch.object(asyncExport, "formatAndWriteBatch", slowFirstBatch):
+            asyncio.run(asyncExport.runExportAsync(FakeAsyncConnection(mysqlConnection), job))
+        self.assertEqual(len(writtenBatches), baselineRowCount)
+        self.assertTrue(filecmp.cmp(outputPath, baselinePath("muziekMedium.xml"), shallow=False))
+
+    def testAsyncConnectorConfig(self):
+        self.assertEqual(asyncExport.asyncConnectorConfig(getConnectorConfig(fakeDatabaseConfig(), "muziek")),
+                         {"host": "localhost", "user": "user", "password": "password", "db": "muziek",
+                          "charset": "utf8mb4", "autocommit": True})
+
+    def testJobsWhichCanRunAsync(self):
+        outputPath = os.path.join(self.outputDirectory, "medium.xml")
+        for arguments, canRunAsync in [
+                ([], True),
+                (["--fanOut", "exportMuziekMediumCsv -o " + os.path.join(self.outputDirectory, "medium.csv")], True),
+                (["--delta", "--statePath", os.path.join(self.outputDirectory, "state.json")], False),
+                (["--resultCache", "--resultCachePath", os.path.join(self.outputDirectory, "cache")], False)]:
+            with self.subTest(arguments=arguments):
+                job = fakeExportJob(MuziekMediumXml(), arguments + ["-o", outputPath])
+                self.assertEqual(asyncExport.canRunAsync(job), canRunAsync)
+        job = fakeExportJob(MuziekOpnameCsv(), ["--partitions", "2", "-o", outputPath])
+        self.assertFalse(asyncExport.canRunAsync(job))
+
+    def testReportOfMysqlErrors(self):
+        mysqlConnectorConfig = getConnectorConfig(fakeDatabaseConfig(), "muziek")
+        for mysqlError, message in [
+                (Exception(1045, "Access denied"), "Something is wrong with user name: user or password: password"),
+                (Exception(1049, "Unknown database"), "Database muziek does not exist"),
+                (Exception(2013, "Lost connection"), "MySQL error: (2013, 'Lost connection')")]:
+            report = io.StringIO()
+            with contextlib.redirect_stdout(report):
+                asyncExport.reportAsyncMysqlError(mysqlError, mysqlConnectorConfig)
+            self.assertEqual(report.getvalue(), message + "\n")
+
+
+class RunExportAsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def runExportAsync(self, arguments, fetchError=None):
+        """Run an export on a fake connection with 3 rows fetched in batches of 2, and record the threads which
+        write the output files
+        """
+        command = MuziekMediumCsv()
+        args = createParser(command).parse_args(arguments + ["-g", "rest", "--fetchBatchSize", "2"])
+        job = createExportJob(command, args, fakeDatabaseConfig())
+        mysqlConnection = FakeAsyncConnection(FakeConnection([[None] * len(job.columns)] * 3, fetchError))
+        writeThreads = set()
+        write = Output.write
+
+        def recordWrite(output, text):
+            writeThreads.add(threading.current_thread())
+            write(output, text)
+
+        with mock.patch.object(asyncExport, "aiomysql", fakeAiomysql()), \
+                mock.patch.object(Output, "write", recordWrite):
+            asyncio.run(asyncExport.runExportAsync(mysqlConnection, job))
+        return writeThreads
+
+    def testFilesAreWrittenOutsideTheEventLoop(self):
+        # The parts of a split output are opened and written while the rows are formatted
+        writeThreads = self.runExportAsync(["--splitBy", "opslag",
+                                            "-o", os.path.join(self.outputDirectory, "medium_{opslag}.csv")])
+        self.assertTrue(writeThreads)
+        self.assertNotIn(threading.main_thread(), writeThreads)
+        self.assertEqual(os.listdir(self.outputDirectory), ["medium_none.csv"])
+
+    def testIncompleteOutputIsRemoved(self):
+        with self.assertRaisesRegex(OSError, "Lost connection"):
+            self.runExportAsync(["-o", os.path.join(self.outputDirectory, "medium.csv")],
+                                OSError("Lost connection"))
+        self.assertEqual(os.listdir(self.outputDirectory), [])
+
+
+class AsyncQueryTest(unittest.TestCase):
+
+    def testPercentSInLikeLiteral(self):
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            command = MuziekMediumXml()
+            args = createParser(command).parse_args(["-g", "genre.genre like '%soul%'",
+                                                     "-o", os.path.join(outputDirectory, "medium.xml")])
+            job = createExportJob(command, args, fakeDatabaseConfig())
+        query, parameters = asyncExport.asyncQueryOf(job)
+        # aiomysql escapes the parameters into the query with the % operator
+        escapedQuery = query % tuple(["'" + parameter + "'" if isinstance(parameter, str) else str(parameter)
+                                      for parameter in parameters])
+        self.assertIn("(genre.genre like '%soul%')", escapedQuery)
+
+
+if __name__ == "__main__":
+    unittest.main()
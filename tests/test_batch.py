@@ -0,0 +1,154 @@
+"""test_batch.py: Test running the exports of a job list on a connection pool"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import time
+import filecmp
+import tempfile
+import threading
+import unittest
+import contextlib
+from unittest import mock
+from exportEngine import exports
+from exportEngine.batch import BatchJob, jobPath, readJobList, runJobs
+from tests.fakeMysql import FakeConnectionPool, SucceedingExportJob, baselinePath, baselineRowCount, \
+    checkFailingJobDoesNotStopOtherJobs, fakeDatabaseConfig, fakeRowsOf
+
+
+class ConnectionRecordingExportJob(SucceedingExportJob):
+    """An export job which records the connection it runs on, and takes a while so that the jobs overlap"""
+
+    def __init__(self, definition, jobConnections):
+        self.definition = definition
+        self.jobConnections = jobConnections
+
+    def run(self, mysqlConnection):
+        self.jobConnections.append((self.definition.database, mysqlConnection, threading.current_thread()))
+        time.sleep(0.01)
+        return super().run(mysqlConnection)
+
+
+def runJobsOnFakePools(batchJobs, workers=2, rows=()):
+    """Run the jobs on fake connection pools returning the rows, and return the number of failed jobs and the pools"""
+    connectionPools = []
+
+    def createConnectionPool(**poolConfig):
+        connectionPools.append(FakeConnectionPool(rows, **poolConfig))
+        return connectionPools[-1]
+
+    with mock.patch("mysql.connector.pooling.MySQLConnectionPool", createConnectionPool):
+        failedJobs = runJobs(batchJobs, fakeDatabaseConfig(), workers)
+    return failedJobs, connectionPools
+
+
+class RunJobsTest(unittest.TestCase):
+
+    def testFailingJobDoesNotStopOtherJobs(self):
+        checkFailingJobDoesNotStopOtherJobs(self, lambda batchJobs: runJobsOnFakePools(batchJobs)[0])
+
+    def testPooledConnectionsAreReused(self):
+        jobConnections = []
+        batchJobs = [BatchJob("medium" + str(jobNumber), ConnectionRecordingExportJob(exports.muziekMedium,
+                                                                                      jobConnections))
+                     for jobNumber in range(5)]
+        batchJobs.append(BatchJob("boek", ConnectionRecordingExportJob(exports.boekenBoek, jobConnections)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            failedJobs, connectionPools = runJobsOnFakePools(batchJobs, workers=3)
+        self.assertEqual(failedJobs, 0)
+
+        # A pool per database, with at most a connection per worker, and not more connections than jobs
+        connectionPoolOf = {connectionPool.poolConfig['database']: connectionPool
+                            for connectionPool in connectionPools}
+        self.assertEqual(sorted(connectionPoolOf), ["boeken", "muziek"])
+        self.assertEqual(connectionPoolOf["muziek"].poolConfig['pool_size'], 3)
+        self.assertEqual(connectionPoolOf["boeken"].poolConfig['pool_size'], 1)
+
+        # Each job runs on a connection of the pool of its database, which is reused by the following jobs, and
+        # all connections are returned to the pool
+        self.assertEqual(len(jobConnections), 6)
+        for database, mysqlConnection, _ in jobConnections:
+            self.assertIn(mysqlConnection, connectionPoolOf[database].connections)
+        muziekConnections = [mysqlConnection for database, mysqlConnection, _ in jobConnections
+                             if database == "muziek"]
+        self.assertLess(len(set(muziekConnections)), len(muziekConnections))
+        for connectionPool in connectionPools:
+            self.assertCountEqual(connectionPool.idleConnections, connectionPool.connections)
+
+        # The jobs run on the threads of the workers, not on the main thread
+        jobThreads = set([jobThread for _, _, jobThread in jobConnections])
+        self.assertNotIn(threading.main_thread(), jobThreads)
+        self.assertLessEqual(len(jobThreads), 3)
+
+
+class JobListTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def readJobList(self, jobListText):
+        """Read a job list, with the output directory for {0} in the arguments, and return the batch jobs"""
+        jobsPath = os.path.join(self.outputDirectory, "exportJobs.ini")
+        with open(jobsPath, "w") as jobsFile:
+            jobsFile.write(jobListText.format(self.outputDirectory))
+        return readJobList(jobsPath, fakeDatabaseConfig())
+
+    def readInvalidJobList(self, jobListText):
+        """Read a job list which is not valid, and return the report"""
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+            self.readJobList(jobListText)
+        return report.getvalue()
+
+    def testJobsWithArgumentsOfScript(self):
+        # The arguments are not interpolated, so that a filter can have a %
+        batchJobs = self.readJobList(
+            "[titel]\nscript = exportBoekenTitelXml.py\n" +
+            "arguments = -t \"type.type like '%roman%'\" -o {0}/titel.xml --profile t.json\n" +
+            "[medium]\nscript = exportMuziekMediumCsv\narguments = -g rest -o {0}/medium.csv\n")
+        self.assertEqual([(batchJob.name, batchJob.database) for batchJob in batchJobs],
+                         [("titel", "boeken"), ("medium", "muziek")])
+        self.assertEqual(batchJobs[0].exportJob.outputs[0].outputPath,
+                         os.path.join(self.outputDirectory, "titel.xml"))
+        self.assertEqual(batchJobs[0].exportJob.queryParameters, (10, "%roman%"))
+        self.assertEqual(batchJobs[0].profilePath, "t.titel.json")
+        self.assertIn("medium.genre_id != 1", batchJobs[1].exportJob.query)
+
+    def testInvalidJobLists(self):
+        self.assertIn("Job medium has an unknown script: exportMedium",
+                      self.readInvalidJobList("[medium]\nscript = exportMedium\narguments = -o {0}/medium.csv\n"))
+        self.assertIn("Job medium has no output path",
+                      self.readInvalidJobList("[medium]\nscript = exportMuziekMediumCsv\narguments = -g rest\n"))
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+            readJobList(os.path.join(self.outputDirectory, "missing.ini"), fakeDatabaseConfig())
+        self.assertIn("missing.ini not found", report.getvalue())
+
+    def testReportPathOfJob(self):
+        self.assertEqual(jobPath("profile.json", "medium"), "profile.medium.json")
+        self.assertEqual(jobPath("-", "medium"), "-")
+        self.assertIsNone(jobPath(None, "medium"))
+
+    def testOutputsOfJobListAreIdenticalToBaseline(self):
+        outputNames = ["boekenBoek.xml", "boekenTitel.csv", "muziekMedium.xml", "muziekOpnameClassical.csv"]
+        batchJobs = self.readJobList(
+            "[boek]\nscript = exportBoekenBoekXml\narguments = -o {0}/boekenBoek.xml\n" +
+            "[titel]\nscript = exportBoekenTitelCsv\narguments = -o {0}/boekenTitel.csv\n" +
+            "[medium]\nscript = exportMuziekMediumXml\narguments = -o {0}/muziekMedium.xml\n" +
+            "[opname]\nscript = exportMuziekOpnameCsv\narguments = -o {0}/muziekOpnameClassical.csv\n")
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            failedJobs, _ = runJobsOnFakePools(batchJobs, workers=3, rows=fakeRowsOf(baselineRowCount))
+        self.assertEqual(failedJobs, 0)
+        self.assertIn("4 of 4 exports done", report.getvalue())
+        for outputName in outputNames:
+            self.assertTrue(filecmp.cmp(os.path.join(self.outputDirectory, outputName), baselinePath(outputName),
+                                        shallow=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
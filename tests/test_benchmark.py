@@ -0,0 +1,185 @@
+"""test_benchmark.py: Test the synthetic databases of the benchmark, and the runs of the export scripts compared with
+the baseline
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+from exportEngine import benchmark, synthetic
+from exportEngine.benchmark import BenchmarkCase, benchmarkCases, checkBenchmarkDatabases, runCase, readBaselines, \
+    saveBaseline, reportResults
+from exportEngine.commands import commandsByScript
+from exportEngine.fetch import FetchStrategy, FetchStatistics
+from exportEngine.synthetic import getTables, generateRows, createDatabase, parseScale
+from tests.fakeMysql import FakeConnection, fakeDatabaseConfig, fakeExportJob
+
+
+class SyntheticDatabaseTest(unittest.TestCase):
+
+    def testTablesHaveColumnsOfQueries(self):
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            for case in benchmarkCases:
+                with self.subTest(case=case.name):
+                    command = commandsByScript[case.script]
+                    job = fakeExportJob(command, case.arguments + ["-o",
+                                                                   os.path.join(outputDirectory, case.outputFileName)])
+                    tables = getTables(command.definition.database, 100)
+                    for tableName, columnName in synthetic.columnReferencePattern.findall(job.query):
+                        self.assertIn(columnName, tables[tableName].columnNames())
+
+    def testRowCountsOfScale(self):
+        tables = getTables("muziek", 1000)
+        self.assertEqual(tables["medium"].rowCount, 1000)
+        self.assertEqual(tables["opname"].rowCount, 1000)
+        self.assertEqual(tables["genre"].rowCount, synthetic.lookupRowCount)
+        self.assertTrue(tables["genre"].isLookup())
+        self.assertEqual(tables["opus"].rowCount, 200)
+        self.assertEqual(getTables("muziek", 100)["opus"].rowCount, synthetic.lookupRowCount)
+
+    def testRowsReferenceExistingRows(self):
+        tables = getTables("boeken", 100)
+        for syntheticTable in tables.values():
+            with self.subTest(table=syntheticTable.name):
+                rows = list(generateRows(syntheticTable, tables))
+                self.assertEqual(rows, list(generateRows(syntheticTable, tables)))
+                columnNames = syntheticTable.columnNames()
+                keys = [row[0] for row in rows]
+                if syntheticTable.fanOutKey:
+                    # One to three rows for each row of the referenced table
+                    referencedTable = syntheticTable.references[syntheticTable.fanOutKey]
+                    self.assertEqual(sorted(set(keys)), list(range(1, tables[referencedTable].rowCount + 1)))
+                    self.assertLessEqual(max([keys.count(key) for key in set(keys)]), 3)
+                else:
+                    self.assertEqual(keys, list(range(1, syntheticTable.rowCount + 1)))
+                for columnName, referencedTable in syntheticTable.references.items():
+                    columnIndex = columnNames.index(columnName)
+                    for row in rows:
+                        self.assertTrue(row[columnIndex] is None or
+                                        1 <= row[columnIndex] <= tables[referencedTable].rowCount)
+
+    def testFilteredColumnsSelectPartOfRows(self):
+        tables = getTables("financien", 1000)
+        rows = list(generateRows(tables["rekening_mutatie"], tables))
+        rekeningIndex = tables["rekening_mutatie"].columnNames().index("rekening_id")
+        self.assertEqual(set([row[rekeningIndex] for row in rows]), {1, 2, 3, 39})
+        rubrieken = [row[1] for row in generateRows(tables["rubriek"], tables)]
+        self.assertTrue(any([rubriek.startswith("TRANSFER:") for rubriek in rubrieken]))
+        self.assertFalse(all([rubriek.startswith("TRANSFER:") for rubriek in rubrieken]))
+
+    def testCreateDatabase(self):
+        mysqlConnection = FakeConnection()
+        tables = createDatabase(mysqlConnection, "financien", 120, insertBatchSize=50)
+        for syntheticTable in tables.values():
+            with self.subTest(table=syntheticTable.name):
+                statements = [event[2] for event in mysqlConnection.events if event[0] == "execute" and
+                              event[2].split()[-1 if event[2].startswith("DROP") else 2] == syntheticTable.name]
+                self.assertEqual(statements, ["DROP TABLE IF EXISTS " + syntheticTable.name,
+                                              syntheticTable.createStatement()])
+                insertedRows = [event[3] for event in mysqlConnection.events if event[0] == "executemany" and
+                                event[2].startswith("INSERT INTO " + syntheticTable.name + " (")]
+                self.assertEqual(sum([len(rows) for rows in insertedRows]), syntheticTable.rowCount)
+                self.assertLessEqual(max([len(rows) for rows in insertedRows]), 50)
+        self.assertEqual(len([event for event in mysqlConnection.events if event[0] == "commit"]), len(tables))
+
+    def testParseScale(self):
+        self.assertEqual([parseScale(scale) for scale in ["500", "10k", "100K", "1M"]], [500, 10000, 100000, 1000000])
+        with self.assertRaisesRegex(ValueError, "invalid scale: 1G"):
+            parseScale("1G")
+
+
+# An export script which writes the output, and the fetch report of a fetch of 42 rows
+fakeScriptText = """
+import sys
+if "--help" in sys.argv:
+    sys.exit(0)
+with open(sys.argv[sys.argv.index("-o") + 1], "w") as outputFile:
+    outputFile.write("x" * 1234)
+sys.stderr.write({!r} + "\\n")
+"""
+
+
+class BenchmarkRunTest(unittest.TestCase):
+
+    def setUp(self):
+        scriptsDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(scriptsDirectory.cleanup)
+        self.scriptsDirectory = scriptsDirectory.name
+        scriptsDirectoryPatcher = mock.patch.object(benchmark, "scriptsDirectory", self.scriptsDirectory)
+        scriptsDirectoryPatcher.start()
+        self.addCleanup(scriptsDirectoryPatcher.stop)
+
+    def writeScript(self, script, scriptText):
+        with open(os.path.join(self.scriptsDirectory, script + ".py"), "w") as scriptFile:
+            scriptFile.write(scriptText)
+
+    def testResultOfFetchReport(self):
+        statistics = FetchStatistics(FetchStrategy())
+        statistics.rowCount = 42
+        statistics.totalTime = 0.5
+        self.writeScript("exportFake", fakeScriptText.format(statistics.report()))
+        result = runCase(BenchmarkCase("fake", "exportFake", "fake.csv"), "benchmark.ini", self.scriptsDirectory,
+                         [], 2)
+        self.assertEqual(result["rows"], 42)
+        self.assertEqual(result["bytesWritten"], 1234)
+        self.assertAlmostEqual(result["rowsPerSecond"], 42 / result["wallTime"])
+        self.assertGreater(result["startupTime"], 0.0)
+        if sys.platform != "win32":
+            self.assertGreater(result["peakMemory"], 0.0)
+
+    def testFailingScript(self):
+        self.writeScript("exportFake", "import sys\nsys.stderr.write('Access denied')\nsys.exit(1)\n")
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            self.assertIsNone(runCase(BenchmarkCase("fake", "exportFake", "fake.csv"), "benchmark.ini",
+                                      self.scriptsDirectory, [], 2))
+        self.assertIn("Benchmark fake failed: Access denied", report.getvalue())
+
+
+class BaselineTest(unittest.TestCase):
+
+    @staticmethod
+    def resultOf(wallTime):
+        return {"rows": 100, "wallTime": wallTime, "rowsPerSecond": 100 / wallTime, "peakMemory": None,
+                "bytesWritten": 1000, "startupTime": 0.1}
+
+    def testRegressionsAboveTolerance(self):
+        baseline = {"faster": self.resultOf(1.0), "slower": self.resultOf(1.0), "tolerated": self.resultOf(1.0)}
+        results = {"faster": self.resultOf(0.5), "slower": self.resultOf(1.2), "tolerated": self.resultOf(1.05),
+                   "new": self.resultOf(1.0)}
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            self.assertEqual(reportResults(results, baseline, 0.1), ["slower"])
+        self.assertIn("+20.0% !", report.getvalue())
+        self.assertIn("-50.0%", report.getvalue())
+
+    def testSavedBaselinesOfScales(self):
+        with tempfile.TemporaryDirectory() as baselineDirectory:
+            baselinePath = os.path.join(baselineDirectory, "baseline.json")
+            self.assertEqual(readBaselines(baselinePath), {})
+            saveBaseline(baselinePath, "scale 10000", {"fake": self.resultOf(1.0)})
+            saveBaseline(baselinePath, "scale 10000 --fetch buffered", {"fake": self.resultOf(2.0)})
+            saveBaseline(baselinePath, "scale 10000", {"fake": self.resultOf(3.0)})
+            self.assertEqual(readBaselines(baselinePath),
+                             {"scale 10000": {"fake": self.resultOf(3.0)},
+                              "scale 10000 --fetch buffered": {"fake": self.resultOf(2.0)}})
+
+    def testOnlyBenchmarkDatabases(self):
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+            checkBenchmarkDatabases(fakeDatabaseConfig())
+        self.assertIn("Database boeken of section boeken is not a benchmark database", report.getvalue())
+        databaseConfig = fakeDatabaseConfig()
+        for database in ["boeken", "muziek", "financien"]:
+            databaseConfig[database]["database"] = database + "_benchmark"
+        checkBenchmarkDatabases(databaseConfig)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""test_codegen.py: Test the row formatters generated for the columns of an export, with the expression of each
+formatter inlined
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import datetime
+import tempfile
+import unittest
+from exportEngine.codegen import rowGetter, valueExpression, compileFunction
+from exportEngine.commands import MuziekOpnameCsv
+from exportEngine.csvWriter import CsvWriter, quotedText, quotedPlain, quotedInt, quotedDate, quotedList
+from exportEngine.definitions import listSeparator
+from exportEngine.executor import runExport
+from exportEngine.xmlWriter import XmlWriter, intText, dateText, escapeText, textElements
+from tests.fakeMysql import FakeConnection, baselineRowCount, fakeExportJob, fakeRowsOf
+
+
+def compiledFormatter(formatter):
+    """Compile a function formatting a value with the expression of the formatter"""
+    namespace = {}
+    return compileFunction("formatValue", ["def formatValue(v0):",
+                                           "    return " + valueExpression(formatter, "v0", namespace)], namespace)
+
+
+class ValueExpressionTest(unittest.TestCase):
+
+    def testExpressionsAreEqualToFormatters(self):
+        texts = [None, "", "Bach", 'Bach "de Oude"', "Bach" + listSeparator + "Händel"]
+        numbers = [None, 0, 7, 1999]
+        dates = [None, datetime.date(2020, 1, 2)]
+        for formatter, values in [(quotedText, texts), (quotedPlain, texts[:3]), (quotedInt, numbers),
+                                  (quotedDate("%Y-%m-%d"), dates), (quotedList, texts),
+                                  (intText, numbers), (dateText("%d-%m-%Y"), dates)]:
+            with self.subTest(formatter=formatter.__name__):
+                self.assertTrue(formatter.expression)
+                formatValue = compiledFormatter(formatter)
+                for value in values:
+                    self.assertEqual(formatValue(value), formatter(value))
+
+    def testFormatterWithoutExpressionIsCalled(self):
+        namespace = {}
+        self.assertEqual(valueExpression(escapeText, "v3", namespace), "formatter_v3(v3)")
+        self.assertIs(namespace["formatter_v3"], escapeText)
+        self.assertEqual(compiledFormatter(escapeText)("a < b"), "a &lt; b")
+        self.assertEqual(valueExpression(None, "v3", namespace), "v3")
+
+    def testRowGetter(self):
+        self.assertEqual(rowGetter([1])(("a", "b", "c")), ("b",))
+        self.assertEqual(rowGetter([2, 0])(("a", "b", "c")), ("c", "a"))
+
+    def testSourceIsKept(self):
+        function = compileFunction("double", ["def double(value):", "    return 2 * value"], {})
+        self.assertEqual(function(21), 42)
+        self.assertEqual(function.source, "def double(value):\n    return 2 * value\n")
+
+
+class RowFormatterTest(unittest.TestCase):
+
+    rows = [("Requiem", 1791, datetime.date(2020, 1, 2), "Mozart" + listSeparator + "Süssmayr", "<CD>"),
+            ("", 0, None, None, None),
+            ('Bach "de Oude"', None, datetime.date(1999, 12, 31), "", "LP & boek")]
+
+    def testCsvRowFormatterIsEqualToFormatters(self):
+        fields = [("Titel", "titel", quotedText), ("Jaar", "jaar", quotedInt), ("Datum", "datum", quotedDate("%Y")),
+                  ("Componist", "componist", quotedList), ("Type", "type", quotedPlain)]
+        csvWriter = CsvWriter(fields)
+        csvWriter.begin(["type", "componist", "datum", "jaar", "titel"])
+        reversedRows = [tuple(reversed(row)) for row in self.rows]
+        self.assertEqual(csvWriter.formatRows(reversedRows),
+                         "".join([",".join([formatter(value) for (_, _, formatter), value in zip(fields, row)]) + "\n"
+                                  for row in self.rows]))
+        self.assertEqual(csvWriter.formatRows([]), "")
+
+    def testXmlRowFormatterIsEqualToFieldTexts(self):
+        fields = [("titel", "titel", None), ("jaar", "jaar", intText), ("datum", "datum", dateText("%d-%m-%Y")),
+                  ("type", "type", None)]
+        rows = [(titel, jaar, datum, medium) for titel, jaar, datum, _, medium in self.rows]
+        xmlWriter = XmlWriter("muziek", "medium", fields, "medium.xsl")
+        xmlWriter.begin(["titel", "jaar", "datum", "type"])
+        formattedRows = xmlWriter.formatRows(rows)
+        xmlWriter.rowCount = 0
+        self.assertEqual(formattedRows, xmlWriter.formatTextRows([xmlWriter.fieldTexts(row) for row in rows]))
+        self.assertIn("<jaar>1791</jaar><datum>02-01-2020</datum><type>&lt;CD&gt;</type>", formattedRows)
+        self.assertIn("<titel /><jaar>0</jaar><datum /><type /></row>", formattedRows)
+
+    def testXmlElementPerListValue(self):
+        xmlWriter = XmlWriter("muziek", "opname", [("componist", "componist", textElements)], "opname.xsl")
+        xmlWriter.begin(["componist"])
+        self.assertEqual(xmlWriter.formatRows([(row[3],) for row in self.rows]),
+                         "<opname><row><componist>Mozart</componist><componist>Süssmayr</componist></row>"
+                         "<row><componist /></row><row><componist /></row>")
+
+    def testGenreIsNotCheckedPerRow(self):
+        # The fields of the genre are chosen once, so the generated formatter of each genre differs, and has a single
+        # loop over the rows without any check of the arguments
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        sources = []
+        for arguments in [[], ["-g", "rest"]]:
+            job = fakeExportJob(MuziekOpnameCsv(), arguments + ["-o", os.path.join(outputDirectory.name, "o.csv")])
+            runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+            source = job.outputs[0].writer.rowFormatter.source
+            self.assertEqual(source.count(" for "), 1)
+            self.assertNotIn("genre", source)
+            sources.append(source)
+        self.assertNotEqual(sources[0], sources[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
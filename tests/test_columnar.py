@@ -0,0 +1,105 @@
+"""test_columnar.py: Test the typed rows written in the columnar Arrow IPC stream and Parquet formats"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import decimal
+import tempfile
+import unittest
+from unittest import mock
+from exportEngine import columnar
+from exportEngine.commands import BoekenTitelCsv, MuziekOpnameCsv, FinancienRubriekCsv
+from exportEngine.executor import runExport
+from tests.fakeMysql import FakeConnection, baselineRowCount, fakeExportJob, fakeRowsOf
+from tests.test_rubriekWriter import groupedRowsOf
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipUnless(pyarrow, "the columnar formats need pyarrow")
+class ColumnarWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def runExport(self, command, outputFormat, arguments=(), rowsOf=None):
+        """Run an export in a columnar format, and return the job and the rows of the query"""
+        outputPath = os.path.join(self.outputDirectory, "output." + outputFormat)
+        job = fakeExportJob(command, list(arguments) + ["-f", outputFormat, "--fetchBatchSize", "4",
+                                                        "-o", outputPath])
+        rows = rowsOf(job) if rowsOf else fakeRowsOf(baselineRowCount)(job.query)
+        runExport(FakeConnection(rows), job)
+        return job, rows
+
+    def readTable(self, outputFormat):
+        outputPath = os.path.join(self.outputDirectory, "output." + outputFormat)
+        if outputFormat == columnar.PARQUET:
+            return pyarrow.parquet.read_table(outputPath)
+        with pyarrow.ipc.open_stream(outputPath) as reader:
+            return reader.read_all()
+
+    def testTypedColumns(self):
+        for outputFormat in [columnar.ARROW, columnar.PARQUET]:
+            with self.subTest(outputFormat=outputFormat):
+                job, rows = self.runExport(BoekenTitelCsv(), outputFormat)
+                table = self.readTable(outputFormat)
+                self.assertEqual(table.schema.names, job.outputs[0].writer.columnNames)
+                self.assertEqual(table.schema.field("datum").type, pyarrow.date32())
+                self.assertEqual(table.schema.field("jaar").type, pyarrow.int64())
+                self.assertEqual(table.schema.field("titel").type, pyarrow.string())
+                self.assertEqual(table.schema.field("type").type,
+                                 pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))
+                self.assertEqual(table.to_pylist(), [dict(zip(job.columnNames, row)) for row in rows])
+
+    def testDecimalAmounts(self):
+        for outputFormat in [columnar.ARROW, columnar.PARQUET]:
+            with self.subTest(outputFormat=outputFormat):
+                job, rows = self.runExport(FinancienRubriekCsv(), outputFormat, ["-y", "2018-2020"], groupedRowsOf)
+                table = self.readTable(outputFormat)
+                self.assertEqual(table.schema.field("mutatie_in").type, pyarrow.decimal128(38, 2))
+                self.assertEqual(table.schema.field("jaar").type, pyarrow.int64())
+                self.assertEqual(table.to_pylist(), [dict(zip(job.columnNames, row)) for row in rows])
+                self.assertIn(decimal.Decimal("80.15"), table.column("mutatie_uit").to_pylist())
+
+    def testLowCardinalityColumnsAreDictionaryEncoded(self):
+        self.runExport(MuziekOpnameCsv(), columnar.PARQUET)
+        outputPath = os.path.join(self.outputDirectory, "output.parquet")
+        rowGroup = pyarrow.parquet.ParquetFile(outputPath).metadata.row_group(0)
+        encodings = {rowGroup.column(index).path_in_schema: rowGroup.column(index).encodings
+                     for index in range(rowGroup.num_columns)}
+        self.assertIn("RLE_DICTIONARY", encodings["medium_type"])
+        self.assertNotIn("RLE_DICTIONARY", encodings["opus_titel"])
+
+    def testListColumns(self):
+        job, rows = self.runExport(MuziekOpnameCsv(), columnar.ARROW, ["--nested"])
+        table = self.readTable(columnar.ARROW)
+        self.assertEqual(table.schema.field("componist").type, pyarrow.list_(pyarrow.string()))
+        componistIndex = job.columnNames.index("componist")
+        self.assertEqual(table.column("componist").to_pylist(),
+                         [row[componistIndex].split(columnar.listSeparator) if row[componistIndex] is not None
+                          else None for row in rows])
+
+    def testBatchesAreWrittenAsFetched(self):
+        # A record batch per fetched batch
+        self.runExport(BoekenTitelCsv(), columnar.ARROW)
+        outputPath = os.path.join(self.outputDirectory, "output.arrow")
+        with pyarrow.ipc.open_stream(outputPath) as reader:
+            self.assertEqual([recordBatch.num_rows for recordBatch in reader], [4, 2])
+
+        # The fetched batches are collected in row groups
+        with mock.patch.object(columnar, "parquetRowGroupSize", 4):
+            self.runExport(BoekenTitelCsv(), columnar.PARQUET)
+        metadata = pyarrow.parquet.ParquetFile(os.path.join(self.outputDirectory, "output.parquet")).metadata
+        self.assertEqual([metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)], [4, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
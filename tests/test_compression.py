@@ -0,0 +1,132 @@
+"""test_compression.py: Test the output compressed in blocks by a pool of threads, which is a valid compressed file
+of several members
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import gzip
+import lzma
+import time
+import random
+import filecmp
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+from exportEngine import compression
+from exportEngine.compression import GZIP, XZ, ZSTD, Compression, compressionOf, openCompressed, \
+    openCompressedInput
+from exportEngine.commands import BoekenBoekXml, MuziekMediumCsv
+from exportEngine.executor import runExport
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeExportJob, fakeRowsOf
+
+decompressors = {GZIP: gzip.decompress, XZ: lzma.decompress}
+if compression.zstandard:
+    decompressors[ZSTD] = lambda data: compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class CompressedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        # Small blocks, so that a file has many members
+        blockSizePatcher = mock.patch.object(compression, "compressionBlockSize", 1000)
+        blockSizePatcher.start()
+        self.addCleanup(blockSizePatcher.stop)
+        textRandom = random.Random(14)
+        self.data = "".join([textRandom.choice(["<row>", "</row>", "Bach", "é", "\n", " ", "1999"])
+                             for _ in range(20000)]).encode("utf8")
+
+    def compressedData(self, compressedFormat, chunks, threads=4):
+        """Write the chunks of the data to a compressed file, and return the compressed bytes"""
+        outputFile = io.BytesIO()
+        compressedFile = openCompressed(outputFile, Compression(compressedFormat, threads=threads),
+                                        closeOutputFile=False)
+        for chunk in chunks:
+            compressedFile.write(chunk)
+        compressedFile.close()
+        self.assertEqual(compressedFile.blockCount, max(1, -(-sum([len(chunk) for chunk in chunks]) // 1000)))
+        return outputFile.getvalue()
+
+    def testRoundTripOfMembers(self):
+        chunks = [self.data[start:start + 777] for start in range(0, len(self.data), 777)]
+        for compressedFormat, decompress in decompressors.items():
+            with self.subTest(compressedFormat=compressedFormat):
+                compressedData = self.compressedData(compressedFormat, chunks)
+                self.assertEqual(decompress(compressedData), self.data)
+                if compressedFormat == GZIP:
+                    # A gzip member per block
+                    self.assertGreaterEqual(compressedData.count(b"\x1f\x8b\x08"), len(self.data) // 1000)
+
+    def testEmptyFile(self):
+        for compressedFormat, decompress in decompressors.items():
+            with self.subTest(compressedFormat=compressedFormat):
+                self.assertEqual(decompress(self.compressedData(compressedFormat, [])), b"")
+
+    def testBlocksAreWrittenInOrder(self):
+        # The first block takes longest, but is still written first
+        compress = Compression(GZIP).compressor()
+
+        def slowFirstBlock(block):
+            if block.startswith(self.data[:1000]):
+                time.sleep(0.05)
+            return compress(block)
+
+        with mock.patch.object(Compression, "compressor", lambda self: slowFirstBlock):
+            compressedData = self.compressedData(GZIP, [self.data])
+        self.assertEqual(gzip.decompress(compressedData), self.data)
+
+    def testCompressionOfPath(self):
+        self.assertIsNone(compressionOf("medium.csv"))
+        self.assertIsNone(compressionOf(None))
+        self.assertIsNone(compressionOf("medium.csv.gz", compression.NONE))
+        self.assertEqual(compressionOf("medium.csv.GZ").format, GZIP)
+        self.assertEqual(compressionOf("medium.csv.xz").format, XZ)
+        self.assertEqual(compressionOf("medium.csv", XZ, 9, 2).__dict__, {"format": XZ, "level": 9, "threads": 2})
+        self.assertEqual(compressionOf(None, GZIP).level, 6)
+
+    def testZstdNeedsZstandard(self):
+        report = io.StringIO()
+        with mock.patch.object(compression, "zstandard", None), contextlib.redirect_stdout(report), \
+                self.assertRaises(SystemExit):
+            compressionOf("medium.csv.zst")
+        self.assertIn("needs zstandard", report.getvalue())
+
+
+class CompressedExportTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def testOutputIsIdenticalToBaseline(self):
+        for outputName, command, extension in [("boekenBoek.xml", BoekenBoekXml(), ".gz"),
+                                               ("muziekMediumClassical.csv", MuziekMediumCsv(), ".xz")]:
+            with self.subTest(outputName=outputName):
+                outputPath = os.path.join(self.outputDirectory, outputName + extension)
+                job = fakeExportJob(command, ["--compressionThreads", "3", "-o", outputPath])
+                runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+                decompressedPath = os.path.join(self.outputDirectory, outputName)
+                with openCompressedInput(outputPath, job.outputs[0].compression) as inputFile, \
+                        open(decompressedPath, "wb") as decompressedFile:
+                    decompressedFile.write(inputFile.read())
+                self.assertTrue(filecmp.cmp(decompressedPath, baselinePath(outputName), shallow=False))
+
+    def testCompressionArgumentOverridesExtension(self):
+        outputPath = os.path.join(self.outputDirectory, "boekenBoek.xml.gz")
+        job = fakeExportJob(BoekenBoekXml(), ["--compression", "none", "-o", outputPath])
+        runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+        self.assertTrue(filecmp.cmp(outputPath, baselinePath("boekenBoek.xml"), shallow=False))
+
+        outputPath = os.path.join(self.outputDirectory, "boekenBoek.xml")
+        job = fakeExportJob(BoekenBoekXml(), ["--compression", "xz", "--compressionLevel", "1", "-o", outputPath])
+        runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+        with lzma.open(outputPath) as inputFile, open(baselinePath("boekenBoek.xml"), "rb") as baselineFile:
+            self.assertEqual(inputFile.read(), baselineFile.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""test_csvWriter.py: Test the CSV lines formatted a batch of rows at once"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import datetime
+import filecmp
+import tempfile
+import unittest
+from unittest import mock
+from exportEngine.commands import BoekenTitelCsv, MuziekMediumCsv, MuziekOpnameCsv
+from exportEngine.csvWriter import CsvWriter, quotedText, quotedPlain, quotedInt, quotedDate
+from exportEngine.executor import Output, runExport
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeExportJob, fakeRowsOf
+
+
+class CsvWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def testOutputIsIdenticalToBaseline(self):
+        for outputName, command, arguments in [
+                ("boekenTitel.csv", BoekenTitelCsv(), []),
+                ("muziekMediumClassical.csv", MuziekMediumCsv(), []),
+                ("muziekMediumRest.csv", MuziekMediumCsv(), ["-g", "rest"]),
+                ("muziekOpnameClassical.csv", MuziekOpnameCsv(), []),
+                ("muziekOpnameRest.csv", MuziekOpnameCsv(), ["-g", "rest"])]:
+            with self.subTest(outputName=outputName):
+                outputPath = os.path.join(self.outputDirectory, outputName)
+                job = fakeExportJob(command, arguments + ["--fetchBatchSize", "4", "-o", outputPath])
+                runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+                self.assertTrue(filecmp.cmp(outputPath, baselinePath(outputName), shallow=False))
+
+    def testRowsAreWrittenPerBatch(self):
+        job = fakeExportJob(MuziekMediumCsv(), ["--fetchBatchSize", "4",
+                                                "-o", os.path.join(self.outputDirectory, "medium.csv")])
+        writtenTexts = []
+        write = Output.write
+
+        def recordWrite(output, text):
+            writtenTexts.append(text)
+            write(output, text)
+
+        with mock.patch.object(Output, "write", recordWrite):
+            runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+        # The header, a write of 4 lines and a write of 2 lines
+        self.assertEqual([text.count("\n") for text in writtenTexts if text], [1, 4, 2])
+
+    def testFormatters(self):
+        self.assertEqual(quotedText('Bach "de Oude"'), '"Bach ""de Oude"""')
+        self.assertEqual(quotedPlain("LP"), '"LP"')
+        self.assertEqual(quotedInt(1999), '"1999"')
+        self.assertEqual(quotedDate("%Y-%m-%d")(datetime.date(2020, 1, 2)), '"2020-01-02"')
+        # An empty value, or a value of 0, is an empty field
+        for formatter, emptyValues in [(quotedText, [None, ""]), (quotedPlain, [None, ""]), (quotedInt, [None, 0]),
+                                       (quotedDate("%Y"), [None])]:
+            for emptyValue in emptyValues:
+                self.assertEqual(formatter(emptyValue), "")
+
+    def testHeaderAndFieldsInOrderOfLayout(self):
+        csvWriter = CsvWriter([("Titel", "titel", quotedText), ("Jaar", "jaar", quotedInt)])
+        self.assertEqual(csvWriter.begin(["jaar", "opmerkingen", "titel"]), "Titel,Jaar\n")
+        self.assertEqual(csvWriter.formatRows([(1999, None, "a"), (None, "b", None)]), '"a","1999"\n,\n')
+        self.assertEqual(csvWriter.end(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
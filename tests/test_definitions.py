@@ -0,0 +1,97 @@
+"""test_definitions.py: Test the queries built from the export definitions, and the export scripts on the engine"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import sys
+import runpy
+import filecmp
+import tempfile
+import unittest
+import contextlib
+import mysql.connector
+from unittest import mock
+from exportEngine import exports
+from exportEngine.definitions import ExportDefinition, Join, Column
+from exportEngine.config import readDatabaseConfig
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeDatabaseConfig, fakeRowsOf
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BuildQueryTest(unittest.TestCase):
+
+    def testOnlyJoinsOfColumns(self):
+        columns = [exports.muziekMedium.columns["medium_titel"], exports.muziekMedium.columns["medium_datum"]]
+        self.assertEqual(exports.muziekMedium.buildQuery(columns),
+                         "SELECT medium.medium_titel, medium.medium_datum FROM medium")
+        columns.append(exports.muziekMedium.columns["label"])
+        self.assertEqual(exports.muziekMedium.buildQuery(columns, "medium.genre_id = 1", ["opslag.opslag"]),
+                         "SELECT medium.medium_titel, medium.medium_datum, label.label FROM medium " +
+                         "LEFT JOIN label ON label.label_id = medium.label_id " +
+                         "LEFT JOIN opslag ON opslag.opslag_id = medium.opslag_id " +
+                         "WHERE medium.genre_id = 1 ORDER BY opslag.opslag")
+
+    def testJoinsOfJoinsInOrderOfDefinition(self):
+        # The type of a titel is joined through the boek of the titel, and the persons of the fan-out join are
+        # always joined
+        query = exports.boekenTitel.buildQuery([exports.boekenTitel.columns["type"]])
+        self.assertEqual(query, "SELECT type.type FROM titel " +
+                         "LEFT JOIN auteurs_persoon ON auteurs_persoon.auteurs_id = titel.auteurs_id " +
+                         "LEFT JOIN boek ON boek.boek_id = titel.boek_id " +
+                         "LEFT JOIN type ON type.type_id = boek.type_id")
+
+    def testGroupBy(self):
+        definition = ExportDefinition("test", "test", "a", "a_id", [Join("b", "b_id", "a.b_id")],
+                                      [Column("b", "b.b"), Column("n", "count(a.a_id)")])
+        self.assertEqual(definition.buildQuery(list(definition.columns.values()), groupBy=["b.b"], orderBy=["b.b"]),
+                         "SELECT b.b, count(a.a_id) FROM a LEFT JOIN b ON b.b_id = a.b_id GROUP BY b.b ORDER BY b.b")
+
+
+class ExportScriptTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.configPath = os.path.join(self.outputDirectory, "database.ini")
+        with open(self.configPath, "w") as configFile:
+            fakeDatabaseConfig().write(configFile)
+
+    def runScript(self, script, arguments):
+        """Run an export script with the arguments on a fake connection, and return what it printed"""
+        report = io.StringIO()
+        with mock.patch.object(sys, "argv", [script] + arguments + ["-c", self.configPath]), \
+                mock.patch.object(mysql.connector, "connect",
+                                  lambda **connectorConfig: FakeConnection(fakeRowsOf(baselineRowCount))), \
+                contextlib.redirect_stdout(report):
+            runpy.run_path(os.path.join(repositoryDirectory, script), run_name="__main__")
+        return report.getvalue()
+
+    def testOutputIsIdenticalToBaseline(self):
+        for script, arguments, outputName in [
+                ("exportBoekenBoekXml.py", [], "boekenBoek.xml"),
+                ("exportBoekenTitelXml.py", [], "boekenTitel.xml"),
+                ("exportBoekenTitelCsv.py", [], "boekenTitel.csv"),
+                ("exportMuziekMediumXml.py", [], "muziekMedium.xml"),
+                ("exportMuziekMediumCsv.py", ["-g", "rest"], "muziekMediumRest.csv"),
+                ("exportMuziekOpnameXml.py", [], "muziekOpname.xml"),
+                ("exportMuziekOpnameCsv.py", [], "muziekOpnameClassical.csv")]:
+            with self.subTest(script=script):
+                outputPath = os.path.join(self.outputDirectory, outputName)
+                report = self.runScript(script, arguments + ["-o", outputPath])
+                self.assertEqual(report.split(), [outputName[-3:].upper(), "file", outputPath, "successfully",
+                                                  "generated"])
+                self.assertTrue(filecmp.cmp(outputPath, baselinePath(outputName), shallow=False))
+
+    def testMissingConfigurationFile(self):
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+            readDatabaseConfig(os.path.join(self.outputDirectory, "missing.ini"))
+        self.assertIn("missing.ini not found", report.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
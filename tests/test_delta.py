@@ -0,0 +1,169 @@
+"""test_delta.py: Test the merge of the changed rows of a delta export, and the merged files of a delta export which
+fails or does not match the database
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import json
+import filecmp
+import datetime
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+from exportEngine.commands import BoekenBoekXml, createParser, createExportJob
+from tests.fakeMysql import FakeConnection, FakeTable, fakeDatabaseConfig
+
+
+def rowsOf(rowCount):
+    """Get the rows of a query: the row count for the count query, and no changed rows"""
+    return lambda query: [(rowCount,)] if "count(*)" in query else []
+
+
+# The status of the books which are not exported
+statusAfgevoerd = 10
+
+
+def boekOf(boekId, boek, label, datum, statusId=1, opmerkingen=None):
+    return {"boek.boek_id": boekId, "boek.boek": boek, "label.label": label, "boek.datum": datum,
+            "boek.status_id": statusId, "status.status": "status " + str(statusId), "type.type": "roman",
+            "boek.opmerkingen": opmerkingen}
+
+
+class DeltaMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.statePath = os.path.join(self.outputDirectory, "state.json")
+        self.boekTable = FakeTable([
+            boekOf(1, "Max Havelaar", "Klassiek", datetime.date(2021, 1, 10)),
+            boekOf(2, "De avonden", "Klassiek", datetime.date(2021, 1, 11)),
+            boekOf(3, "Het diner", "Modern", datetime.date(2021, 2, 1), opmerkingen="tweede druk"),
+            boekOf(4, "Tirza", None, datetime.date(2021, 2, 2)),
+            boekOf(5, "Oorlog en terpentijn", "Modern", datetime.date(2021, 3, 1)),
+            boekOf(6, "Afgevoerd", "Modern", datetime.date(2021, 3, 1), statusId=statusAfgevoerd),
+            boekOf(7, "het Bittere kruid", "modern", datetime.date(2021, 3, 2))],
+            "boek.boek_id", "boek.datum", lambda boek: boek["boek.status_id"] != statusAfgevoerd)
+
+    def createJob(self, outputName):
+        command = BoekenBoekXml()
+        args = createParser(command).parse_args(["--delta", "--statePath", self.statePath,
+                                                 "-o", os.path.join(self.outputDirectory, outputName)])
+        return createExportJob(command, args, fakeDatabaseConfig())
+
+    def changeBoeken(self):
+        """Change the books after the previous export"""
+        boeken = {boek["boek.boek_id"]: boek for boek in self.boekTable.rows}
+        # A book moves to another place in the output, a book gets other texts, and a book is no longer selected
+        boeken[2].update({"label.label": "Modern", "boek.datum": datetime.date(2021, 3, 2)})
+        boeken[3].update({"boek.opmerkingen": "derde druk", "boek.datum": datetime.date(2021, 4, 1)})
+        boeken[5].update({"boek.status_id": statusAfgevoerd,
+                          "boek.datum": datetime.date(2021, 4, 2)})
+        # A selected book, and a book which is not selected, are added
+        self.boekTable.rows.append(boekOf(8, "Alleen maar nette mensen", "Modern", datetime.date(2021, 4, 5)))
+        self.boekTable.rows.append(boekOf(9, "Achter glas", None, datetime.date(2021, 4, 3)))
+        self.boekTable.rows.append(boekOf(10, "Weg", "Klassiek", datetime.date(2021, 4, 3),
+                                           statusId=statusAfgevoerd))
+
+    def assertSameAsFullExport(self, job):
+        """Assert that the output and the key index are identical to those of a full export of the database"""
+        fullJob = self.createJob("full.xml")
+        fullJob.runFull(self.boekTable.connect())
+        self.assertTrue(filecmp.cmp(job.output.outputPath, fullJob.output.outputPath, shallow=False))
+        self.assertTrue(filecmp.cmp(job.keysPath, fullJob.keysPath, shallow=False))
+
+    def testMergedOutputIsIdenticalToFullExport(self):
+        job = self.createJob("boeken.xml")
+        _, highWaterMark = job.runFull(self.boekTable.connect())
+        self.assertEqual(highWaterMark, datetime.date(2021, 3, 2))
+        self.changeBoeken()
+
+        statistics, highWaterMark = job.runDelta(self.boekTable.connect(), "2021-03-02")
+        self.assertEqual(highWaterMark, "2021-04-05")
+        # Only the changed rows are fetched: the books changed on or after the high-water mark
+        self.assertEqual(statistics.rowCount, 7)
+        self.assertSameAsFullExport(job)
+        with open(job.output.outputPath, encoding="utf8") as outputFile:
+            output = outputFile.read()
+        for missingBoek in ["Oorlog en terpentijn", "Afgevoerd", "Weg"]:
+            self.assertNotIn(missingBoek, output)
+
+    def testRunsDeltaAfterFullExport(self):
+        job = self.createJob("boeken.xml")
+        job.run(self.boekTable.connect())
+        with open(self.statePath, encoding="utf8") as stateFile:
+            self.assertEqual(json.load(stateFile), {job.stateKey: {"fingerprint": job.fingerprint,
+                                                                   "highWaterMark": "2021-03-02"}})
+        self.changeBoeken()
+
+        job.run(self.boekTable.connect())
+        executeEvents = [event for event in self.boekTable.connections[-1].events if event[0] == "execute"]
+        self.assertEqual(len(executeEvents), 2)
+        self.assertIn("boek.datum >= %s", executeEvents[1][2])
+        self.assertEqual(executeEvents[1][3][-1], "2021-03-02")
+        with open(self.statePath, encoding="utf8") as stateFile:
+            self.assertEqual(json.load(stateFile)[job.stateKey]["highWaterMark"], "2021-04-05")
+        self.assertSameAsFullExport(job)
+
+    def testDeletedRowGivesFullExport(self):
+        job = self.createJob("boeken.xml")
+        job.run(self.boekTable.connect())
+        self.changeBoeken()
+        del self.boekTable.rows[0]
+
+        job.run(self.boekTable.connect())
+        executeQueries = [event[2] for event in self.boekTable.connections[-1].events if event[0] == "execute"]
+        self.assertEqual(len(executeQueries), 3)
+        self.assertNotIn("boek.datum >= %s", executeQueries[2])
+        self.assertSameAsFullExport(job)
+
+
+class DeltaMergeFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputPath = os.path.join(outputDirectory.name, "boeken.xml")
+        command = BoekenBoekXml()
+        args = createParser(command).parse_args(["--delta", "--statePath",
+                                                 os.path.join(outputDirectory.name, "state.json"),
+                                                 "-o", self.outputPath])
+        self.job = createExportJob(command, args, fakeDatabaseConfig())
+
+        # The previous export, without rows
+        self.job.runFull(FakeConnection([]))
+        with open(self.outputPath, encoding="utf8") as outputFile:
+            self.previousOutput = outputFile.read()
+
+    def assertNoMergedFiles(self):
+        self.assertFalse(os.path.exists(self.outputPath + ".tmp"))
+        self.assertFalse(os.path.exists(self.job.keysPath + ".tmp"))
+        with open(self.outputPath, encoding="utf8") as outputFile:
+            self.assertEqual(outputFile.read(), self.previousOutput)
+
+    def testCarriageReturnsAreKept(self):
+        self.assertTrue(self.job.output.writer.keepCarriageReturns)
+
+    def testMergeWithoutChanges(self):
+        statistics, highWaterMark = self.job.runDelta(FakeConnection(rowsOf(0)), "2021-05-01")
+        self.assertEqual(highWaterMark, "2021-05-01")
+        self.assertNoMergedFiles()
+
+    def testRowCountMismatchRemovesMergedFiles(self):
+        self.assertIsNone(self.job.runDelta(FakeConnection(rowsOf(5)), "2021-05-01"))
+        self.assertNoMergedFiles()
+
+    def testInvalidPreviousOutputRemovesMergedFiles(self):
+        with open(self.outputPath, "w", encoding="utf8") as outputFile:
+            outputFile.write(self.previousOutput[:len(self.previousOutput) // 2])
+        self.previousOutput = self.previousOutput[:len(self.previousOutput) // 2]
+        with self.assertRaises(ElementTree.ParseError):
+            self.job.runDelta(FakeConnection(rowsOf(0)), "2021-05-01")
+        self.assertNoMergedFiles()
+
+
+if __name__ == "__main__":
+    unittest.main()
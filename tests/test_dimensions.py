@@ -0,0 +1,137 @@
+"""test_dimensions.py: Test the names of the small lookup tables looked up in the client instead of joined"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import json
+import zlib
+import filecmp
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+from exportEngine import dimensions
+from exportEngine.commands import MuziekMediumCsv, MuziekMediumXml
+from tests.fakeMysql import FakeTable, fakeExportJob
+
+
+class FakeMediumTable(FakeTable):
+    """A fake medium table with its dimension tables, which also answers the queries of the dimension cache"""
+
+    def __init__(self, media, dimensionTables):
+        self.media = media
+        self.dimensionTables = dimensionTables
+        super().__init__([], "medium.medium_id",
+                         inFilter=lambda medium: medium["medium.medium_status_id"] not in (1, 9))
+        self.joinDimensions()
+
+    def joinDimensions(self):
+        """Get the rows of the medium table with the values of the dimension tables, like the joins"""
+        self.rows = [dict(medium, **{table + "." + table: values.get(medium["medium." + table + "_id"])
+                                     for table, values in self.dimensionTables.items()})
+                     for medium in self.media]
+
+    def rowsOf(self, query, parameters):
+        table = query.split()[-1]
+        if query.startswith("CHECKSUM TABLE "):
+            return [(table, zlib.crc32(json.dumps(sorted(self.dimensionTables[table].items())).encode()))]
+        if query == "SELECT count(*) FROM " + table and table in self.dimensionTables:
+            return [(len(self.dimensionTables[table]),)]
+        if query == dimensions.valuesQueryOf(table, table + "_id", table):
+            return sorted(self.dimensionTables[table].items())
+        return super().rowsOf(query, parameters)
+
+
+def mediumOf(mediumId, titel, genreId, subgenreId, mediumTypeId, mediumStatusId, labelId, opslagId):
+    return {"medium.medium_id": mediumId, "medium.medium_titel": titel, "medium.uitvoerenden": "uitvoerenden",
+            "medium.genre_id": genreId, "medium.subgenre_id": subgenreId, "medium.medium_type_id": mediumTypeId,
+            "medium.medium_status_id": mediumStatusId, "medium.label_id": labelId, "medium.label_nummer": None,
+            "medium.opslag_id": opslagId, "medium.medium_datum": datetime.date(2020, 1, mediumId),
+            "medium.opmerkingen": None}
+
+
+class DimensionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.cacheArguments = ["--dimensionCache",
+                               "--dimensionCachePath", os.path.join(self.outputDirectory, "dimensionCache")]
+
+        # Each test starts in a new process, without dimension caches
+        dimensionCachesPatcher = mock.patch.dict(dimensions.dimensionCaches, clear=True)
+        dimensionCachesPatcher.start()
+        self.addCleanup(dimensionCachesPatcher.stop)
+
+        self.mediumTable = FakeMediumTable(
+            [mediumOf(1, "Goldberg variaties", 1, 1, 1, 2, 1, 2),
+             mediumOf(2, "Requiem", 1, 2, 2, 2, None, 1),
+             mediumOf(3, "Kind of blue", 2, None, 1, 3, 2, 1),
+             mediumOf(4, "Verkocht", 1, 1, 1, 9, 1, 1),
+             mediumOf(5, "Blue train", 2, 3, 1, 2, 3, None),
+             mediumOf(6, "Onbekend", 9, 9, 9, 2, 9, 9)],
+            {"genre": {1: "Klassiek", 2: "Jazz"},
+             "subgenre": {1: "Barok", 2: "Romantiek", 3: "Hard bop"},
+             "medium_type": {1: "CD", 2: "LP"},
+             "medium_status": {1: "Weg", 2: "Aanwezig", 3: "Uitgeleend", 9: "Verkocht"},
+             "label": {1: "DG", 2: "Columbia", 3: "Blue Note"},
+             "opslag": {1: "Kast", 2: "Zolder"}})
+
+    def runExport(self, command, outputName, arguments=()):
+        """Run an export on the medium table, and return the connection"""
+        job = fakeExportJob(command, list(arguments) + ["-o", os.path.join(self.outputDirectory, outputName)])
+        mysqlConnection = self.mediumTable.connect()
+        job.run(mysqlConnection)
+        return mysqlConnection
+
+    @staticmethod
+    def executedQueries(mysqlConnection):
+        return [event[2] for event in mysqlConnection.events if event[0] == "execute"]
+
+    def testOutputIsIdenticalToJoinedOutput(self):
+        for command, outputName in [(MuziekMediumXml(), "medium.xml"), (MuziekMediumCsv(), "medium.csv")]:
+            with self.subTest(outputName=outputName):
+                self.runExport(command, "joined." + outputName)
+                mysqlConnection = self.runExport(command, outputName, self.cacheArguments)
+                self.assertTrue(filecmp.cmp(os.path.join(self.outputDirectory, outputName),
+                                            os.path.join(self.outputDirectory, "joined." + outputName),
+                                            shallow=False))
+                # The dimension tables are not joined
+                self.assertNotIn("JOIN label", self.executedQueries(mysqlConnection)[-1])
+
+    def testCacheFilesAreUsedByNextProcess(self):
+        mysqlConnection = self.runExport(MuziekMediumXml(), "medium.xml", self.cacheArguments)
+        self.assertIn("SELECT label.label_id, label.label FROM label", self.executedQueries(mysqlConnection))
+        with open(os.path.join(self.outputDirectory, "dimensionCache", "muziek.label.label.json"),
+                  encoding="utf8") as cacheFile:
+            self.assertEqual(json.load(cacheFile)["values"], [[1, "DG"], [2, "Columbia"], [3, "Blue Note"]])
+
+        dimensions.dimensionCaches.clear()
+        mysqlConnection = self.runExport(MuziekMediumXml(), "medium.xml", self.cacheArguments)
+        queries = self.executedQueries(mysqlConnection)
+        self.assertIn("CHECKSUM TABLE label", queries)
+        self.assertNotIn("SELECT label.label_id, label.label FROM label", queries)
+
+    def testChangedTableIsLoadedAgain(self):
+        self.runExport(MuziekMediumXml(), "medium.xml", self.cacheArguments)
+        self.mediumTable.dimensionTables["label"][2] = "Columbia Records"
+        self.mediumTable.joinDimensions()
+
+        dimensions.dimensionCaches.clear()
+        mysqlConnection = self.runExport(MuziekMediumXml(), "medium.xml", self.cacheArguments)
+        self.assertIn("SELECT label.label_id, label.label FROM label", self.executedQueries(mysqlConnection))
+        self.assertNotIn("SELECT genre.genre_id, genre.genre FROM genre", self.executedQueries(mysqlConnection))
+        self.runExport(MuziekMediumXml(), "joined.medium.xml")
+        self.assertTrue(filecmp.cmp(os.path.join(self.outputDirectory, "medium.xml"),
+                                    os.path.join(self.outputDirectory, "joined.medium.xml"), shallow=False))
+
+    def testMapsAreLoadedOncePerProcess(self):
+        self.runExport(MuziekMediumXml(), "medium.xml", self.cacheArguments)
+        mysqlConnection = self.runExport(MuziekMediumCsv(), "medium.csv", self.cacheArguments)
+        self.assertEqual(len(self.executedQueries(mysqlConnection)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
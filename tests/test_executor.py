@@ -0,0 +1,65 @@
+"""test_executor.py: Test the outputs of an export which fails"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from exportEngine.commands import MuziekMediumCsv, createParser, createExportJob
+from exportEngine.executor import runExport
+from tests.fakeMysql import FakeConnection, FakeCursor, fakeDatabaseConfig
+
+
+class FailedExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.outputDirectory.cleanup)
+
+    def createJob(self, arguments):
+        command = MuziekMediumCsv()
+        args = createParser(command).parse_args(["-g", "rest", "--fetchBatchSize", "2"] + arguments)
+        return createExportJob(command, args, fakeDatabaseConfig())
+
+    def outputPath(self, outputName):
+        return os.path.join(self.outputDirectory.name, outputName)
+
+    def runFailingExport(self, job):
+        """Run an export of which the fetch fails after 3 rows, and return the events of the connection"""
+        mysqlConnection = FakeConnection([[None] * len(job.columns)] * 3, OSError("Lost connection"))
+        with self.assertRaisesRegex(OSError, "Lost connection"):
+            runExport(mysqlConnection, job)
+        return mysqlConnection.events
+
+    def testCompleteOutputIsKept(self):
+        job = self.createJob(["-o", self.outputPath("medium.csv")])
+        statistics = runExport(FakeConnection([[None] * len(job.columns)] * 3), job)
+        self.assertEqual(statistics.rowCount, 3)
+        self.assertTrue(os.path.isfile(self.outputPath("medium.csv")))
+
+    def testIncompleteOutputIsRemoved(self):
+        for outputName, arguments in [("medium.csv", []), ("medium.csv.gz", []), ("medium.csv", ["--pipeline"])]:
+            with self.subTest(outputName=outputName, arguments=arguments):
+                events = self.runFailingExport(self.createJob(arguments + ["-o", self.outputPath(outputName)]))
+                self.assertFalse(os.path.exists(self.outputPath(outputName)))
+                self.assertEqual(events[-1][0], "close")
+
+    def testIncompleteSplitOutputIsRemoved(self):
+        self.runFailingExport(self.createJob(["--splitBy", "opslag", "-o", self.outputPath("medium_{opslag}.csv")]))
+        self.assertEqual(os.listdir(self.outputDirectory.name), [])
+
+    def testPreviousOutputIsKeptIfQueryFails(self):
+        with open(self.outputPath("medium.csv"), "w") as previousOutputFile:
+            previousOutputFile.write("previous export")
+        job = self.createJob(["-o", self.outputPath("medium.csv")])
+        with mock.patch.object(FakeCursor, "execute", side_effect=OSError("Lost connection")):
+            with self.assertRaises(OSError):
+                runExport(FakeConnection(), job)
+        with open(self.outputPath("medium.csv")) as previousOutputFile:
+            self.assertEqual(previousOutputFile.read(), "previous export")
+
+
+if __name__ == "__main__":
+    unittest.main()
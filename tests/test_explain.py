@@ -0,0 +1,223 @@
+"""test_explain.py: Test the report of the query plan of the export jobs, and the indexes it suggests"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+import mysql.connector
+from exportEngine.batch import BatchJob
+from exportEngine.commands import BoekenTitelXml, MuziekMediumXml, MuziekOpnameCsv
+from exportEngine.explain import createIndexStatement, explainJob, explainJobs, referencedColumns, stepNotes
+from tests.fakeMysql import FakeConnection, FakeCursor, fakeDatabaseConfig, fakeExportJob
+
+# The columns of the EXPLAIN output which are used
+planColumns = ["id", "select_type", "table", "type", "key", "rows", "filtered", "Extra"]
+
+
+def stepOf(table, accessType, key=None, rows=1, filtered=100.0, extra=None, selectType="SIMPLE"):
+    return (1, selectType, table, accessType, key, rows, filtered, extra)
+
+
+class PlanCursor(FakeCursor):
+    """A cursor with the description of the columns of the result of the statement"""
+
+    def execute(self, query, parameters=None):
+        super().execute(query, parameters)
+        self.description = [(columnName,) for columnName in self.connection.columnNamesOf(query)]
+
+
+class PlanConnection(FakeConnection):
+    """A connection answering EXPLAIN with the steps of the plan, and SHOW INDEX with the columns of the indexes of
+    each table
+    """
+
+    def __init__(self, steps, indexes=None):
+        super().__init__(self.resultOf)
+        self.steps = steps
+        self.indexes = indexes or {}
+        self.closed = False
+
+    def cursor(self, buffered=False, prepared=False):
+        return PlanCursor(self, "prepared" if prepared else "buffered" if buffered else "unbuffered")
+
+    def columnNamesOf(self, query):
+        if query.startswith("SHOW INDEX FROM "):
+            return ["Key_name", "Seq_in_index", "Column_name"]
+        return ["EXPLAIN"] if query.startswith("EXPLAIN ANALYZE ") else planColumns
+
+    def resultOf(self, query):
+        if query.startswith("SHOW INDEX FROM "):
+            # The columns of an index are given in the reverse order, which the sequence in the index corrects
+            return [(indexName, sequence + 1, column)
+                    for indexName, columns in self.indexes.get(query[len("SHOW INDEX FROM "):], {}).items()
+                    for sequence, column in reversed(list(enumerate(columns)))]
+        if query.startswith("EXPLAIN ANALYZE "):
+            return [("-> Sort: opslag.opslag  (actual time=1.2..1.3 rows=3 loops=1)\n" +
+                     "    -> Table scan on medium  (actual time=0.1..0.2 rows=4 loops=1)",)]
+        return self.steps
+
+    def close(self):
+        self.closed = True
+
+    def queries(self):
+        return [(event[1], event[2], event[3]) for event in self.events if event[0] == "execute"]
+
+
+class StepNotesTest(unittest.TestCase):
+
+    def testNotesOfStep(self):
+        self.assertEqual(stepNotes({"type": "ALL", "Extra": "Using where; Using temporary; Using filesort"}),
+                         ["full scan", "filesort", "temporary table"])
+        self.assertEqual(stepNotes({"type": "index", "Extra": None}), ["full index scan"])
+        self.assertEqual(stepNotes({"type": "ALL", "Extra": "Using where; Using join buffer (hash join)"}),
+                         ["full scan", "join without index"])
+        self.assertEqual(stepNotes({"type": "eq_ref", "Extra": "Using where"}), [])
+        self.assertEqual(stepNotes({"type": "ref"}), [])
+
+    def testReferencedColumns(self):
+        self.assertEqual(referencedColumns("(medium.genre_id = %s) AND (genre.genre LIKE 'medium.x%') AND " +
+                                           "(medium.medium_titel > medium.genre_id)", "medium"),
+                         ["genre_id", "medium_titel"])
+        self.assertEqual(referencedColumns(None, "medium"), [])
+
+    def testIndexNameIsTruncated(self):
+        self.assertEqual(createIndexStatement("medium", ["genre_id", "medium_titel"]),
+                         "CREATE INDEX medium_genre_id_medium_titel ON medium (genre_id, medium_titel);")
+        indexStatement = createIndexStatement("componisten_persoon", ["componisten_id", "persoon_id", "x" * 40])
+        self.assertEqual(indexStatement.split()[2], ("componisten_persoon_componisten_id_persoon_id_" + "x" * 40)[:64])
+
+
+class ExplainJobTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputPath = os.path.join(outputDirectory.name, "export.xml")
+        self.mediumJob = fakeExportJob(MuziekMediumXml(), ["--filter", "medium.genre_id = 1", "-o", self.outputPath])
+        self.mediumSteps = [stepOf("medium", "ALL", rows=1000, filtered=10.0, extra="Using where; Using filesort")] + \
+                           [stepOf(table, "eq_ref", key="PRIMARY") for table in
+                            ["genre", "subgenre", "medium_type", "medium_status", "label", "opslag"]]
+
+    def testFullScanOfDrivingTable(self):
+        planConnection = PlanConnection(self.mediumSteps, {"medium": {"PRIMARY": ["medium_id"]}})
+        report = explainJob(planConnection, "medium", self.mediumJob, {})
+        # The query is explained with the parameters of its filters
+        self.assertEqual(planConnection.queries(),
+                         [("buffered", "EXPLAIN " + self.mediumJob.query, (1, 9, 1)),
+                          ("buffered", "SHOW INDEX FROM medium", None)])
+        lines = report.splitlines()
+        self.assertEqual(lines[0], "Job medium (muziekMedium)")
+        self.assertEqual(lines[2].split(), ["1", "medium", "ALL", "-", "1000", "10.0", "100", "full", "scan,",
+                                            "filesort"])
+        self.assertEqual(lines[3].split(), ["1", "genre", "eq_ref", "PRIMARY", "1", "100.0", "100"])
+        # The order on opslag.opslag always needs a filesort, so the index is on the filter columns only
+        self.assertIn("  Note: the order on the joined tables opslag always needs a filesort", lines)
+        self.assertEqual(lines[-2:], ["  Suggested indexes:",
+                                      "    CREATE INDEX medium_medium_status_id_genre_id ON medium " +
+                                      "(medium_status_id, genre_id);  -- filter"])
+
+    def testExistingIndexIsNotSuggested(self):
+        indexes = {"medium": {"PRIMARY": ["medium_id"], "status_genre": ["medium_status_id", "genre_id", "label_id"]}}
+        report = explainJob(PlanConnection(self.mediumSteps, indexes), "medium", self.mediumJob, {})
+        self.assertEqual(report.splitlines()[-1], "  No indexes to suggest")
+        # An index on the columns in another order does not cover the suggestion
+        indexes = {"medium": {"genre_status": ["genre_id", "medium_status_id"]}}
+        report = explainJob(PlanConnection(self.mediumSteps, indexes), "medium", self.mediumJob, {})
+        self.assertIn("medium (medium_status_id, genre_id);  -- filter", report)
+
+    def testFilterAndOrderOfDrivingTable(self):
+        boekenJob = fakeExportJob(BoekenTitelXml(), ["-o", self.outputPath])
+        boekenJob.orderBy = ["titel.jaar", "titel.titel"]
+        boekenJob.whereClause = "titel.taal_id = 2"
+        report = explainJob(PlanConnection([stepOf("titel", "ALL", rows=50, extra="Using where; Using filesort")]),
+                            "titel", boekenJob, {})
+        self.assertIn("CREATE INDEX titel_taal_id_jaar_titel ON titel (taal_id, jaar, titel);  -- filter and order",
+                      report)
+        self.assertNotIn("Note:", report)
+
+    def testScannedJoinedTable(self):
+        opnameJob = fakeExportJob(MuziekOpnameCsv(), ["-o", self.outputPath])
+        steps = [stepOf("opname", "ref", key="genre", rows=200),
+                 stepOf("opus", "eq_ref", key="PRIMARY"),
+                 stepOf("componisten_persoon", "ALL", rows=30, extra="Using where; Using join buffer (hash join)"),
+                 stepOf("persoon", "eq_ref", key="PRIMARY")]
+        indexCache = {}
+        planConnection = PlanConnection(steps, {"componisten_persoon": {"PRIMARY": ["persoon_id"]}})
+        report = explainJob(planConnection, "opname", opnameJob, indexCache)
+        self.assertIn("    CREATE INDEX componisten_persoon_componisten_id_persoon_id ON componisten_persoon " +
+                      "(componisten_id, persoon_id);  -- join on componisten_persoon.componisten_id = " +
+                      "opus.componisten_id", report)
+        self.assertIn("6000  full scan, join without index", report)
+        self.assertEqual(indexCache, {"componisten_persoon": [["persoon_id"]]})
+
+        # The indexes of a table are read once
+        explainJob(planConnection, "opname", opnameJob, indexCache)
+        self.assertEqual([query for _, query, _ in planConnection.queries()].count(
+            "SHOW INDEX FROM componisten_persoon"), 1)
+
+    def testAnalyze(self):
+        planConnection = PlanConnection(self.mediumSteps)
+        report = explainJob(planConnection, "medium", self.mediumJob, {}, analyze=True)
+        self.assertEqual(planConnection.queries()[1], ("buffered", "EXPLAIN ANALYZE " + self.mediumJob.query,
+                                                       (1, 9, 1)))
+        self.assertIn("  EXPLAIN ANALYZE:\n    -> Sort: opslag.opslag", report)
+        self.assertTrue(report.endswith("\n        -> Table scan on medium  (actual time=0.1..0.2 rows=4 loops=1)"))
+
+    def testJobOfResultCache(self):
+        cachedJob = fakeExportJob(MuziekMediumXml(), ["--filter", "medium.genre_id = 1", "--resultCache",
+                                                      "--resultCachePath", self.outputPath + ".cache",
+                                                      "-o", self.outputPath])
+        self.assertIsNot(cachedJob, cachedJob.job)
+        planConnection = PlanConnection(self.mediumSteps)
+        self.assertEqual(explainJob(planConnection, "medium", cachedJob, {}),
+                         explainJob(PlanConnection(self.mediumSteps), "medium", self.mediumJob, {}))
+
+
+class ExplainJobsTest(unittest.TestCase):
+
+    def testConnectionPerDatabase(self):
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            batchJobs = [BatchJob(name, fakeExportJob(command, ["-o", os.path.join(outputDirectory, name + ".xml")]))
+                         for name, command in [("medium", MuziekMediumXml()), ("titel", BoekenTitelXml()),
+                                               ("medium2", MuziekMediumXml())]]
+        connections = []
+        connectorConfigs = []
+
+        def connect(**connectorConfig):
+            connectorConfigs.append(connectorConfig)
+            table = "medium" if connectorConfig["database"] == "muziek" else "titel"
+            connections.append(PlanConnection([stepOf(table, "ALL", rows=10, extra="Using where")]))
+            return connections[-1]
+
+        report = io.StringIO()
+        with mock.patch("mysql.connector.connect", connect), contextlib.redirect_stdout(report):
+            self.assertEqual(explainJobs(batchJobs, fakeDatabaseConfig()), 0)
+        self.assertEqual([connectorConfig["database"] for connectorConfig in connectorConfigs], ["muziek", "boeken"])
+        # EXPLAIN gives a note, which must not be raised as an error
+        self.assertEqual([connectorConfig["raise_on_warnings"] for connectorConfig in connectorConfigs],
+                         [False, False])
+        self.assertEqual([connection.closed for connection in connections], [True, True])
+        self.assertEqual(len(connections[0].queries()), 3)
+        self.assertEqual([line for line in report.getvalue().splitlines() if line.startswith("Job ")],
+                         ["Job medium (muziekMedium)", "Job titel (boekenTitel)", "Job medium2 (muziekMedium)"])
+
+    def testFailingConnection(self):
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            batchJobs = [BatchJob(name, fakeExportJob(MuziekMediumXml(),
+                                                      ["-o", os.path.join(outputDirectory, name + ".xml")]))
+                         for name in ["medium", "medium2"]]
+        report = io.StringIO()
+        with mock.patch("mysql.connector.connect", side_effect=mysql.connector.Error("Connection refused")), \
+                contextlib.redirect_stdout(report):
+            self.assertEqual(explainJobs(batchJobs, fakeDatabaseConfig()), 2)
+        self.assertIn("Explain of medium failed\nMySQL error: Connection refused", report.getvalue())
+        self.assertIn("Explain of medium2 failed", report.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
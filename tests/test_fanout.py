@@ -0,0 +1,125 @@
+"""test_fanout.py: Test the exports of the same table run with a single query, each row written to the outputs of the
+exports which select it
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import filecmp
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+from exportEngine import fanout
+from exportEngine.batch import BatchJob, fanOutJobs
+from exportEngine.commands import MuziekMediumCsv, MuziekMediumXml, MuziekOpnameCsv
+from exportEngine.fanout import FanOutExportJob, SortedRuns
+from tests.fakeMysql import FakeTable, fakeExportJob
+
+
+def mediumOf(mediumId, titel, genreId, subgenreId, mediumStatusId, opslag):
+    return {"medium.medium_id": mediumId, "medium.medium_titel": titel, "medium.genre_id": genreId,
+            "genre.genre": {1: "Klassiek", 2: "Jazz", 3: "Pop"}.get(genreId), "medium.subgenre_id": subgenreId,
+            "subgenre.subgenre": None if subgenreId is None else "subgenre " + str(subgenreId),
+            "medium.medium_status_id": mediumStatusId, "medium_status.medium_status": "status " + str(mediumStatusId),
+            "opslag.opslag": opslag, "label.label": "label " + str(mediumId % 3), "medium.label_nummer": str(mediumId)}
+
+
+class FanOutTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        # The classical media, the other media, and the media which are not sold or lost, in other orders
+        self.mediumTable = FakeTable(
+            [mediumOf(1, "Goldberg variaties", 1, 2, 2, "Kast"),
+             mediumOf(2, "Kind of blue", 2, 5, 9, "Zolder"),
+             mediumOf(3, "abbey road", 3, None, 2, "kast"),
+             mediumOf(4, "Requiem", 1, 1, 1, None),
+             mediumOf(5, "Blue train", 2, 5, 2, "Zolder"),
+             mediumOf(6, "Requiem", 1, 1, 2, "Kast"),
+             mediumOf(7, "Zwanenmeer", 1, 3, 3, "Zolder"),
+             mediumOf(8, "A love supreme", 2, 6, 2, "Kast")],
+            "medium.medium_id",
+            conditions={"medium.genre_id = 1": lambda medium: medium["medium.genre_id"] == 1,
+                        "medium.genre_id != 1": lambda medium: medium["medium.genre_id"] != 1,
+                        "medium.medium_status_id NOT IN (%s, %s)":
+                            lambda medium: medium["medium.medium_status_id"] not in (1, 9)})
+
+    def outputPath(self, outputName):
+        return os.path.join(self.outputDirectory, outputName)
+
+    def runFanOut(self):
+        """Run the exports of the media with a single query, and return the connection"""
+        job = fakeExportJob(MuziekMediumCsv(), [
+            "-o", self.outputPath("classical.csv"),
+            "--fanOut", "exportMuziekMediumCsv -g rest -o " + self.outputPath("rest.csv"),
+            "--fanOut", "exportMuziekMediumXml.py -o " + self.outputPath("medium.xml")])
+        self.assertIsInstance(job, FanOutExportJob)
+        mysqlConnection = self.mediumTable.connect()
+        job.run(mysqlConnection)
+        return mysqlConnection
+
+    def assertSameAsSeparateExports(self):
+        """Assert that the outputs of the fan-out are identical to the outputs of the exports run one by one"""
+        for command, arguments, outputName in [(MuziekMediumCsv(), [], "classical.csv"),
+                                               (MuziekMediumCsv(), ["-g", "rest"], "rest.csv"),
+                                               (MuziekMediumXml(), [], "medium.xml")]:
+            with self.subTest(outputName=outputName):
+                fakeExportJob(command, arguments + ["-o", self.outputPath("separate." + outputName)]).run(
+                    self.mediumTable.connect())
+                self.assertTrue(filecmp.cmp(self.outputPath(outputName), self.outputPath("separate." + outputName),
+                                            shallow=False))
+
+    def testOutputsAreIdenticalToSeparateExports(self):
+        mysqlConnection = self.runFanOut()
+        self.assertEqual(len([event for event in mysqlConnection.events if event[0] == "execute"]), 1)
+        self.assertSameAsSeparateExports()
+        with open(self.outputPath("classical.csv"), encoding="iso-8859-1") as outputFile:
+            self.assertEqual(len(outputFile.readlines()), 1 + 4)
+
+    def testSpilledSortedRuns(self):
+        # The rows of the XML export, in another order than the query, are sorted in runs in temporary files
+        with mock.patch.object(fanout, "sortRunSize", 2):
+            self.runFanOut()
+        self.assertSameAsSeparateExports()
+
+    def testSortedRunsKeepOrderOfEqualKeys(self):
+        with mock.patch.object(fanout, "sortRunSize", 3):
+            sortedRuns = SortedRuns()
+            for rowNumber, sortKey in enumerate([5, 1, 3, 1, 5, 2, 1, 4, 3, 1]):
+                sortedRuns.add((sortKey,), (sortKey, rowNumber))
+            self.assertEqual(len(sortedRuns.runFiles), 3)
+            self.assertEqual(list(sortedRuns.sortedRows()),
+                             [(1, 1), (1, 3), (1, 6), (1, 9), (2, 5), (3, 2), (3, 8), (4, 7), (5, 0), (5, 4)])
+
+    def testExportsWhichCannotFanOut(self):
+        for arguments, message in [
+                (["--fanOut", "exportMuziekOpnameCsv -o opname.csv"], "Fan-out needs exports of the same table"),
+                (["--fanOut", "exportMuziekMediumXml -o medium.xml --delta"],
+                 "Fan-out needs exports of the same table"),
+                (["--fanOut", "exportMuziekMediumXml"], "Fan-out needs an output path for each export"),
+                (["--fanOut", "exportMedium -o medium.xml"], "Fan-out has an unknown script: exportMedium")]:
+            with self.subTest(arguments=arguments):
+                report = io.StringIO()
+                with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+                    fakeExportJob(MuziekMediumCsv(), ["-o", "medium.csv"] + arguments)
+                self.assertIn(message, report.getvalue())
+
+    def testJobsOfSameTableAreCombined(self):
+        batchJobs = fanOutJobs([
+            BatchJob("classical", fakeExportJob(MuziekMediumCsv(), ["-o", self.outputPath("classical.csv")])),
+            BatchJob("opname", fakeExportJob(MuziekOpnameCsv(), ["-o", self.outputPath("opname.csv")])),
+            BatchJob("rest", fakeExportJob(MuziekMediumCsv(), ["-g", "rest", "-o", self.outputPath("rest.csv")])),
+            BatchJob("medium", fakeExportJob(MuziekMediumXml(), ["-o", self.outputPath("medium.xml")]))])
+        self.assertEqual([batchJob.name for batchJob in batchJobs], ["classical+rest+medium", "opname"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            batchJobs[0].exportJob.run(self.mediumTable.connect())
+        self.assertSameAsSeparateExports()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""test_fetch.py: Test the fetch modes and batch sizes of an export, and the fetch strategy of the configuration"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import filecmp
+import tempfile
+import unittest
+import contextlib
+from exportEngine.commands import MuziekMediumCsv, MuziekMediumXml, createParser, createExportJob
+from exportEngine.executor import runExport
+from exportEngine.fetch import BUFFERED, STREAM, FetchStatistics, FetchStrategy, getFetchStrategy
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeDatabaseConfig, fakeExportJob, \
+    fakeRowsOf
+
+
+class FetchModeTest(unittest.TestCase):
+
+    def runFilteredExport(self, fetchMode):
+        """Run an export with a filter and the fetch mode, on a fake connection with 5 rows fetched in batches of 2"""
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            command = MuziekMediumXml()
+            args = createParser(command).parse_args(["--filter", "medium.genre_id = 1", "--fetch", fetchMode,
+                                                     "--fetchBatchSize", "2",
+                                                     "-o", os.path.join(outputDirectory, "medium.xml")])
+            job = createExportJob(command, args, fakeDatabaseConfig())
+            self.assertTrue(job.queryParameters)
+            mysqlConnection = FakeConnection([[None] * len(job.columns)] * 5)
+            statistics = runExport(mysqlConnection, job)
+        self.assertEqual(statistics.rowCount, 5)
+        return [event[:2] for event in mysqlConnection.events]
+
+    def testBufferedFetchWithFilters(self):
+        # All rows are fetched when the prepared statement is executed, before the batches are written
+        self.assertEqual(self.runFilteredExport("buffered")[:2], [("execute", "prepared"), ("fetchall", "prepared")])
+
+    def testStreamedFetchWithFilters(self):
+        events = self.runFilteredExport("stream")
+        self.assertEqual(events[0], ("execute", "prepared"))
+        self.assertNotIn(("fetchall", "prepared"), events)
+        self.assertEqual(events.count(("fetchmany", "prepared")), 4)
+
+
+class FetchBatchesTest(unittest.TestCase):
+
+    def testOutputOfFetchModesAndBatchSizesIsIdenticalToBaseline(self):
+        for fetchMode in [STREAM, BUFFERED]:
+            for fetchBatchSize in ["1", "4", "1000"]:
+                with self.subTest(fetchMode=fetchMode, fetchBatchSize=fetchBatchSize), \
+                        tempfile.TemporaryDirectory() as outputDirectory:
+                    outputPath = os.path.join(outputDirectory, "medium.csv")
+                    job = fakeExportJob(MuziekMediumCsv(), ["-g", "rest", "--fetch", fetchMode,
+                                                            "--fetchBatchSize", fetchBatchSize, "-o", outputPath])
+                    mysqlConnection = FakeConnection(fakeRowsOf(baselineRowCount))
+                    statistics = runExport(mysqlConnection, job)
+                    self.assertTrue(filecmp.cmp(outputPath, baselinePath("muziekMediumRest.csv"), shallow=False))
+                # A query without parameters has a buffered cursor, or an unbuffered cursor to stream the rows
+                self.assertEqual(mysqlConnection.events[0][:2],
+                                 ("execute", "buffered" if fetchMode == BUFFERED else "unbuffered"))
+                batchCount = -(-baselineRowCount // int(fetchBatchSize))
+                self.assertEqual((statistics.rowCount, statistics.batchCount, len(statistics.batchFetchTimes)),
+                                 (baselineRowCount, batchCount, batchCount))
+
+    def testReport(self):
+        statistics = FetchStatistics(FetchStrategy(STREAM, 500, pipelined=True))
+        statistics.rowCount = 1200
+        statistics.batchCount = 3
+        statistics.totalTime = 2.0
+        self.assertTrue(statistics.report().startswith(
+            "Fetched 1200 rows in 3 batches (stream, batch size 500, pipelined): execute 0.000 s, fetch 0.000 s, " +
+            "format and write 2.000 s, total 2.000 s, 600 rows/s"))
+
+
+class FetchStrategyTest(unittest.TestCase):
+
+    def fetchStrategyOf(self, arguments, configText=""):
+        """Get the fetch strategy of the arguments of the medium export, and the fake database configuration with
+        the configuration text
+        """
+        databaseConfig = fakeDatabaseConfig()
+        databaseConfig.read_string(configText)
+        args = createParser(MuziekMediumXml()).parse_args(arguments)
+        fetchStrategy = getFetchStrategy(args, databaseConfig, MuziekMediumXml.script)
+        return fetchStrategy.mode, fetchStrategy.batchSize, fetchStrategy.pipelined
+
+    def testDefault(self):
+        self.assertEqual(self.fetchStrategyOf([]), (STREAM, 1000, False))
+
+    def testArgumentsBeforeSectionOfScriptBeforeSectionGeneral(self):
+        configText = "[general]\nfetch = buffered\nfetch_batch_size = 200\npipeline = yes\n" + \
+                     "[exportMuziekMediumXml]\nfetch_batch_size = 50\n"
+        self.assertEqual(self.fetchStrategyOf([], configText), (BUFFERED, 50, True))
+        self.assertEqual(self.fetchStrategyOf(["--fetch", "stream", "--fetchBatchSize", "10"], configText),
+                         (STREAM, 10, True))
+
+    def testInvalidConfiguration(self):
+        for configText in ["[general]\nfetch = all\n", "[general]\nfetch_batch_size = -1\n"]:
+            with self.subTest(configText=configText), contextlib.redirect_stdout(io.StringIO()), \
+                    self.assertRaises(SystemExit):
+                self.fetchStrategyOf([], configText)
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            createParser(MuziekMediumXml()).parse_args(["--fetchBatchSize", "many"])
+
+
+if __name__ == "__main__":
+    unittest.main()
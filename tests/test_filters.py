@@ -0,0 +1,192 @@
+"""test_filters.py: Test the SQL of the structured filters and of the filters in SQL"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import datetime
+import argparse
+import tempfile
+import unittest
+import contextlib
+from exportEngine import exports
+from exportEngine.commands import FinancienRubriekCsv, MuziekMediumXml, MuziekOpnameXml, mediumStatusFilters, \
+    createParser, createExportJob
+from exportEngine.executor import runExport
+from exportEngine.filters import Filter, filtersSqlText, filterClauseOf, operatorValueCounts, parseFilter, \
+    sqlFilterClauseOf
+from tests.fakeMysql import FakeConnection, fakeDatabaseConfig, fakeExportJob
+
+
+class FilterSqlTextTest(unittest.TestCase):
+
+    def testDefaultStatusFilterIsSql(self):
+        self.assertEqual(filtersSqlText(exports.muziekMedium, mediumStatusFilters),
+                         "medium.medium_status_id NOT IN (1, 9)")
+
+    def testTextValuesAreQuoted(self):
+        self.assertEqual(Filter("medium.medium_titel", "like", ["Bach's%"]).sqlText(exports.muziekMedium),
+                         "medium.medium_titel LIKE 'Bach''s%'")
+
+
+class FilterFieldTest(unittest.TestCase):
+
+    def testColumnAndTableColumn(self):
+        self.assertEqual(Filter("jaar", "=", [2020]).sql(exports.financienRubriek),
+                         ("year(rekening_mutatie.datum) = %s", [2020]))
+        self.assertEqual(Filter("medium.genre_id", "in", [1, 2]).sql(exports.muziekMedium),
+                         ("medium.genre_id IN (%s, %s)", [1, 2]))
+
+    def testUnknownField(self):
+        with self.assertRaisesRegex(ValueError, "unknown filter field"):
+            Filter("persoon.persoon", "=", ["Bach"]).sql(exports.muziekMedium)
+
+    def testAggregateColumnIsRejected(self):
+        with self.assertRaisesRegex(ValueError, "unknown filter field mutatie_in"):
+            Filter("mutatie_in", ">", [0]).sql(exports.financienRubriek)
+
+
+class FilterOperatorTest(unittest.TestCase):
+
+    def testClauseOfEachOperator(self):
+        operatorClauses = {
+            "=": ("medium.genre_id = %s", [1]),
+            "!=": ("medium.genre_id != %s", [1]),
+            "<": ("medium.genre_id < %s", [1]),
+            "<=": ("medium.genre_id <= %s", [1]),
+            ">": ("medium.genre_id > %s", [1]),
+            ">=": ("medium.genre_id >= %s", [1]),
+            "like": ("medium.genre_id LIKE %s", [1]),
+            "notlike": ("medium.genre_id NOT LIKE %s", [1]),
+            "in": ("medium.genre_id IN (%s, %s, %s)", [1, 2, 3]),
+            "notin": ("medium.genre_id NOT IN (%s)", [1]),
+            "between": ("medium.genre_id BETWEEN %s AND %s", [1, 2]),
+            "null": ("medium.genre_id IS NULL", []),
+            "notnull": ("medium.genre_id IS NOT NULL", [])}
+        self.assertEqual(sorted(operatorClauses), sorted(operatorValueCounts))
+        for operator, (clause, values) in operatorClauses.items():
+            with self.subTest(operator=operator):
+                self.assertEqual(Filter("medium.genre_id", operator.upper(), values).sql(exports.muziekMedium),
+                                 (clause, values))
+                # The SQL text has no placeholder left
+                self.assertEqual(Filter("medium.genre_id", operator, values).sqlText(exports.muziekMedium).count("%s"),
+                                 0)
+
+
+class ParseFilterTest(unittest.TestCase):
+
+    def assertFilter(self, filterArgument, field, operator, values):
+        exportFilter = parseFilter(filterArgument)
+        self.assertEqual((exportFilter.field, exportFilter.operator, exportFilter.values), (field, operator, values))
+
+    def testValidFilters(self):
+        self.assertFilter("medium.medium_status_id notin 1,9", "medium.medium_status_id", "notin", [1, 9])
+        self.assertFilter("  boek.status_id!=10 ", "boek.status_id", "!=", [10])
+        self.assertFilter("jaar BETWEEN 2016, 2020", "jaar", "between", [2016, 2020])
+        self.assertFilter("medium.medium_titel like 'Bach%'", "medium.medium_titel", "like", ["Bach%"])
+        self.assertFilter('medium.medium_titel = "12"', "medium.medium_titel", "=", ["12"])
+        self.assertFilter("medium.label_nummer in -1, x", "medium.label_nummer", "in", [-1, "x"])
+        self.assertFilter("medium.opslag_id null", "medium.opslag_id", "null", [])
+
+    def testInvalidFilters(self):
+        for filterArgument, message in [("medium.medium_titel", "invalid filter"),
+                                        ("medium.medium_titel ~ Bach", "invalid filter"),
+                                        ("1medium = 1", "invalid filter"),
+                                        ("medium.genre_id = ", "invalid number of values of operator ="),
+                                        ("medium.genre_id = 1,2", "invalid number of values of operator ="),
+                                        ("medium.genre_id in", "invalid number of values of operator in"),
+                                        ("jaar between 2016", "invalid number of values of operator between"),
+                                        ("medium.opslag_id notnull 1", "invalid number of values of operator notnull")]:
+            with self.subTest(filterArgument=filterArgument):
+                with self.assertRaisesRegex(argparse.ArgumentTypeError, message):
+                    parseFilter(filterArgument)
+
+
+class SqlFilterTest(unittest.TestCase):
+
+    def testLiteralsAreParameters(self):
+        self.assertEqual(sqlFilterClauseOf("genre.genre like '%soul%'"), ("genre.genre like %s", ["%soul%"]))
+        self.assertEqual(sqlFilterClauseOf("a = 'it''s' or b = \"x\\\"y\" or c like 'a\\%b'"),
+                         ("a = %s or b = %s or c like %s", ["it's", "x\"y", "a\\%b"]))
+
+    def testModuloOperatorIsNoPlaceholder(self):
+        self.assertEqual(sqlFilterClauseOf("medium.medium_id % 2 = 0"), ("medium.medium_id  MOD  2 = 0", []))
+
+    def testParametersInOrderOfClauses(self):
+        self.assertEqual(filterClauseOf(exports.muziekMedium, mediumStatusFilters, "genre.genre like '%soul%'"),
+                         ("(medium.medium_status_id NOT IN (%s, %s)) AND (genre.genre like %s)", (1, 9, "%soul%")))
+
+
+class SqlFilterQueryTest(unittest.TestCase):
+
+    def createJob(self, command, arguments, outputDirectory):
+        args = createParser(command).parse_args(arguments + ["-o", os.path.join(outputDirectory, "export.xml")])
+        return createExportJob(command, args, fakeDatabaseConfig())
+
+    def testPercentSInLikeLiteral(self):
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            job = self.createJob(MuziekMediumXml(), ["-g", "genre.genre like '%soul%'"], outputDirectory)
+            self.assertNotIn("soul", job.query)
+            self.assertEqual(job.query.count("%"), len(job.queryParameters))
+            self.assertEqual(job.queryParameters[-1], "%soul%")
+            mysqlConnection = FakeConnection()
+            runExport(mysqlConnection, job)
+        self.assertEqual(mysqlConnection.events[0], ("execute", "prepared", job.query, job.queryParameters))
+
+    def testPercentSInLikeLiteralOfPartitions(self):
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            job = self.createJob(MuziekOpnameXml(), ["-g", "genre.genre like '%soul%'", "--partitions", "2"],
+                                 outputDirectory)
+        # The partition query has the key range as two more parameters
+        self.assertEqual(job.partitionQuery().count("%"), len(job.queryParameters) + 2)
+
+
+class FilterArgumentQueryTest(unittest.TestCase):
+
+    def testFiltersAreParameters(self):
+        job = fakeExportJob(MuziekMediumXml(), ["--filter", "medium.medium_titel like Bach%",
+                                                "--filter", "medium.genre_id in 1,2"])
+        self.assertIn(" WHERE (medium.medium_status_id NOT IN (%s, %s)) AND (medium.medium_titel LIKE %s) AND " +
+                      "(medium.genre_id IN (%s, %s)) ", job.query)
+        self.assertNotIn("Bach", job.query)
+        self.assertEqual(job.queryParameters, (1, 9, "Bach%", 1, 2))
+
+        # The query is the same for other values, so that the prepared statement can be reused
+        otherJob = fakeExportJob(MuziekMediumXml(), ["--filter", "medium.medium_titel like Mozart%",
+                                                     "--filter", "medium.genre_id in 3,4"])
+        self.assertEqual(otherJob.query, job.query)
+        self.assertEqual(otherJob.queryParameters, (1, 9, "Mozart%", 3, 4))
+
+        # The query is executed as a prepared statement with the parameters
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            job = fakeExportJob(MuziekMediumXml(), ["--filter", "medium.genre_id = 2",
+                                                    "-o", os.path.join(outputDirectory, "medium.xml")])
+            mysqlConnection = FakeConnection()
+            runExport(mysqlConnection, job)
+        self.assertEqual(mysqlConnection.events[0], ("execute", "prepared", job.query, (1, 9, 2)))
+
+    def testStatusFilterInSqlReplacesDefault(self):
+        job = fakeExportJob(MuziekMediumXml(), ["-s", "medium.medium_status_id = 2", "--filter", "medium.genre_id = 1"])
+        self.assertIn(" WHERE (medium.genre_id = %s) AND (medium.medium_status_id = 2) ", job.query)
+        self.assertEqual(job.queryParameters, (1,))
+
+    def testFinancienYearsAndRekeningenAreParameters(self):
+        job = fakeExportJob(FinancienRubriekCsv(), ["-y", "2019-2020"])
+        self.assertIn(" WHERE (rubriek.rubriek NOT LIKE %s) AND (rekening_mutatie.rekening_id IN (%s, %s)) AND " +
+                      "(rekening_mutatie.datum BETWEEN %s AND %s) ", job.query)
+        self.assertNotIn("2019", job.query)
+        self.assertNotIn("TRANSFER", job.query)
+        self.assertEqual(job.queryParameters, ("TRANSFER:%", 1, 39, datetime.date(2019, 1, 1),
+                                               datetime.date(2020, 12, 31)))
+        self.assertEqual(fakeExportJob(FinancienRubriekCsv(), ["-y", "2016"]).query, job.query)
+
+    def testUnknownFilterField(self):
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+            fakeExportJob(MuziekMediumXml(), ["--filter", "persoon.persoon = Bach"])
+        self.assertIn("Filter error: unknown filter field persoon.persoon", report.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
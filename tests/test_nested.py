@@ -0,0 +1,143 @@
+"""test_nested.py: Test the nested export with a row per titel or opname and the persons as a list, and the session
+of a nested export, of which the lists are concatenated by GROUP_CONCAT
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import csv
+import asyncio
+import tempfile
+import unittest
+import collections
+import xml.etree.ElementTree as ElementTree
+from unittest import mock
+from exportEngine import asyncExport
+from exportEngine.commands import BoekenTitelCsv, BoekenTitelXml, MuziekOpnameCsv, createParser, createExportJob
+from exportEngine.definitions import LIST, listSeparator
+from exportEngine.executor import runExport, groupConcatMaxLenStatement
+from tests.fakeMysql import FakeAsyncConnection, FakeConnection, FakeTable, fakeAiomysql, fakeDatabaseConfig, \
+    fakeExportJob
+
+# The titels with their authors: with several authors, with a single author, and without authors
+titelAuteurs = [(1, "Samenwerking", ["Reve", 'Bach "de Oude"', "hermans & zn"]),
+                (2, "Het stenen bruidsbed", ["Mulisch"]),
+                (3, "Anoniem", [])]
+
+
+def titelOf(titelId, titel):
+    return {"titel.titel_id": titelId, "titel.titel": titel, "auteurs.auteurs": "auteurs " + str(titelId),
+            "titel.jaar": 1950 + titelId, "type.type": "Roman", "boek.boek": "boek " + str(titelId),
+            "status.status": "Aanwezig"}
+
+
+class NestedListTest(unittest.TestCase):
+    """Compare the nested export with the export of a row per person of the same titels"""
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.flatTable = FakeTable([dict(titelOf(titelId, titel), **{"persoon.persoon": persoon})
+                                    for titelId, titel, persons in titelAuteurs for persoon in persons or [None]],
+                                   "titel.titel_id")
+        listExpression = BoekenTitelXml.definition.nestedDefinition().listExpressions["persoon.persoon"]
+        self.nestedTable = FakeTable([dict(titelOf(titelId, titel), **{
+            listExpression: listSeparator.join(sorted(persons, key=str.casefold)) or None})
+            for titelId, titel, persons in titelAuteurs], "titel.titel_id")
+
+    def runExports(self, command, outputName):
+        """Run the export with a row per person and the nested export, and return their output paths"""
+        outputPaths = []
+        for arguments, table in [([], self.flatTable), (["--nested"], self.nestedTable)]:
+            outputPaths.append(os.path.join(self.outputDirectory, "".join(arguments) + outputName))
+            job = fakeExportJob(command, arguments + ["-o", outputPaths[-1]])
+            runExport(table.connect(), job)
+        return outputPaths
+
+    def testQueryHasRowPerTitel(self):
+        definition = BoekenTitelXml.definition.nestedDefinition()
+        self.assertEqual(definition.columns["persoon"].kind, LIST)
+        job = fakeExportJob(BoekenTitelXml(), ["--nested"])
+        fromClause = job.query[job.query.index(" FROM titel "):]
+        self.assertNotIn("LEFT JOIN auteurs_persoon", fromClause)
+        self.assertIn("(SELECT GROUP_CONCAT(persoon.persoon ORDER BY persoon.persoon SEPARATOR '" + listSeparator +
+                      "') FROM auteurs_persoon LEFT JOIN persoon", job.query)
+
+    def testElementPerPersonInXml(self):
+        flatPath, nestedPath = self.runExports(BoekenTitelXml(), "titel.xml")
+        flatRows = ElementTree.parse(flatPath).getroot().findall("titel/row")
+        nestedRows = ElementTree.parse(nestedPath).getroot().findall("titel/row")
+        self.assertEqual((len(flatRows), len(nestedRows)), (5, 3))
+
+        # The persons of the rows of a titel are the elements of the nested row, with the same other elements
+        flatTitels = collections.defaultdict(list)
+        for row in flatRows:
+            flatTitels[tuple([(element.tag, element.text) for element in row if element.tag != "persoon"])].append(
+                row.find("persoon").text)
+        nestedTitels = {tuple([(element.tag, element.text) for element in row if element.tag != "persoon"]):
+                        [element.text for element in row.findall("persoon")] for row in nestedRows}
+        self.assertEqual(nestedTitels, dict(flatTitels))
+        # The titel without persons, first in the order of the lists, has an empty element
+        self.assertEqual([element.text for element in nestedRows[0].findall("persoon")], [None])
+        with open(nestedPath, encoding="utf8") as nestedFile:
+            self.assertIn("<persoon>Bach \"de Oude\"</persoon><persoon>hermans &amp; zn</persoon>" +
+                          "<persoon>Reve</persoon>", nestedFile.read())
+
+    def testSeparatedPersonsInCsv(self):
+        flatPath, nestedPath = self.runExports(BoekenTitelCsv(), "titel.csv")
+        with open(flatPath, encoding="iso-8859-1", newline="") as flatFile, \
+                open(nestedPath, encoding="iso-8859-1", newline="") as nestedFile:
+            flatRows = list(csv.DictReader(flatFile))
+            nestedRows = list(csv.DictReader(nestedFile))
+        self.assertEqual((len(flatRows), len(nestedRows)), (5, 3))
+        flatAuteurs = collections.defaultdict(list)
+        for row in flatRows:
+            if row["Auteur"]:
+                flatAuteurs[row["Titel"]].append(row["Auteur"])
+        self.assertEqual({row["Titel"]: row["Auteur"] for row in nestedRows},
+                         {titel: "; ".join(flatAuteurs[titel]) for _, titel, _ in titelAuteurs})
+        self.assertEqual(nestedRows[1]["Auteur"], 'Bach "de Oude"; hermans & zn; Reve')
+
+
+class NestedSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputPath = os.path.join(outputDirectory.name, "opname.csv")
+
+    def createJob(self, arguments):
+        command = MuziekOpnameCsv()
+        args = createParser(command).parse_args(arguments + ["-g", "rest", "-o", self.outputPath])
+        return createExportJob(command, args, fakeDatabaseConfig())
+
+    @staticmethod
+    def executedQueries(mysqlConnection):
+        return [event[2] for event in mysqlConnection.events if event[0] == "execute"]
+
+    def testNestedExportRaisesGroupConcatMaxLen(self):
+        job = self.createJob(["--nested"])
+        mysqlConnection = FakeConnection([[None] * len(job.columns)] * 3)
+        runExport(mysqlConnection, job)
+        queries = self.executedQueries(mysqlConnection)
+        self.assertEqual(queries, [groupConcatMaxLenStatement, job.query])
+        self.assertIn("GROUP_CONCAT", job.query.upper())
+
+    def testExportWithoutListsKeepsSession(self):
+        job = self.createJob([])
+        mysqlConnection = FakeConnection([[None] * len(job.columns)] * 3)
+        runExport(mysqlConnection, job)
+        self.assertEqual(self.executedQueries(mysqlConnection), [job.query])
+
+    def testNestedExportOnEventLoopRaisesGroupConcatMaxLen(self):
+        job = self.createJob(["--nested"])
+        mysqlConnection = FakeConnection([[None] * len(job.columns)] * 3)
+        with mock.patch.object(asyncExport, "aiomysql", fakeAiomysql()):
+            asyncio.run(asyncExport.runExportAsync(FakeAsyncConnection(mysqlConnection), job))
+        self.assertEqual(self.executedQueries(mysqlConnection)[0], groupConcatMaxLenStatement)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""test_partition.py: Test the merge of the partitions of a partitioned export, and the outputs of a partitioned
+export of which a partition fails
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import filecmp
+import tempfile
+import unittest
+from unittest import mock
+from exportEngine.commands import MuziekOpnameCsv, createParser, createExportJob
+from exportEngine.commands import MuziekOpnameXml
+from tests.fakeMysql import FakeConnection, FakeTable, fakeDatabaseConfig, fakeExportJob
+
+
+def opnameOf(opnameId, persoon, opusTitel, musici, mediumStatusId=2):
+    return {"opname.opname_id": opnameId, "persoon.persoon": persoon, "opus.opus_titel": opusTitel,
+            "musici.musici": musici, "medium.medium_status_id": mediumStatusId,
+            "medium.medium_titel": "medium " + str(opnameId), "genre.genre": "klassiek"}
+
+
+class PartitionMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        # The recordings of the componists, in the order of the primary key: the rows of a partition are spread over
+        # the output, some rows are equal on the ORDER BY, and text is ordered on the collation and not on the bytes
+        self.opnameTable = FakeTable([
+            opnameOf(1, "Bach", "Goldberg variaties", "Gould"),
+            opnameOf(2, "bach", "Goldberg variaties", "Gould"),
+            opnameOf(3, "Brahms", "Requiem", None),
+            opnameOf(4, None, "Anoniem", "Hilliard"),
+            opnameOf(5, "Bach", "Matthäus Passion", "Herreweghe"),
+            opnameOf(6, "Mahler", "Symfonie 2", "Abbado", mediumStatusId=9),
+            opnameOf(7, "Bach", "Goldberg variaties", "Gould"),
+            opnameOf(8, "Mozart", "Requiem", "Böhm"),
+            opnameOf(9, "Bach", "goldberg variaties", "gould"),
+            opnameOf(10, "Brahms", "Requiem", ""),
+            opnameOf(11, "Ávila", "Motetten", None),
+            opnameOf(12, "Bach", "Goldberg variaties", "Gould", mediumStatusId=1)],
+            "opname.opname_id", inFilter=lambda opname: opname["medium.medium_status_id"] not in (1, 9))
+
+    def runExport(self, outputName, arguments):
+        """Run the export of the recordings on connections of the table, and return the export job"""
+        job = fakeExportJob(MuziekOpnameXml(), arguments + ["-o", os.path.join(self.outputDirectory, outputName)])
+        with mock.patch("mysql.connector.connect", self.opnameTable.connect):
+            job.run(self.opnameTable.connect())
+        return job
+
+    def testMergedPartitionsAreIdenticalToExport(self):
+        job = self.runExport("opname.xml", [])
+        for partitions in ["2", "3", "5", "12"]:
+            with self.subTest(partitions=partitions):
+                partitionedJob = self.runExport("opname" + partitions + ".xml", ["--partitions", partitions])
+                self.assertTrue(filecmp.cmp(partitionedJob.outputs[0].outputPath, job.outputs[0].outputPath,
+                                            shallow=False))
+
+    def testPartitionsFetchRangesOfKeys(self):
+        self.runExport("opname.xml", ["--partitions", "3"])
+        partitionParameters = sorted([event[3] for connection in self.opnameTable.connections[1:]
+                                      for event in connection.events if event[0] == "execute"])
+        self.assertEqual(partitionParameters, [(1, 9, 1, 4), (1, 9, 5, 8), (1, 9, 9, 12)])
+
+    def testEqualRowsAreOrderedOnPrimaryKey(self):
+        # Rows which are equal on the ORDER BY are in the order of the primary key, whatever the partition they are in
+        self.opnameTable.rows.reverse()
+        job = self.runExport("opname.xml", ["--partitions", "4"])
+        with open(job.outputs[0].outputPath, encoding="utf8") as outputFile:
+            output = outputFile.read()
+        mediumPositions = [output.index("<medium_titel>medium " + str(opnameId) + "<") for opnameId in [1, 2, 7, 9]]
+        self.assertEqual(mediumPositions, sorted(mediumPositions))
+
+
+class FailingPartitionTest(unittest.TestCase):
+
+    def runFailingPartitions(self, outputName):
+        """Run a partitioned export of which the partitions cannot connect, and return whether the output exists"""
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            outputPath = os.path.join(outputDirectory, outputName)
+            command = MuziekOpnameCsv()
+            args = createParser(command).parse_args(["--partitions", "2", "-o", outputPath])
+            job = createExportJob(command, args, fakeDatabaseConfig())
+            with mock.patch("mysql.connector.connect", side_effect=OSError("Connection refused")):
+                with self.assertRaisesRegex(OSError, "Connection refused"):
+                    # The connection of the job gets the range of the keys
+                    job.run(FakeConnection([(1, 100)]))
+            return os.path.exists(outputPath)
+
+    def testIncompleteOutputIsRemoved(self):
+        self.assertFalse(self.runFailingPartitions("opname.csv"))
+
+    def testIncompleteCompressedOutputIsRemoved(self):
+        self.assertFalse(self.runFailingPartitions("opname.csv.gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""test_pipeline.py: Test the export with fetching, formatting and writing running concurrently in a pipeline"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import time
+import types
+import filecmp
+import tempfile
+import threading
+import unittest
+import contextlib
+import mysql.connector
+from unittest import mock
+from exportEngine import pipeline
+from exportEngine.commands import BoekenBoekXml, BoekenTitelCsv, MuziekMediumXml, MuziekOpnameCsv, runCommand
+from exportEngine.executor import Output, runExport
+from exportEngine.fetch import FetchStrategy, FetchStatistics
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeDatabaseConfig, fakeExportJob, \
+    fakeRowsOf
+
+
+class PipelinedExportTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def testOutputIsIdenticalToBaseline(self):
+        for outputName, command, arguments in [
+                ("boekenBoek.xml", BoekenBoekXml(), []),
+                ("boekenTitel.csv", BoekenTitelCsv(), []),
+                ("muziekMedium.xml", MuziekMediumXml(), []),
+                ("muziekOpnameRest.csv", MuziekOpnameCsv(), ["-g", "rest"])]:
+            for batchSize in ["1", "4", "100"]:
+                with self.subTest(outputName=outputName, batchSize=batchSize):
+                    outputPath = os.path.join(self.outputDirectory, outputName)
+                    job = fakeExportJob(command, arguments + ["--pipeline", "--fetchBatchSize", batchSize,
+                                                              "-o", outputPath])
+                    statistics = runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+                    self.assertTrue(filecmp.cmp(outputPath, baselinePath(outputName), shallow=False))
+                    self.assertEqual(statistics.rowCount, baselineRowCount)
+                    self.assertGreater(statistics.writeTime, 0.0)
+
+    def testMysqlErrorIsReportedByScript(self):
+        configPath = os.path.join(self.outputDirectory, "database.ini")
+        with open(configPath, "w") as configFile:
+            fakeDatabaseConfig().write(configFile)
+        outputPath = os.path.join(self.outputDirectory, "medium.xml")
+        fetchError = mysql.connector.errors.OperationalError("Lost connection to MySQL server during query")
+        report = io.StringIO()
+        with mock.patch.object(mysql.connector, "connect",
+                               lambda **connectorConfig: FakeConnection(fakeRowsOf(3), fetchError)), \
+                contextlib.redirect_stdout(report), self.assertRaises(SystemExit) as exitContext:
+            runCommand(MuziekMediumXml(), ["--pipeline", "--fetchBatchSize", "2", "-o", outputPath,
+                                           "-c", configPath])
+        self.assertEqual(exitContext.exception.code, 1)
+        self.assertIn("MySQL error: Lost connection to MySQL server during query", report.getvalue())
+        self.assertFalse(os.path.exists(outputPath))
+
+    def testWriteErrorStopsFetch(self):
+        outputPath = os.path.join(self.outputDirectory, "medium.xml")
+        job = fakeExportJob(MuziekMediumXml(), ["--pipeline", "--fetchBatchSize", "1", "-o", outputPath])
+        write = Output.write
+
+        def failingWrite(output, text):
+            if "<row>" in text:
+                raise OSError("No space left on device")
+            write(output, text)
+
+        mysqlConnection = FakeConnection(fakeRowsOf(100))
+        with mock.patch.object(Output, "write", failingWrite), self.assertRaisesRegex(OSError, "No space left"):
+            runExport(mysqlConnection, job)
+        self.assertFalse(os.path.exists(outputPath))
+        # The fetch stopped before all rows were fetched, and the stages ended
+        self.assertLess(len([event for event in mysqlConnection.events if event[0] == "fetchmany"]), 100)
+        self.assertEqual([thread.name for thread in threading.enumerate() if thread.name in ("fetch", "write")], [])
+
+
+class BackpressureTest(unittest.TestCase):
+
+    def testFetchWaitsForFormat(self):
+        formatEvent = threading.Event()
+        fetchedBatches = []
+        writtenTexts = []
+
+        def batches():
+            for batchNumber in range(20):
+                fetchedBatches.append(batchNumber)
+                yield [(batchNumber,)]
+
+        def formatRows(rows):
+            formatEvent.wait()
+            return str(rows[0][0])
+
+        output = types.SimpleNamespace(writer=types.SimpleNamespace(formatRows=formatRows), write=writtenTexts.append)
+        job = types.SimpleNamespace(outputs=[output], resolveDimensions=lambda rows: rows)
+        pipelineThread = threading.Thread(target=pipeline.runPipeline,
+                                          args=(job, batches(), FetchStatistics(FetchStrategy())))
+        pipelineThread.start()
+        try:
+            # The fetch is ahead of the blocked format stage by at most the queue, a batch being formatted and a batch
+            # waiting to be put in the queue
+            for _ in range(50):
+                if len(fetchedBatches) == pipeline.pipelineQueueSize + 2:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.05)
+            self.assertEqual(len(fetchedBatches), pipeline.pipelineQueueSize + 2)
+        finally:
+            formatEvent.set()
+            pipelineThread.join()
+        self.assertEqual(writtenTexts, [str(batchNumber) for batchNumber in range(20)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""test_profiling.py: Test the JSON profile report of the phases of an export, and the cProfile dump"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import json
+import pstats
+import tempfile
+import unittest
+import contextlib
+import mysql.connector
+from unittest import mock
+from exportEngine.batch import readJobList
+from exportEngine.commands import MuziekMediumCsv, createParser, runCommand
+from exportEngine.profiling import batchFetchTimeReport, histogramLabels, profileEnvironmentVariable
+from tests.fakeMysql import FakeConnection, baselineRowCount, fakeDatabaseConfig, fakeRowsOf
+from tests.test_batch import runJobsOnFakePools
+
+
+class ProfileReportTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.configPath = os.path.join(self.outputDirectory, "database.ini")
+        with open(self.configPath, "w") as configFile:
+            fakeDatabaseConfig().write(configFile)
+        self.outputPath = os.path.join(self.outputDirectory, "medium.csv")
+
+    def runExport(self, arguments):
+        """Run the export script of the media on a fake connection, and return what it printed to stderr"""
+        errors = io.StringIO()
+        with mock.patch.object(mysql.connector, "connect",
+                               lambda **connectorConfig: FakeConnection(fakeRowsOf(baselineRowCount))), \
+                contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(errors):
+            runCommand(MuziekMediumCsv(), arguments + ["--fetchBatchSize", "4", "-o", self.outputPath,
+                                                       "-c", self.configPath])
+        return errors.getvalue()
+
+    def testReportOfPhases(self):
+        profilePath = os.path.join(self.outputDirectory, "profile.json")
+        self.runExport(["--profile", profilePath])
+        with open(profilePath, encoding="utf8") as profileFile:
+            report = json.load(profileFile)
+        self.assertEqual(report["export"], "exportMuziekMediumCsv")
+        self.assertEqual(report["outputs"], [self.outputPath])
+        self.assertEqual(report["fetch"], {"mode": "stream", "batchSize": 4, "pipelined": False})
+        self.assertEqual((report["rows"], report["batches"]), (baselineRowCount, 2))
+        self.assertEqual(report["bytesWritten"], os.path.getsize(self.outputPath))
+        self.assertFalse(report["resultCacheHit"])
+
+        # The phases add up to the total time
+        phases = report["phases"]
+        self.assertEqual(sorted(phases), ["connect", "execute", "fetch", "format", "other", "total", "write"])
+        for phase, phaseTime in phases.items():
+            self.assertGreaterEqual(phaseTime, 0.0, phase)
+        self.assertAlmostEqual(sum([phaseTime for phase, phaseTime in phases.items() if phase != "total"]),
+                               phases["total"])
+        self.assertEqual(report["batchFetchTime"]["count"], 2)
+        self.assertGreater(report["peakMemory"], 0)
+
+    def testReportToStderr(self):
+        report = json.loads(self.runExport(["--profile", "-"]))
+        self.assertEqual(report["rows"], baselineRowCount)
+
+    def testProfilePathOfEnvironment(self):
+        profilePath = os.path.join(self.outputDirectory, "environment.json")
+        with mock.patch.dict(os.environ, {profileEnvironmentVariable: profilePath}):
+            self.assertEqual(createParser(MuziekMediumCsv()).parse_args([]).profile, profilePath)
+            self.runExport([])
+        self.assertTrue(os.path.isfile(profilePath))
+
+    def testProfileStatsOfExport(self):
+        profileStatsPath = os.path.join(self.outputDirectory, "export.prof")
+        self.runExport(["--profileStats", profileStatsPath])
+        profiledFunctions = [functionName for _, _, functionName in pstats.Stats(profileStatsPath).stats]
+        self.assertIn("runExport", profiledFunctions)
+        self.assertIn("fetchBatches", profiledFunctions)
+
+    def testReportOfEachJob(self):
+        jobsPath = os.path.join(self.outputDirectory, "exportJobs.ini")
+        with open(jobsPath, "w") as jobsFile:
+            for jobName, script in [("medium", "exportMuziekMediumCsv"), ("opname", "exportMuziekOpnameCsv")]:
+                jobsFile.write("[{1}]\nscript = {2}\narguments = -o {0}/{1}.csv --profile {0}/p.json\n".format(
+                    self.outputDirectory, jobName, script))
+        with contextlib.redirect_stdout(io.StringIO()):
+            runJobsOnFakePools(readJobList(jobsPath, fakeDatabaseConfig()), rows=fakeRowsOf(baselineRowCount))
+        for jobName in ["medium", "opname"]:
+            with open(os.path.join(self.outputDirectory, "p." + jobName + ".json"), encoding="utf8") as profileFile:
+                report = json.load(profileFile)
+            self.assertEqual((report["export"], report["rows"]), (jobName, baselineRowCount))
+
+
+class BatchFetchTimeTest(unittest.TestCase):
+
+    def testDistribution(self):
+        batchFetchTimes = [0.0005, 0.003, 0.003, 0.004, 0.015, 0.03, 0.07, 0.15, 0.9, 7.0]
+        report = batchFetchTimeReport(list(reversed(batchFetchTimes)))
+        self.assertEqual((report["count"], report["min"], report["max"]), (10, 0.0005, 7.0))
+        self.assertAlmostEqual(report["mean"], sum(batchFetchTimes) / 10)
+        self.assertEqual((report["p50"], report["p90"], report["p99"]), (0.03, 7.0, 7.0))
+        self.assertEqual(list(report["histogram"]), histogramLabels)
+        self.assertEqual(report["histogram"]["<1ms"], 1)
+        self.assertEqual(report["histogram"]["<5ms"], 3)
+        self.assertEqual(report["histogram"][">=5s"], 1)
+        self.assertEqual(sum(report["histogram"].values()), 10)
+
+    def testNoBatches(self):
+        self.assertEqual(batchFetchTimeReport([]), {"count": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
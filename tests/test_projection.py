@@ -0,0 +1,106 @@
+"""test_projection.py: Test the export of the requested columns only, with only the joins needed for these columns"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import csv
+import tempfile
+import unittest
+import contextlib
+import xml.etree.ElementTree as ElementTree
+from exportEngine.commands import FinancienRubriekCsv, MuziekMediumCsv, MuziekMediumXml
+from exportEngine.executor import runExport
+from tests.fakeMysql import FakeTable, fakeExportJob
+from tests.test_fanout import mediumOf
+from tests.test_split import genreConditions
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.mediumTable = FakeTable([dict(mediumOf(mediumId, titel, genreId, 2, 2, opslag),
+                                           **{"medium.uitvoerenden": "uitvoerenden " + str(mediumId)})
+                                      for mediumId, titel, genreId, opslag in [(1, "Goldberg variaties", 1, "Kast"),
+                                                                               (2, "Kind of blue", 2, "Zolder"),
+                                                                               (3, "Requiem", 1, None),
+                                                                               (4, "Atlantis", 1, "Zolder")]],
+                                     "medium.medium_id", conditions=genreConditions)
+
+    def runExport(self, command, arguments, outputName):
+        """Run an export on the table of the media, and return the path of the output and the query"""
+        outputPath = os.path.join(self.outputDirectory, outputName)
+        job = fakeExportJob(command, arguments + ["-o", outputPath])
+        runExport(self.mediumTable.connect(), job)
+        return outputPath, job.query
+
+    @staticmethod
+    def csvRows(outputPath):
+        with open(outputPath, encoding="iso-8859-1", newline="") as outputFile:
+            reader = csv.reader(outputFile)
+            return next(reader), list(reader)
+
+    def testQueryOfLayout(self):
+        # The columns which are not in the layout of the genre are not selected, and their tables are not joined
+        query = fakeExportJob(MuziekMediumCsv(), []).query
+        self.assertIn("subgenre.subgenre", query)
+        for expression in ["genre.genre", "medium.opmerkingen", "LEFT JOIN genre "]:
+            self.assertNotIn(expression, query)
+        query = fakeExportJob(MuziekMediumCsv(), ["-g", "rest"]).query
+        self.assertIn("LEFT JOIN genre ", query)
+        self.assertNotIn("subgenre", query)
+
+    def testRequestedColumnsInOrderOfRequest(self):
+        fullPath, _ = self.runExport(MuziekMediumCsv(), [], "full.csv")
+        projectedPath, query = self.runExport(MuziekMediumCsv(), ["--columns", "opslag, medium_titel"],
+                                              "projected.csv")
+        self.assertEqual(query, "SELECT opslag.opslag, medium.medium_titel FROM medium " +
+                                "LEFT JOIN opslag ON opslag.opslag_id = medium.opslag_id " +
+                                "WHERE medium.genre_id = 1 ORDER BY medium.medium_titel")
+
+        # The projected rows are the fields of the rows of the full layout
+        fullHeaders, fullRows = self.csvRows(fullPath)
+        projectedHeaders, projectedRows = self.csvRows(projectedPath)
+        self.assertEqual(projectedHeaders, ["Opslag", "Medium Titel"])
+        fieldIndexes = [fullHeaders.index(header) for header in projectedHeaders]
+        self.assertEqual(projectedRows, [[row[fieldIndex] for fieldIndex in fieldIndexes] for row in fullRows])
+        self.assertEqual(len(projectedRows), 3)
+
+    def testColumnsOutsideLayoutAreSkipped(self):
+        # The genre is not in the layout of the classical genre, and the opmerkingen are not in the CSV layouts
+        projectedPath, query = self.runExport(MuziekMediumCsv(), ["--columns", "genre,medium_titel,opmerkingen"],
+                                              "projected.csv")
+        self.assertEqual(self.csvRows(projectedPath)[0], ["Medium Titel"])
+        self.assertNotIn("genre.genre", query)
+        self.assertNotIn("opmerkingen", query)
+
+    def testXmlElementsOfRequestedColumns(self):
+        projectedPath, query = self.runExport(MuziekMediumXml(), ["--columns", "medium_titel,opslag"], "medium.xml")
+        self.assertTrue(query.startswith("SELECT medium.medium_titel, opslag.opslag FROM medium "))
+        rows = ElementTree.parse(projectedPath).getroot().findall("medium/row")
+        self.assertEqual([[(element.tag, element.text) for element in row] for row in rows][:2],
+                         [[("medium_titel", "Requiem"), ("opslag", None)],
+                          [("medium_titel", "Goldberg variaties"), ("opslag", "Kast")]])
+
+    def testWrongColumns(self):
+        for command, arguments, message in [
+                (MuziekMediumCsv(), ["--columns", "medium_titel,labels"], "Unknown column(s) labels of"),
+                (MuziekMediumCsv(), ["--columns", "opmerkingen"], "None of the columns opmerkingen is in the layout"),
+                (FinancienRubriekCsv(), ["--columns", "rubriek"], "--columns needs a columnar format")]:
+            with self.subTest(arguments=arguments):
+                report = io.StringIO()
+                with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+                    fakeExportJob(command, arguments)
+                self.assertIn(message, report.getvalue())
+        report = io.StringIO()
+        with contextlib.redirect_stderr(report), self.assertRaises(SystemExit):
+            fakeExportJob(MuziekMediumCsv(), ["--columns", " , "])
+        self.assertIn("invalid list of columns", report.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""test_resultCache.py: Test the export skipped when its query and the checksums of its tables did not change, and
+the eviction of the least recently used exports from the result cache
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import types
+import filecmp
+import tempfile
+import unittest
+from unittest import mock
+from exportEngine import resultCache
+from exportEngine.commands import BoekenTitelXml, MuziekMediumXml
+from exportEngine.resultCache import ResultCache, CachedExportJob
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeExportJob, fakeRowsOf
+
+
+class CachedExportTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.outputPath = os.path.join(self.outputDirectory, "boekenTitel.xml")
+        resultCachesPatcher = mock.patch.dict(resultCache.resultCaches, clear=True)
+        resultCachesPatcher.start()
+        self.addCleanup(resultCachesPatcher.stop)
+        # The checksums of the tables which differ from the checksum 1
+        self.checksums = {}
+
+    def rowsOf(self, query):
+        if query.startswith("CHECKSUM TABLE "):
+            return [("boeken." + table, self.checksums.get(table, 1))
+                    for table in query[len("CHECKSUM TABLE "):].split(", ")]
+        return fakeRowsOf(baselineRowCount)(query)
+
+    def runExport(self, arguments=()):
+        """Run the export of the titels with the result cache, and return the statistics and the executed queries"""
+        job = fakeExportJob(BoekenTitelXml(), list(arguments) + [
+            "--resultCache", "--resultCachePath", os.path.join(self.outputDirectory, "cache"), "-o", self.outputPath])
+        self.assertIsInstance(job, CachedExportJob)
+        mysqlConnection = FakeConnection(self.rowsOf)
+        statistics = job.run(mysqlConnection)
+        return statistics, [event[2] for event in mysqlConnection.events if event[0] == "execute"]
+
+    def assertCacheHit(self, arguments=()):
+        statistics, queries = self.runExport(arguments)
+        self.assertTrue(statistics.resultCacheHit)
+        self.assertEqual([query.split()[:2] for query in queries], [["CHECKSUM", "TABLE"]])
+        self.assertEqual(statistics.rowCount, baselineRowCount)
+        self.assertTrue(filecmp.cmp(self.outputPath, baselinePath("boekenTitel.xml"), shallow=False))
+
+    def assertCacheMiss(self, arguments=()):
+        statistics, queries = self.runExport(arguments)
+        self.assertFalse(statistics.resultCacheHit)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(filecmp.cmp(self.outputPath, baselinePath("boekenTitel.xml"), shallow=False))
+
+    def testUnchangedExportIsSkipped(self):
+        self.assertCacheMiss()
+        self.assertCacheHit()
+        # The output file is the cached file
+        cachedPaths = [os.path.join(root, fileName)
+                       for root, _, fileNames in os.walk(os.path.join(self.outputDirectory, "cache"))
+                       for fileName in fileNames if fileName.endswith(".xml")]
+        self.assertEqual(len(cachedPaths), 1)
+        self.assertTrue(os.path.samefile(self.outputPath, cachedPaths[0]))
+
+        # A removed output file is restored
+        os.remove(self.outputPath)
+        self.assertCacheHit()
+
+    def testChangedTableIsExportedAgain(self):
+        self.assertCacheMiss()
+        self.checksums["persoon"] = 2
+        self.assertCacheMiss()
+        self.assertCacheHit()
+
+    def testArgumentsOfOutput(self):
+        self.assertCacheMiss()
+        # The fetch arguments do not change the output, a filter does
+        self.assertCacheHit(["--fetchBatchSize", "2", "--pipeline"])
+        self.assertCacheMiss(["--typeFilter", "type.type = 'Roman'"])
+        self.assertCacheMiss(["--statusFilter", "boek.status_id = 2"])
+        self.assertCacheHit()
+
+    def testChangedCachedFileIsNotRestored(self):
+        self.assertCacheMiss()
+        # Writing the output file through its hard link changes the cached file
+        with open(self.outputPath, "a") as outputFile:
+            outputFile.write("<!-- changed -->")
+        self.assertCacheMiss()
+        self.assertCacheHit()
+
+    def testTableWithoutChecksumIsNotCached(self):
+        self.checksums["type"] = None
+        self.assertCacheMiss()
+        self.assertCacheMiss()
+        self.assertFalse(os.path.exists(os.path.join(self.outputDirectory, "cache")))
+
+    def testJobsWithoutResultCache(self):
+        cacheArguments = ["--resultCache", "--resultCachePath", os.path.join(self.outputDirectory, "cache")]
+        self.assertNotIsInstance(fakeExportJob(BoekenTitelXml(), ["-o", self.outputPath]), CachedExportJob)
+        self.assertNotIsInstance(fakeExportJob(BoekenTitelXml(), cacheArguments), CachedExportJob)
+        self.assertNotIsInstance(fakeExportJob(MuziekMediumXml(), cacheArguments + [
+            "--delta", "--statePath", os.path.join(self.outputDirectory, "state.json"), "-o", self.outputPath]),
+            CachedExportJob)
+
+
+class EvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.cachePath = os.path.join(self.outputDirectory, "cache")
+        os.makedirs(self.cachePath)
+
+    def storeOutput(self, cache, fingerprint, size):
+        output = types.SimpleNamespace(outputPath=os.path.join(self.outputDirectory, fingerprint + ".csv"))
+        with open(output.outputPath, "w") as outputFile:
+            outputFile.write("x" * size)
+        cache.store(fingerprint, {"medium": 1}, [output], 1)
+        return output
+
+    def testLeastRecentlyUsedExportsAreRemoved(self):
+        cache = ResultCache(self.cachePath, 4000)
+        outputs = {}
+        for entryTime, fingerprint in enumerate(["a", "b", "c"]):
+            outputs[fingerprint] = self.storeOutput(cache, fingerprint, 1000)
+            os.utime(cache.entryPath(fingerprint), (entryTime, entryTime))
+        # Restoring an export makes it the most recently used
+        cache.restore("a", cache.lookup("a", {"medium": 1}), [outputs["a"]])
+        self.storeOutput(cache, "d", 1000)
+        self.assertEqual(sorted(os.listdir(self.cachePath)), ["a", "c", "d"])
+
+        # The export just stored is kept, even if it is larger than the cache
+        self.storeOutput(cache, "e", 5000)
+        self.assertEqual(os.listdir(self.cachePath), ["e"])
+        self.assertIsNotNone(cache.lookup("e", {"medium": 1}))
+        self.assertIsNone(cache.lookup("e", {"medium": 2}))
+        self.assertIsNone(cache.lookup("a", {"medium": 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
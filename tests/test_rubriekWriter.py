@@ -0,0 +1,155 @@
+"""test_rubriekWriter.py: Test the financien report per rubriek, pivoted from the rows of one grouped query"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import argparse
+import datetime
+import decimal
+import filecmp
+import tempfile
+import unittest
+from exportEngine.commands import FinancienRubriekCsv, parseYears, parseRekeningen
+from exportEngine.executor import runExport
+from exportEngine.rubriekWriter import RubriekWriter
+from tests.fakeMysql import FakeConnection, baselinePath, fakeExportJob
+
+Decimal = decimal.Decimal
+
+# The rubrieken and the mutations of the fake financien database
+rubrieken = {1: "Huur", 2: "Boodschappen", 3: "TRANSFER:spaar", 4: "Auto", 5: "Zorg"}
+mutaties = [
+    # rubriek_id, rekening_id, datum, mutatie_in, mutatie_uit
+    (1, 1, datetime.date(2019, 1, 31), None, Decimal("750.00")),
+    (1, 1, datetime.date(2019, 2, 28), None, Decimal("750.00")),
+    (1, 39, datetime.date(2019, 3, 1), Decimal("0.00"), None),
+    (2, 1, datetime.date(2019, 5, 5), Decimal("12.50"), Decimal("80.15")),
+    (2, 39, datetime.date(2019, 6, 6), None, Decimal("19.99")),
+    (2, 7, datetime.date(2019, 6, 7), None, Decimal("100.00")),
+    (2, 39, datetime.date(2020, 6, 6), Decimal("5.01"), None),
+    (3, 1, datetime.date(2019, 7, 1), Decimal("500.00"), None),
+    (4, 39, datetime.date(2018, 8, 8), None, Decimal("45.00")),
+    (4, 1, datetime.date(2020, 1, 1), Decimal("3.00"), Decimal("3.00")),
+    (5, 1, datetime.date(2019, 9, 9), Decimal("0.00"), Decimal("0.00"))]
+
+
+def sumOf(amounts):
+    """Sum the amounts like SQL: NULL if all amounts are NULL"""
+    amounts = [amount for amount in amounts if amount is not None]
+    return sum(amounts, Decimal(0)) if amounts else None
+
+
+def groupedRowsOf(job):
+    """Get the rows of the grouped query of the financien export: the sums per rubriek, year and account of the
+    mutations in the accounts and dates of the query parameters, without the transfers, ordered on rubriek
+    """
+    rekeningIds = [parameter for parameter in job.queryParameters if isinstance(parameter, int)]
+    firstDate, lastDate = [parameter for parameter in job.queryParameters if isinstance(parameter, datetime.date)]
+    groups = {}
+    for rubriekId, rekeningId, datum, mutatieIn, mutatieUit in mutaties:
+        if rekeningId in rekeningIds and firstDate <= datum <= lastDate and \
+                not rubrieken[rubriekId].startswith("TRANSFER:"):
+            groups.setdefault((rubriekId, datum.year, rekeningId), []).append((mutatieIn, mutatieUit))
+    rows = []
+    for (rubriekId, jaar, rekeningId), amounts in sorted(groups.items(),
+                                                         key=lambda group: (rubrieken[group[0][0]], group[0])):
+        values = {"rubriek_id": rubriekId, "rubriek": rubrieken[rubriekId], "jaar": jaar, "rekening_id": rekeningId,
+                  "mutatie_in": sumOf([mutatieIn for mutatieIn, _ in amounts]),
+                  "mutatie_uit": sumOf([mutatieUit for _, mutatieUit in amounts])}
+        rows.append(tuple([values[columnName] for columnName in job.columnNames]))
+    return rows
+
+
+class RubriekReportTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def runReport(self, arguments):
+        """Run the financien export on the fake database, and return the connection"""
+        job = fakeExportJob(FinancienRubriekCsv(), arguments)
+        mysqlConnection = FakeConnection(groupedRowsOf(job))
+        runExport(mysqlConnection, job)
+        return mysqlConnection
+
+    def testYearIsIdenticalToBaseline(self):
+        for year in ["2018", "2019", "2020"]:
+            with self.subTest(year=year):
+                outputPath = os.path.join(self.outputDirectory, "financien.csv")
+                self.runReport(["-y", year, "-o", outputPath])
+                self.assertTrue(filecmp.cmp(outputPath, baselinePath("financienRubriek" + year + ".csv"),
+                                            shallow=False))
+
+    def testReportNeedsOneQuery(self):
+        mysqlConnection = self.runReport(["-y", "2019", "-o", os.path.join(self.outputDirectory, "financien.csv")])
+        executeEvents = [event for event in mysqlConnection.events if event[0] == "execute"]
+        self.assertEqual(len(executeEvents), 1)
+        _, _, query, parameters = executeEvents[0]
+        self.assertIn("GROUP BY", query)
+        self.assertEqual(parameters, ("TRANSFER:%", 1, 39, datetime.date(2019, 1, 1), datetime.date(2019, 12, 31)))
+
+    def testFilePerYearIsIdenticalToBaseline(self):
+        self.runReport(["-y", "2018-2020", "-o", os.path.join(self.outputDirectory, "financien{year}.csv")])
+        for year in ["2018", "2019", "2020"]:
+            with self.subTest(year=year):
+                self.assertTrue(filecmp.cmp(os.path.join(self.outputDirectory, "financien" + year + ".csv"),
+                                            baselinePath("financienRubriek" + year + ".csv"), shallow=False))
+
+    def testYearsInOneFileHaveTheColumnsOfEachYear(self):
+        outputPath = os.path.join(self.outputDirectory, "financien.csv")
+        self.runReport(["-y", "2018-2020", "-o", outputPath])
+        with open(outputPath, encoding="iso-8859-1") as outputFile:
+            lines = [line.rstrip("\n").split(";") for line in outputFile]
+        self.assertEqual(lines[0][:8], ["Rubriek", "2018 ING Betaal in", "2018 ING Betaal uit",
+                                        "2018 ING CreditCard in", "2018 ING CreditCard uit", "2018 Totaal in",
+                                        "2018 Totaal uit", "2018 Totaal"])
+        self.assertEqual(len(lines[0]), 1 + 3 * 7)
+
+        # The columns of a year are the line of the rubriek in the report of the year, or zero
+        for yearIndex, year in enumerate(["2018", "2019", "2020"]):
+            with open(baselinePath("financienRubriek" + year + ".csv"), encoding="iso-8859-1") as baselineFile:
+                yearLines = {line.split(";")[0]: line.rstrip("\n").split(";")[1:] for line in baselineFile}
+            for line in lines[1:]:
+                self.assertEqual(line[1 + 7 * yearIndex:8 + 7 * yearIndex], yearLines.get(line[0], ["0,00"] * 7))
+        self.assertEqual([line[0] for line in lines[1:]], ["Auto", "Boodschappen", "Huur", "Totaal"])
+
+    def testAccountsOfArguments(self):
+        outputPath = os.path.join(self.outputDirectory, "financien.csv")
+        mysqlConnection = self.runReport(["-y", "2019", "-r", "7:Spaar", "-r", "39", "-o", outputPath])
+        self.assertEqual(mysqlConnection.events[0][3][1:3], (7, 39))
+        with open(outputPath, encoding="iso-8859-1") as outputFile:
+            self.assertEqual(outputFile.read(),
+                             "Rubriek;Spaar in;Spaar uit;Rekening 39 in;Rekening 39 uit;Totaal in;Totaal uit;Totaal\n"
+                             "Boodschappen;0,00;100,00;0,00;19,99;0,00;119,99;-119,99\n"
+                             "Totaal;0,00;100,00;0,00;19,99;0,00;119,99;-119,99\n")
+
+    def testParseYearsAndAccounts(self):
+        self.assertEqual(parseYears("2020"), (2020, 2020))
+        self.assertEqual(parseYears("2016-2020"), (2016, 2020))
+        for yearArgument in ["twenty", "2020-2016", "2016-20x"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parseYears(yearArgument)
+        self.assertEqual(parseRekeningen(["1:ING Betaal", " 39 "]), [(1, "ING Betaal"), (39, "Rekening 39")])
+        with self.assertRaises(ValueError):
+            parseRekeningen(["ING:1"])
+
+    def testRowsOfRubriekArePivoted(self):
+        rubriekWriter = RubriekWriter([2019], [(1, "Betaal"), (39, "CreditCard")])
+        self.assertEqual(rubriekWriter.begin(RubriekWriter.columnNames),
+                         "Rubriek;Betaal in;Betaal uit;CreditCard in;CreditCard uit;Totaal in;Totaal uit;Totaal\n")
+        # A line is complete when the rows of the next rubriek start, and a rubriek without amounts has no line
+        self.assertEqual(rubriekWriter.formatRows([(2, "Auto", 2019, 1, Decimal("1.50"), None),
+                                                   (2, "Auto", 2019, 39, None, Decimal("0.25"))]), "")
+        self.assertEqual(rubriekWriter.formatRows([(3, "Huur", 2019, 1, Decimal("0.00"), Decimal("0.00")),
+                                                   (4, "Zorg", 2019, 39, Decimal("2.00"), None)]),
+                         "Auto;1,50;0,00;0,00;0,25;1,50;0,25;1,25\n")
+        self.assertEqual(rubriekWriter.end(),
+                         "Zorg;0,00;0,00;2,00;0,00;2,00;0,00;2,00\n" +
+                         "Totaal;1,50;0,00;2,00;0,25;3,50;0,25;3,25\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
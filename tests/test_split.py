@@ -0,0 +1,134 @@
+"""test_split.py: Test the rows of a single query split into an output file per genre, or per value of a column"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import filecmp
+import tempfile
+import unittest
+import contextlib
+from exportEngine.commands import MuziekMediumCsv, MuziekOpnameCsv
+from exportEngine.split import SplitOutput, fileNameOf
+from tests.fakeMysql import FakeTable, fakeExportJob
+from tests.test_fanout import mediumOf
+
+genreConditions = {"medium.genre_id = 1": lambda row: row["medium.genre_id"] == 1,
+                   "medium.genre_id != 1": lambda row: row["medium.genre_id"] != 1}
+
+
+def opnameOf(opnameId, genreId, componist, typeName, opusTitel, musici):
+    return {"opname.opname_id": opnameId, "medium.genre_id": genreId, "persoon.persoon": componist,
+            "type.type": typeName, "opus.opus_titel": opusTitel, "opus.opus_nummer": "BWV " + str(opnameId),
+            "musici.musici": musici, "genre.genre": {1: "Klassiek", 2: "Jazz"}[genreId], "tijdperk.tijdperk": "Barok",
+            "medium_type.medium_type": "CD", "medium_status.medium_status": "Aanwezig", "label.label": "Decca",
+            "medium.label_nummer": str(100 + opnameId), "medium.medium_titel": "Medium " + str(opnameId)}
+
+
+class SplitOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+        self.mediumRows = [mediumOf(1, "Goldberg variaties", 1, 2, 2, "Kast"),
+                           mediumOf(2, "Kind of blue", 2, 5, 9, "Zolder"),
+                           mediumOf(3, "Atlantis", 1, 4, 2, "kast"),
+                           mediumOf(4, "Requiem", 1, 1, 1, None),
+                           mediumOf(5, "Blue train", 2, 5, 2, "Zolder"),
+                           mediumOf(6, "Requiem", 1, 1, 2, "Kast"),
+                           mediumOf(7, "Zwanenmeer", 1, 3, 3, "Zolder")]
+
+    def outputPath(self, outputName):
+        return os.path.join(self.outputDirectory, outputName)
+
+    def runExport(self, command, arguments, table):
+        """Run an export on the table, and return the executed queries"""
+        job = fakeExportJob(command, arguments)
+        mysqlConnection = table.connect()
+        job.run(mysqlConnection)
+        return [event[2] for event in mysqlConnection.events if event[0] == "execute"]
+
+    def assertSameAsExport(self, outputName, command, arguments, table):
+        """Assert that an output of a split export is identical to the output of a separate export"""
+        self.runExport(command, arguments + ["-o", self.outputPath("separate." + outputName)], table)
+        self.assertTrue(filecmp.cmp(self.outputPath(outputName), self.outputPath("separate." + outputName),
+                                    shallow=False), outputName)
+
+    def testSplitIntoGenres(self):
+        mediumTable = FakeTable(self.mediumRows, "medium.medium_id", conditions=genreConditions)
+        queries = self.runExport(MuziekMediumCsv(), ["--splitBy", "genre", "-o", self.outputPath("medium_{genre}.csv")],
+                                 mediumTable)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(sorted(os.listdir(self.outputDirectory)), ["medium_classical.csv", "medium_rest.csv"])
+        self.assertSameAsExport("medium_classical.csv", MuziekMediumCsv(), [], mediumTable)
+        self.assertSameAsExport("medium_rest.csv", MuziekMediumCsv(), ["-g", "rest"], mediumTable)
+        # Each genre has its own layout
+        with open(self.outputPath("medium_classical.csv"), encoding="iso-8859-1") as classicalFile, \
+                open(self.outputPath("medium_rest.csv"), encoding="iso-8859-1") as restFile:
+            self.assertIn("Sub-genre", classicalFile.readline())
+            self.assertIn("Genre", restFile.readline())
+
+    def testSplitIntoGenresWithOwnOrder(self):
+        # The rows of each genre are in the order of the genre, which differs for the recordings
+        opnameTable = FakeTable([opnameOf(1, 2, "Coltrane", "Jazz", "Naima", "Quartet"),
+                                 opnameOf(2, 1, "Bach", "Suite", "Cellosuite", "Casals"),
+                                 opnameOf(3, 2, "Davis", "Jazz", "Blue in green", "Sextet"),
+                                 opnameOf(4, 1, "Bach", "Cantate", "Actus tragicus", "Herreweghe"),
+                                 opnameOf(5, 1, "Arvo Pärt", "Mis", "Berliner Messe", "Hilliard"),
+                                 opnameOf(6, 2, "Brubeck", "Jazz", "Take five", "Quartet")],
+                                "opname.opname_id", conditions=genreConditions)
+        self.runExport(MuziekOpnameCsv(), ["--splitBy", "genre", "-o", self.outputPath("opname_{genre}.csv")],
+                       opnameTable)
+        self.assertSameAsExport("opname_classical.csv", MuziekOpnameCsv(), [], opnameTable)
+        self.assertSameAsExport("opname_rest.csv", MuziekOpnameCsv(), ["-g", "rest"], opnameTable)
+        with open(self.outputPath("opname_rest.csv"), encoding="iso-8859-1") as restFile:
+            self.assertEqual([line.split(",")[0] for line in restFile.readlines()[1:]],
+                             ['"Blue in green"', '"Naima"', '"Take five"'])
+
+    def testGenreWithoutRowsHasHeaderOnly(self):
+        classicalRows = [mediumRow for mediumRow in self.mediumRows if mediumRow["medium.genre_id"] == 1]
+        mediumTable = FakeTable(classicalRows, "medium.medium_id", conditions=genreConditions)
+        self.runExport(MuziekMediumCsv(), ["--splitBy", "genre", "-o", self.outputPath("medium_{genre}.csv")],
+                       mediumTable)
+        self.assertSameAsExport("medium_rest.csv", MuziekMediumCsv(), ["-g", "rest"], mediumTable)
+        with open(self.outputPath("medium_rest.csv"), encoding="iso-8859-1") as restFile:
+            self.assertEqual(len(restFile.readlines()), 1)
+
+    def testSplitByColumn(self):
+        # The values Kast and kast are equal in the collation, so their rows arrive mixed, but go to their own file
+        mediumTable = FakeTable(self.mediumRows, "medium.medium_id", conditions=genreConditions)
+        self.runExport(MuziekMediumCsv(), ["--splitBy", "opslag", "-o", self.outputPath("medium_{opslag}.csv")],
+                       mediumTable)
+        self.assertEqual(sorted(os.listdir(self.outputDirectory)), ["medium_Kast.csv", "medium_Zolder.csv",
+                                                                    "medium_kast.csv", "medium_none.csv"])
+        for opslag in ["Kast", "kast", "Zolder", None]:
+            opslagTable = FakeTable([mediumRow for mediumRow in self.mediumRows
+                                     if mediumRow["opslag.opslag"] == opslag], "medium.medium_id",
+                                    conditions=genreConditions)
+            self.assertSameAsExport("medium_" + fileNameOf(opslag) + ".csv", MuziekMediumCsv(), [], opslagTable)
+
+    def testFileNameOfValue(self):
+        self.assertEqual(fileNameOf(None), "none")
+        self.assertEqual(fileNameOf("Kast 3/boven"), "Kast_3_boven")
+        self.assertEqual(fileNameOf("../.."), "_")
+        self.assertEqual(fileNameOf(12), "12")
+
+    def testSplitArguments(self):
+        for command, arguments, message in [
+                (MuziekMediumCsv(), ["--splitBy", "opslag", "-o", self.outputPath("medium.csv")],
+                 "Split output needs {opslag} in the output path"),
+                (MuziekOpnameCsv(), ["--splitBy", "genre", "--partitions", "2", "-o", self.outputPath("o_{genre}.csv")],
+                 "Split output does not support partitions")]:
+            with self.subTest(arguments=arguments):
+                report = io.StringIO()
+                with contextlib.redirect_stdout(report), self.assertRaises(SystemExit):
+                    fakeExportJob(command, arguments)
+                self.assertIn(message, report.getvalue())
+        job = fakeExportJob(MuziekMediumCsv(), ["--splitBy", "genre", "-o", self.outputPath("medium_{genre}.csv")])
+        self.assertIsInstance(job.outputs[0], SplitOutput)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""test_startup.py: Test that the export scripts import the MySQL connector and pyarrow only when they are needed, so
+that --help and wrong arguments fail fast
+"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import os
+import sys
+import glob
+import tempfile
+import unittest
+import subprocess
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+packageDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run a script, and print the slow modules it imported to stderr
+runScriptSource = """
+import sys, runpy
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    print(sorted([module for module in ("mysql.connector", "pyarrow") if module in sys.modules]), file=sys.stderr)
+"""
+
+
+def runScript(scriptName, arguments, workingDirectory=packageDirectory):
+    """Run an export script, and return its exit code, its output and the slow modules it imported"""
+    completedProcess = subprocess.run(
+        [sys.executable, "-c", runScriptSource, os.path.join(packageDirectory, scriptName)] + arguments,
+        cwd=workingDirectory, env=dict(os.environ, PYTHONPATH=packageDirectory), capture_output=True, text=True)
+    return completedProcess.returncode, completedProcess.stdout, completedProcess.stderr.splitlines()[-1]
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def testHelpDoesNotImportSlowModules(self):
+        scriptNames = sorted([os.path.basename(scriptPath)
+                              for scriptPath in glob.glob(os.path.join(packageDirectory, "export*.py"))])
+        self.assertIn("exportAll.py", scriptNames)
+        for scriptName in scriptNames:
+            with self.subTest(scriptName=scriptName):
+                exitCode, output, importedModules = runScript(scriptName, ["--help"])
+                self.assertEqual(exitCode, 0)
+                self.assertIn("usage:", output)
+                self.assertEqual(importedModules, "[]")
+
+    def testMissingConfigurationDoesNotImportConnector(self):
+        with tempfile.TemporaryDirectory() as workingDirectory:
+            exitCode, output, importedModules = runScript("exportMuziekMediumCsv.py", ["-o", "medium.csv"],
+                                                          workingDirectory)
+        self.assertEqual(exitCode, 1)
+        self.assertIn("Configuration file database.ini not found", output)
+        self.assertEqual(importedModules, "[]")
+
+    def testPyarrowIsImportedForColumnarFormat(self):
+        checkSource = ("import sys\n" +
+                       "from exportEngine.columnar import checkColumnarFormat\n" +
+                       "checkColumnarFormat('csv')\n" +
+                       "print('pyarrow' in sys.modules)\n" +
+                       "checkColumnarFormat('parquet')\n" +
+                       "print('pyarrow' in sys.modules)\n")
+        completedProcess = subprocess.run([sys.executable, "-c", checkSource], cwd=packageDirectory,
+                                          capture_output=True, text=True)
+        if pyarrow is None:
+            self.assertEqual(completedProcess.returncode, 1)
+            self.assertIn("needs pyarrow", completedProcess.stdout)
+            return
+        self.assertEqual(completedProcess.stdout.split(), ["False", "True"])
+
+
+if __name__ == "__main__":
+    unittest.main()
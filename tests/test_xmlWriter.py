@@ -0,0 +1,93 @@
+"""test_xmlWriter.py: Test the XML written while the rows are fetched, and the escaping of the text of the elements"""
+
+__author__ = "Chris van Engelen"
+__copyright__ = "Copyright 2021"
+
+import io
+import os
+import filecmp
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+from unittest import mock
+from exportEngine.commands import BoekenBoekXml, BoekenTitelXml, MuziekMediumXml, MuziekOpnameXml
+from exportEngine.executor import Output, runExport
+from exportEngine.xmlWriter import XmlWriter, escapeText, escapeTextKeepingCarriageReturns, intText
+from tests.fakeMysql import FakeConnection, baselinePath, baselineRowCount, fakeExportJob, fakeRowsOf
+
+texts = ["Bach & <Zoon>", "line\r\nbreak", "carriage\rreturn", "line\nfeed"]
+
+
+class EscapeTextTest(unittest.TestCase):
+
+    def testEscapeLikeElementTree(self):
+        for text in texts:
+            element = ElementTree.Element("titel")
+            element.text = text
+            elementText = io.StringIO()
+            ElementTree.ElementTree(element).write(elementText, encoding="unicode")
+            self.assertEqual(elementText.getvalue(), "<titel>" + escapeText(text) + "</titel>")
+
+    def testTextKeepingCarriageReturnsSurvivesParsing(self):
+        # The text of a previous delta export is parsed and written again, and must not change
+        for text in texts:
+            escapedText = escapeTextKeepingCarriageReturns(text)
+            parsedText = ElementTree.fromstring("<titel>" + escapedText + "</titel>").text
+            self.assertEqual(parsedText, text)
+            self.assertEqual(escapeTextKeepingCarriageReturns(parsedText), escapedText)
+
+    def testWriterEscapesCarriageReturnsOnlyWhenKept(self):
+        for keepCarriageReturns, expectedText in [(False, "<titel>a\rb</titel>"), (True, "<titel>a&#13;b</titel>")]:
+            xmlWriter = XmlWriter("boeken", "boek", [("titel", "titel", None)], "boek.xsl")
+            xmlWriter.keepCarriageReturns = keepCarriageReturns
+            xmlWriter.begin(["titel"])
+            self.assertIn(expectedText, xmlWriter.formatRows([("a\rb",)]))
+            self.assertIn(expectedText, xmlWriter.formatTextRows([["a\rb"]]))
+
+
+class StreamedXmlTest(unittest.TestCase):
+
+    def setUp(self):
+        outputDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(outputDirectory.cleanup)
+        self.outputDirectory = outputDirectory.name
+
+    def testOutputIsIdenticalToBaseline(self):
+        for outputName, command in [("boekenBoek.xml", BoekenBoekXml()), ("boekenTitel.xml", BoekenTitelXml()),
+                                    ("muziekMedium.xml", MuziekMediumXml()), ("muziekOpname.xml", MuziekOpnameXml())]:
+            with self.subTest(outputName=outputName):
+                outputPath = os.path.join(self.outputDirectory, outputName)
+                job = fakeExportJob(command, ["--fetchBatchSize", "4", "-o", outputPath])
+                runExport(FakeConnection(fakeRowsOf(baselineRowCount)), job)
+                self.assertTrue(filecmp.cmp(outputPath, baselinePath(outputName), shallow=False))
+
+    def testRowsAreWrittenWhileFetching(self):
+        # Each batch is written before the next batch is fetched, so that the rows are never all in memory
+        job = fakeExportJob(MuziekMediumXml(), ["--fetchBatchSize", "2",
+                                                "-o", os.path.join(self.outputDirectory, "medium.xml")])
+        mysqlConnection = FakeConnection(fakeRowsOf(baselineRowCount))
+        write = Output.write
+
+        def recordWrite(output, text):
+            mysqlConnection.events.append(("write", text.count("<row>")))
+            write(output, text)
+
+        with mock.patch.object(Output, "write", recordWrite):
+            runExport(mysqlConnection, job)
+        events = [event if event[0] == "write" else event[0] for event in mysqlConnection.events
+                  if event[0] in ("fetchmany", "write")]
+        self.assertEqual(events, [("write", 0)] + ["fetchmany", ("write", 2)] * 3 + ["fetchmany", ("write", 0)])
+
+    def testEmptyTableLikeElementTree(self):
+        xmlWriter = XmlWriter("muziek", "medium", [("opslag", "opslag", None), ("jaar", "jaar", intText)],
+                              "medium.xsl")
+        header = xmlWriter.begin(["jaar", "opslag"])
+        databaseElement = ElementTree.Element("muziek")
+        ElementTree.SubElement(databaseElement, "medium")
+        elementText = io.StringIO()
+        ElementTree.ElementTree(databaseElement).write(elementText, encoding="unicode")
+        self.assertEqual(header.splitlines()[-1] + xmlWriter.formatRows([]) + xmlWriter.end(), elementText.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()